@@ -0,0 +1,91 @@
+"""
+Measures how long DFDone takes to build the DOT source of a diagram
+for a large, synthetic model. Graphviz is never run, so its time is excluded.
+
+Usage: python benchmarks/diagram.py [--elements N] [--interactions N] [--clusters N]
+                                    [--combine] [--bundle]
+"""
+
+import argparse
+
+from random import Random
+from time import perf_counter
+
+from dfdone.components import Cluster, Datum, Element, Interaction
+from dfdone.enums import Action, Classification, Profile, Role
+from dfdone.plot import build_graph
+
+
+def build_model(element_count, interaction_count, cluster_count, seed=0):
+    r = Random(seed)
+
+    clusters, all_clusters = dict(), list()
+    for i in range(cluster_count):
+        # Nest each cluster within a random, previously created one,
+        # or within none, producing a forest of varying depth.
+        parent = r.choice(all_clusters + [None] * 8) if all_clusters else None
+        name = F"Cluster {i}"
+        cluster = Cluster(
+            name, name, 1 if parent is None else parent.level + 1,
+            parent, dict(), ''
+        )
+        (clusters if parent is None else parent.children)[name] = cluster
+        all_clusters.append(cluster)
+
+    elements = dict()
+    for i in range(element_count):
+        name = F"Element {i}"
+        elements[name] = Element(
+            name, name,
+            r.choice(list(Profile)), r.choice(list(Role)),
+            r.choice(all_clusters + [None]) if all_clusters else None,
+            ''
+        )
+
+    data = [
+        Datum(F"Datum {i}", F"Datum {i}", r.choice(list(Classification)), '')
+        for i in range(20)
+    ]
+    element_list = list(elements.values())
+    interactions = list()
+    for _ in range(interaction_count):
+        source, target = r.sample(element_list, 2)
+        interactions.append(Interaction(
+            r.choice(list(Action)),
+            {source.name: source},
+            {target.name: target},
+            {d.name: d for d in r.sample(data, r.randint(1, 3))},
+            dict(), dict(), ''
+        ))
+
+    return clusters, elements, dict(), interactions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n\n')[0])
+    parser.add_argument('--elements', type=int, default=5000)
+    parser.add_argument('--interactions', type=int, default=50000)
+    parser.add_argument('--clusters', type=int, default=500)
+    parser.add_argument('--combine', action='store_true')
+    parser.add_argument('--bundle', action='store_true')
+    args = parser.parse_args()
+
+    model = build_model(args.elements, args.interactions, args.clusters)
+    start = perf_counter()
+    graph = build_graph(*model, options={'combine': args.combine, 'bundle': args.bundle})
+    built = perf_counter()
+    source = graph.source
+    done = perf_counter()
+
+    print(
+        F"{args.elements} elements, {args.interactions} interactions, "
+        F"{args.clusters} clusters{' (combined)' if args.combine else ''}"
+        F"{' (bundled)' if args.bundle else ''}:\n"
+        F"  build graph:  {built - start:8.3f}s\n"
+        F"  emit source:  {done - built:8.3f}s\n"
+        F"  total:        {done - start:8.3f}s ({len(source)} bytes of DOT, {graph.edge_count} edges)"
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+from functools import lru_cache
+from hashlib import blake2b
+from logging import getLogger
+from os import environ, replace
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+
+from graphviz import version
+
+
+DEFAULT_CACHE_SIZE = 256  # in megabytes
+
+logger = getLogger(__name__)
+
+
+def default_cache_dir():
+    cache_home = environ.get('XDG_CACHE_HOME') or Path.home().joinpath('.cache')
+    return Path(cache_home).joinpath('dfdone')
+
+
+@lru_cache(maxsize=None)
+def graphviz_version():
+    return '.'.join(str(v) for v in version())
+
+
+class RenderCache:
+    """
+    Content-addressed, on-disk cache of Graphviz output.
+    Entries are keyed by a hash of the DOT source, the layout engine,
+    the output format, and the Graphviz version, so a byte-identical graph
+    never needs to be laid out twice. Once the cache grows beyond max_size
+    bytes, the least recently used entries are evicted.
+    """
+    def __init__(self, directory, max_size=DEFAULT_CACHE_SIZE * 2**20):
+        self.directory = Path(directory)
+        self.max_size = max_size
+
+    def key(self, source, engine, fmt):
+        h = blake2b(digest_size=20)
+        for part in (graphviz_version(), engine, fmt):
+            h.update(part.encode('utf-8'))
+            h.update(b'\0')
+        h.update(source.encode('utf-8'))
+        return h.hexdigest()
+
+    def path(self, key):
+        return self.directory.joinpath(key[:2], key)
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            data = path.read_bytes()
+        except OSError:
+            return None
+        # Bump the modification time, which is what eviction goes by.
+        # The cache may be read-only, or shared, in which case the entry is still used.
+        try:
+            path.touch()
+        except OSError as e:
+            logger.debug(F"Unable to mark {key} as recently used: {e}")
+        logger.debug(F"Render cache hit: {key}")
+        return data
+
+    def put(self, key, data):
+        path = self.path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write to a temporary file first so that concurrent runs
+            # never read a partially written entry.
+            with NamedTemporaryFile(dir=path.parent, delete=False) as f:
+                f.write(data)
+            replace(f.name, path)
+        except OSError as e:
+            logger.warning(F"Unable to write to the render cache: {e}")
+            return
+        self.evict()
+
+    def evict(self):
+        entries = list()
+        for entry in self.directory.glob('*/*'):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                entry.unlink()
+            except OSError:
+                continue
+            total_size -= size
+            logger.debug(F"Evicted {entry.name} from the render cache.")
+
+    def render(self, source, engine, fmt, renderer):
+        """
+        Returns the output of renderer(), which must render the given
+        DOT source with the given engine and format, from the cache if possible.
+        """
+        key = self.key(source, engine, fmt)
+        data = self.get(key)
+        if data is None:
+            data = renderer()
+            self.put(key, data)
+        return data
@@ -0,0 +1,132 @@
+from hashlib import blake2b
+
+from dfdone.components import (
+    Cluster,
+    Datum,
+    Element,
+    Measure,
+    Note,
+    Threat,
+)
+
+
+def name_of(component):
+    return None if component is None else component.name
+
+
+def canonical_component(component):
+    """
+    Returns a tuple that describes everything DFDone renders for a component,
+    referring to other components by name only, so that equal tuples
+    mean equal components across two separately parsed models.
+    """
+    form = [type(component).__name__, component.name, component.label, component.description]
+    if isinstance(component, Note):
+        form.extend([
+            component.color,
+            name_of(component.parent),
+            tuple(component.targets),
+        ])
+    elif isinstance(component, Cluster):
+        form.extend([
+            component.level,
+            name_of(component.parent),
+        ])
+    elif isinstance(component, Element):
+        form.extend([
+            component.profile.name,
+            component.role.name,
+            name_of(component.parent),
+        ])
+    elif isinstance(component, Datum):
+        form.append(component.classification.name)
+    elif isinstance(component, Threat):
+        form.extend([
+            component.impact.name,
+            component.probability.name,
+            tuple(sorted(component.applicable_measures)),
+        ])
+    elif isinstance(component, Measure):
+        form.extend([
+            component.capability.name,
+            tuple(sorted(component.mitigable_threats)),
+        ])
+    return tuple(form)
+
+
+def interaction_key(interaction):
+    return (
+        tuple(sorted(interaction.sources)),
+        tuple(sorted(interaction.targets)),
+        tuple(sorted(interaction.data)),
+    )
+
+
+def canonical_interaction(interaction):
+    return (
+        interaction_key(interaction),
+        interaction.action.name,
+        interaction.notes,
+        tuple(
+            (d_name, tuple(
+                (t_name, risk.rating.name)
+                for t_name, risk in sorted(risk_dict.items())
+            ))
+            for d_name, risk_dict in sorted(interaction.risks.items())
+        ),
+        tuple(
+            (d_name, tuple(
+                (m_name, mitigation.imperative.name, mitigation.status.name)
+                for m_name, mitigation in sorted(mitigation_dict.items())
+            ))
+            for d_name, mitigation_dict in sorted(interaction.mitigations.items())
+        ),
+    )
+
+
+def fingerprint(canonical_form):
+    return blake2b(repr(canonical_form).encode('utf-8'), digest_size=16).digest()
+
+
+def flatten_clusters(cluster_dict):
+    clusters = dict()
+    for c_name, cluster in cluster_dict.items():
+        clusters[c_name] = cluster
+        clusters.update(flatten_clusters(cluster.children))
+    return clusters
+
+
+def component_fingerprints(model):
+    """
+    Maps the name of every component in a model
+    (a dfdone.tml.parser.Parser, or an equivalent object) to the fingerprint
+    of its canonical form. Nested clusters are included.
+    """
+    components = dict(model.notes)
+    components.update(flatten_clusters(model.clusters))
+    components.update(model.elements)
+    components.update(model.data)
+    components.update(model.threats)
+    components.update(model.measures)
+    return {
+        name: fingerprint(canonical_component(component))
+        for name, component in components.items()
+    }
+
+
+def interaction_fingerprints(interactions):
+    """
+    Maps every interaction key to the index of the interaction
+    and the fingerprint of its canonical form.
+    Interactions that share a key are told apart by their order of appearance.
+    """
+    fingerprints, occurrences = dict(), dict()
+    for index, interaction in enumerate(interactions):
+        key = interaction_key(interaction)
+        occurrence = occurrences.get(key, 0)
+        occurrences[key] = occurrence + 1
+        fingerprints[key + (occurrence,)] = (
+            index,
+            fingerprint(canonical_interaction(interaction)),
+        )
+    return fingerprints
@@ -0,0 +1,143 @@
+import argparse
+import logging
+
+from concurrent.futures import ThreadPoolExecutor
+from json import load as load_json
+from pathlib import Path
+
+from dfdone.cli.main import build_arg_parser as build_main_arg_parser
+from dfdone.cli.main import generate, prepare_logger
+from dfdone.tml.parser import Parser
+
+try:
+    from tomllib import load as load_toml
+except ImportError:  # Python < 3.11
+    load_toml = None
+
+
+def build_arg_parser():
+    EXAMPLE = '\N{ESC}[7mEXAMPLE\N{ESC}[0m'
+    DEFAULT = '\N{ESC}[7mDEFAULT\N{ESC}[0m'
+
+    manifest_file_kwargs = {
+        'type': Path,
+        'metavar': 'MANIFEST_FILE',
+        'help': (
+            'A JSON or TOML file that lists models, formats, and sets of options.\n'
+            'Paths are relative to the manifest file. For instance:\n'
+            '    output_dir = "out"\n'
+            '    formats = ["html", "svg"]\n'
+            '    options = ["--combine", "--no-numbers"]\n'
+            '    models = ["main.tml", {path = "caching.tml", options = ["--active"]}]\n'
+            '    [variants]\n'
+            '    default = []\n'
+            '    relationships = ["--graph-attrs", "layout=neato", "overlap=false"]\n'
+            'Each model is rendered in every format, once per variant, to\n'
+            'OUTPUT_DIR/VARIANT/MODEL.FORMAT; options apply to every model and variant.\n'
+            'Without variants, each model is rendered once, to OUTPUT_DIR/MODEL.FORMAT.'
+        ),
+    }
+
+    jobs_kwargs = {
+        'type': int,
+        'default': None,
+        'help': (
+            'Limits how many models are rendered at once.\n'
+            F"{DEFAULT} the number of processors plus four, but no more than 32."
+        ),
+    }
+
+    v_kwargs = {
+        'action': 'count',
+        'default': 0,
+        'help': "Increases the verbosity of DFDone's log messages.",
+    }
+
+    parser = argparse.ArgumentParser(
+        prog='dfdone batch',
+        description=(
+            'Renders several models, in several formats and with several sets of options,\n'
+            'in a single process. Each model is parsed only once, and so is each file\n'
+            'included by several models.\n'
+            F"{EXAMPLE} \"dfdone batch models.toml --jobs 4\""
+        ),
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    parser.add_argument('manifest_file', **manifest_file_kwargs)
+    parser.add_argument('--jobs', **jobs_kwargs)
+    parser.add_argument('-v', **v_kwargs)
+    return parser
+
+
+def load_manifest(path):
+    with path.open('rb') as f:
+        if path.suffix.lower() != '.toml':
+            return load_json(f)
+        if load_toml is None:
+            raise ValueError('TOML manifests require Python 3.11 or later; use JSON instead.')
+        return load_toml(f)
+
+
+def plan_jobs(manifest, directory):
+    """
+    Returns a list of (model path, command-line arguments) tuples,
+    one for each model and variant listed in the manifest.
+    """
+    output_dir = directory.joinpath(manifest.get('output_dir', '.'))
+    formats = manifest.get('formats', ['html'])
+    options = manifest.get('options', list())
+    # Without variants, outputs are written to output_dir itself.
+    variants = manifest.get('variants', {'': list()})
+
+    jobs = list()
+    for model in manifest.get('models', list()):
+        if isinstance(model, str):
+            model = {'path': model}
+        path = directory.joinpath(model['path'])
+        for variant, variant_options in variants.items():
+            jobs.append((path, [
+                *options,
+                *model.get('options', list()),
+                *variant_options,
+                '--diagram', ','.join(formats),
+                '--output-dir', str(output_dir.joinpath(variant)),
+                str(path),
+            ]))
+    return jobs
+
+
+def main(argv=None):
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    prepare_logger(args.v)
+    logger = logging.getLogger(__name__)
+
+    try:
+        manifest = load_manifest(args.manifest_file)
+    except (OSError, ValueError) as e:
+        parser.error(F"Unable to load {args.manifest_file}: {e}")
+
+    # Every job is validated before anything is rendered.
+    main_parser = build_main_arg_parser()
+    jobs = list()
+    for path, job_argv in plan_jobs(manifest, args.manifest_file.parent):
+        job_args = main_parser.parse_args(job_argv)
+        job_args.model_file.close()
+        jobs.append((path, job_args))
+
+    # Models are parsed one after the other, sharing the files they include.
+    parsed_files, parsers = dict(), dict()
+    for path, _ in jobs:
+        if path not in parsers:
+            with path.open() as f:
+                parsers[path] = Parser(f, parsed_files=parsed_files)
+
+    # Parsed models are only read from here on, so jobs may share them.
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        futures = [
+            executor.submit(generate, job_args, parsers[path])
+            for path, job_args in jobs
+        ]
+        for future in futures:
+            future.result()
+    logger.info(F"Rendered {len(jobs)} jobs from {len(parsers)} models.")
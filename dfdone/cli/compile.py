@@ -0,0 +1,68 @@
+import argparse
+
+from pathlib import Path
+
+from dfdone.cli.main import prepare_logger
+from dfdone.snapshot import dump_model, load_model
+from dfdone.tml.parser import Parser
+
+
+def build_arg_parser():
+    EXAMPLE = '\N{ESC}[7mEXAMPLE\N{ESC}[0m'
+    DEFAULT = '\N{ESC}[7mDEFAULT\N{ESC}[0m'
+
+    model_file_kwargs = {
+        'type': argparse.FileType('r'),
+        'metavar': 'MODEL_FILE',
+    }
+
+    output_kwargs = {
+        'type': Path,
+        'default': None,
+        'metavar': 'SNAPSHOT_FILE',
+        'help': (
+            'Writes the snapshot to this file.\n'
+            F"{DEFAULT} MODEL_FILE, with the .tmlc extension."
+        ),
+    }
+
+    v_kwargs = {
+        'action': 'count',
+        'default': 0,
+        'help': "Increases the verbosity of DFDone's log messages.",
+    }
+
+    parser = argparse.ArgumentParser(
+        prog='dfdone compile',
+        description=(
+            'Parses a model, along with every file it includes, and writes a snapshot of it,\n'
+            'which dfdone then takes in place of MODEL_FILE, without parsing it again.\n'
+            'Snapshots hold no code, and are checked as they are loaded, so they are safe\n'
+            'to load from anywhere. Given --check-sources, dfdone warns about files within\n'
+            "the snapshot's directory that the snapshot was compiled from and that have since changed.\n"
+            F"{EXAMPLE} \"dfdone compile model.tml && dfdone model.tmlc\""
+        ),
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    parser.add_argument('model_file', **model_file_kwargs)
+    parser.add_argument('-o', '--output', **output_kwargs)
+    parser.add_argument('-v', **v_kwargs)
+    return parser
+
+
+def main(argv=None):
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    prepare_logger(args.v)
+
+    with args.model_file:
+        tml_parser = Parser(args.model_file)
+    output = args.output or Path(args.model_file.name).with_suffix('.tmlc')
+    snapshot = dump_model(tml_parser, output.parent)
+    # The snapshot is loaded back, to make sure it holds the model as parsed.
+    try:
+        load_model(snapshot)
+    except ValueError as e:
+        parser.error(F"{args.model_file.name} cannot be represented by a snapshot: {e}")
+
+    output.write_bytes(snapshot)
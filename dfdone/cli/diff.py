@@ -0,0 +1,84 @@
+import argparse
+
+from pathlib import Path
+
+from dfdone.cli.main import prepare_logger
+from dfdone.diff import diff_html, diff_json, diff_models
+from dfdone.tml.parser import Parser
+
+
+def build_arg_parser():
+    EXAMPLE = '\N{ESC}[7mEXAMPLE\N{ESC}[0m'
+    DEFAULT = '\N{ESC}[7mDEFAULT\N{ESC}[0m'
+
+    model_file_kwargs = {
+        'type': argparse.FileType('r'),
+    }
+
+    json_kwargs = {
+        'action': 'store_true',
+        'help': 'Outputs the differences as JSON instead of HTML.',
+    }
+
+    v_kwargs = {
+        'action': 'count',
+        'default': 0,
+        'help': "Increases the verbosity of DFDone's log messages.",
+    }
+
+    default_css_path = Path(__file__).parent.joinpath(
+        '../../examples/default.css'
+    ).resolve()
+    css_kwargs = {
+        'type': Path,
+        'nargs': '?',
+        'default': default_css_path,
+        'metavar': 'CSS_FILE',
+        'help': (
+            'Includes the specified CSS file inline at the beginning of the HTML output.\n'
+            F"{DEFAULT} {default_css_path}"
+        ),
+    }
+
+    no_css_kwargs = {
+        'action': 'store_true',
+        'help': 'Omits all inline CSS.',
+    }
+
+    parser = argparse.ArgumentParser(
+        prog='dfdone diff',
+        description=(
+            'Reports how the risk posture changed between two versions of a model.\n'
+            'Components are matched by name, and interactions by their sources, targets, and data.\n'
+            F"{EXAMPLE} \"dfdone diff old.tml new.tml --json\""
+        ),
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    parser.add_argument('old_model_file', metavar='OLD_MODEL_FILE', **model_file_kwargs)
+    parser.add_argument('new_model_file', metavar='NEW_MODEL_FILE', **model_file_kwargs)
+    parser.add_argument('-v', **v_kwargs)
+    parser.add_argument('--json', **json_kwargs)
+    parser.add_argument('--css', **css_kwargs)
+    parser.add_argument('--no-css', **no_css_kwargs)
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    prepare_logger(args.v)
+
+    models = list()
+    for model_file in (args.old_model_file, args.new_model_file):
+        models.append(Parser(model_file))
+        model_file.close()
+
+    model_diff = diff_models(*models)
+    if args.json:
+        print(diff_json(model_diff))
+        return
+
+    html = diff_html(model_diff)
+    if not args.no_css:
+        with args.css.open() as f:
+            html = F"<style>{f.read()}</style>" + html
+    print(html, end='')
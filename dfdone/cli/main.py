@@ -1,20 +1,56 @@
 import logging
 
+from concurrent.futures import Future, ThreadPoolExecutor
+from copy import copy
 from functools import partial
+from importlib import import_module
 from io import StringIO
+from json import dumps
 from pathlib import Path
-from random import Random, randint
-from sys import stderr, stdout
+from random import Random, randint, sample
+from sys import argv, stderr, stdout
 
 import argparse
 
-from bs4 import BeautifulSoup
-
-from dfdone import plot
+from dfdone import export, filters, plot, snapshot, timing
+from dfdone.cache import DEFAULT_CACHE_SIZE, default_cache_dir
+from dfdone.canonical import canonical_component, canonical_interaction, fingerprint
+from dfdone.enums import Risk
+from dfdone.markup import Anchors, MarkupWriter
 from dfdone.tml.parser import HL, Parser
 
 
 SECTION_BREAK = '<!-- SECTION BREAK -->'
+# Random seeds, as well as those tried by --seed-search, range from 1 to MAX_SEED.
+MAX_SEED = 9999
+
+# What each section of the HTML output is built from, apart from the diagram,
+# which is cached by Graphviz output instead; see generate's sections argument.
+# Sections only show the descriptions of their own components,
+# but the labels and ratings of the components they refer to as well.
+SECTION_INPUTS = {
+    'data': (('data',), ()),
+    'threats': (('threats',), ('measures',)),
+    'measures': (('measures',), ('threats',)),
+    'interactions': (('interactions',), ('elements', 'data', 'threats', 'measures')),
+    'paths': (('interactions',), ('elements', 'data')),
+}
+
+# Commands that take the place of MODEL_FILE, each with its own options.
+COMMANDS = {
+    'diff': 'dfdone.cli.diff',
+    'batch': 'dfdone.cli.batch',
+    'watch': 'dfdone.cli.watch',
+    'serve': 'dfdone.cli.serve',
+    'compile': 'dfdone.cli.compile',
+}
+
+
+def seed_count(value):
+    count = int(value)
+    if not 1 <= count <= MAX_SEED:
+        raise argparse.ArgumentTypeError(F"must be between 1 and {MAX_SEED}")
+    return count
 
 
 class ParseDict(argparse.Action):
@@ -67,7 +103,10 @@ def build_arg_parser(testing=False):
         'metavar': 'INCLUDE',
         'help': (
             'Includes specified information in the output. Options are:\n'
-            'data, diagram, interactions, threats, measures.\n'
+            'data, diagram, interactions, threats, measures, paths.\n'
+            'The paths option, not included by default, outputs which elements\n'
+            'and data each black-box agent can reach, along with the highest-risk\n'
+            'path to each confidential datum.\n'
             'Options can be repeated, and their order will be respected.\n'
             F"{EXAMPLE} \"-i diagram data diagram threats\" outputs the diagram,\n"
             'then the data table, then the diagram again, then the threat table.\n'
@@ -75,6 +114,20 @@ def build_arg_parser(testing=False):
         ),
     }
 
+    format_kwargs = {
+        'type': str.lower,
+        'choices': ['html', 'json'],
+        'default': 'html',
+        'help': (
+            'Outputs the model as HTML, or as JSON for other tools to consume.\n'
+            'JSON output lists clusters, elements, notes, data, threats, measures,\n'
+            'and interactions, along with their risks, mitigations, and risk ratings;\n'
+            'it is written as it is generated, one record per line.\n'
+            F"{EXAMPLE} \"--format json --min-risk high\"\n"
+            F"{DEFAULT} html"
+        ),
+    }
+
     x_kwargs = {
         'nargs': '*',
         'default': [],
@@ -104,11 +157,34 @@ def build_arg_parser(testing=False):
         'help': 'Combines diagram arrows that have the same source, target, and risk rating.',
     }
 
+    bundle_kwargs = {
+        'action': 'store_true',
+        'help': (
+            'Draws a single diagram arrow from one element to another, however many\n'
+            'interactions there are between them, with the highest risk rating\n'
+            'among them. Greatly reduces layout time for large models.'
+        ),
+    }
+
     no_numbers_kwargs = {
         'action': 'store_true',
         'help': 'Omits the numbers next to each arrow in the diagram.',
     }
 
+    tooltip_limit_kwargs = {
+        'type': int,
+        'default': None,
+        'metavar': 'N',
+        'help': (
+            'Lists no more than N interactions in each diagram tooltip, followed by\n'
+            'how many more there are, which keeps the diagram small for large models.\n'
+            'Tooltips of arrow numbers then refer to the interaction table\n'
+            'instead of repeating the tooltip of the arrow.\n'
+            'Informational log messages (-v) will display the size of each section.\n'
+            F"{EXAMPLE} \"--tooltip-limit 5\""
+        ),
+    }
+
     no_anchors_kwargs = {
         'action': 'store_true',
         'help': 'Strips all anchors from the resulting HTML.',
@@ -143,13 +219,110 @@ def build_arg_parser(testing=False):
     }
 
     diagram_kwargs = {
+        'type': lambda formats: formats.split(','),
         'metavar': 'FORMAT',
         'help': (
             'Outputs only the diagram in the specified format.\n'
             'Common supported formats are: gv, jpg, pdf, png, svg.\n'
             'See the following page for all supported formats:\n'
             'https://www.graphviz.org/doc/info/output.html\n'
-            F"{EXAMPLE} \"--diagram png\" outputs only the diagram, in PNG format."
+            F"{EXAMPLE} \"--diagram png\" outputs only the diagram, in PNG format.\n"
+            'Several comma-separated formats may be specified, in which case\n'
+            'the diagram is laid out only once, and each format is written to\n'
+            'OUTPUT_DIR. The html format stands for the complete HTML output.\n'
+            F"{EXAMPLE} \"--diagram html,svg,png --output-dir out\""
+        ),
+    }
+
+    partition_kwargs = {
+        'action': 'store_true',
+        'help': (
+            'Splits the diagram into an overview, with one node per top-level cluster,\n'
+            'followed by a detailed diagram of each top-level cluster.\n'
+            'Arrows between clusters are combined in the overview, carrying the highest risk.\n'
+            'Useful for large models, which would otherwise take long to lay out.\n'
+            'With --diagram, each partition is written to its own file in OUTPUT_DIR.'
+        ),
+    }
+
+    jobs_kwargs = {
+        'type': int,
+        'default': None,
+        'help': (
+            'Limits how many diagrams Graphviz lays out at once, with --partition.\n'
+            F"{DEFAULT} the number of processors plus four, but no more than 32."
+        ),
+    }
+
+    layout_budget_kwargs = {
+        'type': float,
+        'default': None,
+        'metavar': 'SECONDS',
+        'help': (
+            'Limits how long Graphviz may take to lay out the diagram.\n'
+            'Settings are chosen according to the size of the diagram; whenever\n'
+            'Graphviz exceeds the limit, it is stopped and run again with cheaper\n'
+            'settings (polyline, then straight lines, then unflattened), the last of\n'
+            'which runs to completion. Informational log messages (-v) will display\n'
+            'the settings that were used.\n'
+            F"{EXAMPLE} \"--layout-budget 30\""
+        ),
+    }
+
+    min_risk_kwargs = {
+        'type': str.lower,
+        'choices': [r.name.lower() for r in Risk],
+        'default': None,
+        'metavar': 'LEVEL',
+        'help': (
+            'Outputs only the interactions whose highest risk is at least LEVEL,\n'
+            'along with the elements, data, threats, and measures they involve.\n'
+            F"Levels are: {', '.join(r.name.lower() for r in Risk)}.\n"
+            F"{EXAMPLE} \"--min-risk medium\""
+        ),
+    }
+
+    focus_kwargs = {
+        'nargs': '+',
+        'default': None,
+        'metavar': 'ELEMENT',
+        'help': (
+            'Outputs only the interactions among elements that are within DEPTH\n'
+            'interactions of the specified elements or clusters, along with the data,\n'
+            'threats, measures, notes, and clusters that remain relevant.\n'
+            F"{EXAMPLE} \"--focus 'Web App' --depth 2\""
+        ),
+    }
+
+    depth_kwargs = {
+        'type': int,
+        'default': 1,
+        'help': (
+            F"How many interactions away from each {focus_kwargs['metavar']} to reach.\n"
+            F"{DEFAULT} 1"
+        ),
+    }
+
+    output_dir_kwargs = {
+        'type': Path,
+        'default': None,
+        'help': (
+            'Writes each format specified with --diagram to a file in this directory,\n'
+            'named after MODEL_FILE, instead of writing to the standard output.\n'
+            F"{DEFAULT} the current directory, if several formats are specified."
+        ),
+    }
+
+    deps_kwargs = {
+        'type': Path,
+        'default': None,
+        'metavar': 'DEPS_FILE',
+        'help': (
+            'Also writes a Makefile fragment to DEPS_FILE, listing MODEL_FILE and\n'
+            'every file it includes as prerequisites of DEPS_FILE without its .d suffix.\n'
+            'Included files are found by scanning for Include directives alone.\n'
+            F"{EXAMPLE} \"dfdone --deps html/main.html.d main.tml > html/main.html\"\n"
+            'followed by "-include html/main.html.d" in the Makefile.'
         ),
     }
 
@@ -165,6 +338,48 @@ def build_arg_parser(testing=False):
         ),
     }
 
+    seed_search_kwargs = {
+        'type': seed_count,
+        'default': None,
+        'metavar': 'N',
+        'help': (
+            'Lays out the diagram with N random seeds, at most --jobs at once,\n'
+            'and keeps the one with the fewest crossing arrows, then the shortest\n'
+            'arrows, then the smallest area. The chosen seed is logged (-v),\n'
+            'so that it can be given to --seed in future invocations.\n'
+            F"N ranges from 1 to {MAX_SEED}, and cannot be combined with --seed.\n"
+            F"{EXAMPLE} \"--seed-search 8\""
+        ),
+    }
+
+    cache_dir_kwargs = {
+        'type': Path,
+        'default': default_cache_dir() if not testing else None,
+        'metavar': 'CACHE_DIR',
+        'help': (
+            'Caches rendered diagrams in the specified directory,\n'
+            'so that Graphviz is skipped whenever an identical diagram was rendered before.\n'
+            F"{DEFAULT} {default_cache_dir()}"
+        ),
+    }
+
+    no_cache_kwargs = {
+        'action': 'store_const',
+        'const': None,
+        'dest': 'cache_dir',
+        'help': 'Always runs Graphviz, without reading from or writing to the cache.',
+    }
+
+    cache_size_kwargs = {
+        'type': int,
+        'default': DEFAULT_CACHE_SIZE,
+        'metavar': 'MEGABYTES',
+        'help': (
+            'Limits the size of the cache; least recently used diagrams are evicted first.\n'
+            F"{DEFAULT} {DEFAULT_CACHE_SIZE}"
+        ),
+    }
+
     graph_attrs_kwargs = {
         'metavar': 'GRAPH_ATTRS',
         'nargs': '*',
@@ -198,8 +413,39 @@ def build_arg_parser(testing=False):
         'help': F"Same as {graph_attrs_kwargs['metavar']}, but for edge attributes.",
     }
 
+    check_sources_kwargs = {
+        'action': 'store_true',
+        'help': (
+            'When MODEL_FILE is a snapshot, written by "dfdone compile",\n'
+            'warns about each file it was compiled from that has since changed.\n'
+            "Only regular files within the snapshot's directory are checked.\n"
+            F"{EXAMPLE} \"dfdone --check-sources model.tmlc\""
+        ),
+    }
+
+    profile_kwargs = {
+        'action': 'store_true',
+        'help': (
+            'Writes how long each phase took, in wall-clock and CPU seconds,\n'
+            'along with counts of statements, interactions, risks, and diagram edges,\n'
+            'to the standard error output, as a single line of JSON.\n'
+            'Time spent in phases nested within others, such as parsing an included file,\n'
+            'only counts towards the nested phase. Graphviz CPU time is that of all\n'
+            'of its processes, which may run in parallel.\n'
+            F"{EXAMPLE} \"dfdone --profile model.tml > model.html 2> profile.json\""
+        ),
+    }
+
     parser = argparse.ArgumentParser(
         description='Generate threat models from natural language!',
+        epilog=(
+            'Additional commands, each with its own --help:\n'
+            'dfdone diff OLD_MODEL_FILE NEW_MODEL_FILE\n'
+            'dfdone batch MANIFEST_FILE\n'
+            'dfdone watch MODEL_FILE --output-dir OUTPUT_DIR\n'
+            'dfdone serve [ROOT]\n'
+            'dfdone compile MODEL_FILE [-o SNAPSHOT_FILE]'
+        ),
         formatter_class=argparse.RawTextHelpFormatter,
     )
     parser.add_argument('model_file', **model_file_kwargs)
@@ -207,19 +453,37 @@ def build_arg_parser(testing=False):
     parser.add_argument('-c', '--check-file', **c_kwargs)
     parser.add_argument('-d', '--diagram', **diagram_kwargs)
     parser.add_argument('-i', '--include', **i_kwargs)
-    parser.add_argument('-s', '--seed', **seed_kwargs)
+    parser.add_argument('-f', '--format', **format_kwargs)
+    parser.add_argument('-o', '--output-dir', **output_dir_kwargs)
+    parser.add_argument('--deps', **deps_kwargs)
+    parser.add_argument('--check-sources', **check_sources_kwargs)
+    seed_group = parser.add_mutually_exclusive_group()
+    seed_group.add_argument('-s', '--seed', **seed_kwargs)
+    seed_group.add_argument('--seed-search', **seed_search_kwargs)
     parser.add_argument('-v', **v_kwargs)
     parser.add_argument('-w', '--wrap-labels', **wrap_labels_kwargs)
     parser.add_argument('-x', '--exclude', **x_kwargs)
     parser.add_argument('--combine', **combine_kwargs)
+    parser.add_argument('--bundle', **bundle_kwargs)
     parser.add_argument('--no-numbers', **no_numbers_kwargs)
+    parser.add_argument('--tooltip-limit', **tooltip_limit_kwargs)
+    parser.add_argument('--min-risk', **min_risk_kwargs)
+    parser.add_argument('--focus', **focus_kwargs)
+    parser.add_argument('--depth', **depth_kwargs)
+    parser.add_argument('--partition', **partition_kwargs)
+    parser.add_argument('--jobs', **jobs_kwargs)
+    parser.add_argument('--layout-budget', **layout_budget_kwargs)
     parser.add_argument('--css', **css_kwargs)
     parser.add_argument('--no-css', **no_css_kwargs)
     parser.add_argument('--no-anchors', **no_anchors_kwargs)
+    parser.add_argument('--cache-dir', **cache_dir_kwargs)
+    parser.add_argument('--no-cache', **no_cache_kwargs)
+    parser.add_argument('--cache-size', **cache_size_kwargs)
     parser.add_argument('--graph-attrs', **graph_attrs_kwargs)
     parser.add_argument('--cluster-attrs', **cluster_attrs_kwargs)
     parser.add_argument('--node-attrs', **node_attrs_kwargs)
     parser.add_argument('--edge-attrs', **edge_attrs_kwargs)
+    parser.add_argument('--profile', **profile_kwargs)
     return parser
 
 
@@ -243,27 +507,36 @@ def remove_inactive(source_dict, interaction_dict):
             del source_dict[k]
 
 
-def remove_dead_anchors(html, remove_all=False):
-    soup = BeautifulSoup(html, 'html.parser')
-    if remove_all:
-        tag_ids = []
-    else:
-        tag_ids = [t['id'] for t in soup.find_all(lambda t: t.has_attr('id'))]
-    for a in soup.find_all('a'):
-        for attr_name in ('href', 'xlink:href'):
-            if a.has_attr(attr_name) and a[attr_name][1:] not in tag_ids:
-                # The xlink:title attribute in this tag holds the tooltip.
-                # So instead of deleting the entire tag with a.unwrap(),
-                # only delete the attribute.
-                del a[attr_name]
-    return str(soup)
-
-
 def main(args=None, return_html=False):
     if args is None:
+        if len(argv) > 1 and argv[1] in COMMANDS:
+            return import_module(COMMANDS[argv[1]]).main(argv[2:])
         args = build_arg_parser().parse_args()
 
     prepare_logger(args.v)
+    if not args.profile:
+        return run(args, return_html)
+    timings = timing.enable()
+    try:
+        return run(args, return_html)
+    finally:
+        timing.disable()
+        stderr.write(dumps(timings.as_dict()) + '\n')
+
+
+def run(args, return_html=False):
+    if args.deps is not None:
+        with timing.phase('deps'):
+            write_deps(args.deps, args.model_file)
+    if Path(getattr(args.model_file, 'name', '')).suffix == '.tmlc':
+        try:
+            with timing.phase('snapshot'):
+                tml_parser = load_snapshot(args.model_file, args.check_sources)
+        except (OSError, ValueError) as e:
+            raise SystemExit(F"Unable to load {args.model_file.name}: {e}")
+        count_model(tml_parser)
+        return generate(args, tml_parser, return_html)
+
     tml_parser = Parser(
         args.model_file,
         check_file=args.check_file
@@ -271,7 +544,27 @@ def main(args=None, return_html=False):
 
     if args.check_file:
         return
+    count_model(tml_parser)
+    return generate(args, tml_parser, return_html)
+
 
+def count_model(tml_parser):
+    if timing.active is None:
+        return
+    for name in ('elements', 'data', 'threats', 'measures', 'interactions'):
+        timing.count(name, len(getattr(tml_parser, name)))
+    timing.count('risks', sum(
+        len(risk_dict) for i in tml_parser.interactions for risk_dict in i.risks.values()
+    ))
+
+
+def generate(args, tml_parser, return_html=False, sections=None):
+    """
+    Outputs what the given arguments call for, from an already parsed model,
+    which is left untouched so that it can be reused with other arguments.
+    Given a sections dictionary, the HTML sections that are built are kept in it,
+    and reused by later calls as long as what they are built from is unchanged.
+    """
     if args.active:
         elements = tml_parser.active_elements
         data     = tml_parser.active_data
@@ -283,77 +576,493 @@ def main(args=None, return_html=False):
         threats  = tml_parser.threats
         measures = tml_parser.measures
 
-    clusters = tml_parser.clusters
+    clusters     = tml_parser.clusters
+    notes        = tml_parser.notes
+    interactions = tml_parser.interactions
+
+    if args.min_risk is not None or args.focus is not None:
+        model = {
+            'clusters': clusters,
+            'elements': elements,
+            'data': data,
+            'threats': threats,
+            'measures': measures,
+            'notes': notes,
+            'interactions': interactions,
+        }
+        # Risk comes first, so that the focus only reaches through the remaining interactions.
+        with timing.phase('filter'):
+            if args.min_risk is not None:
+                model = filters.min_risk(model, Risk[args.min_risk.upper()])
+            if args.focus is not None:
+                model = filters.focus(model, args.focus, args.depth)
+        clusters     = model['clusters']
+        elements     = model['elements']
+        data         = model['data']
+        threats      = model['threats']
+        measures     = model['measures']
+        notes        = model['notes']
+        interactions = model['interactions']
+
+    if args.format == 'json':
+        chunks = export.json_chunks(
+            clusters, elements, notes, data, threats, measures, interactions
+        )
+        with timing.phase('json'):
+            if return_html:
+                return ''.join(chunks)
+            for chunk in chunks:
+                stdout.write(chunk)
+        return
+
     cluster_layouts = ['dot', 'fdp', 'osage', 'patchwork']
     if args.graph_attrs.get('layout', 'dot') not in cluster_layouts:
         clusters = dict()
-        for c in (elements | tml_parser.notes).values():
-            c.parent = None
+        elements = detach(elements)
+        notes    = detach(notes)
 
     logger = logging.getLogger(__name__)
+    diagram_options = {
+        k: getattr(args, k) for k in plot.get_diagram_options() if hasattr(args, k)
+    }
+    if args.seed_search:
+        args.seed, diagram_options['layouts'] = search_seed(
+            args.seed_search, clusters, elements, notes, interactions, diagram_options
+        )
     if args.seed is not None:
         seed = args.seed.lower()
         if seed == 'random':
-            seed = str(randint(1, 9999))
-        r = Random(seed)
+            seed = str(randint(1, MAX_SEED))
         logger.info(F"Seed is: {seed}")
-        Parser.sort_clusters(clusters, key=lambda _: r.random())
-        elements = dict(sorted(elements.items(), key=lambda _: r.random()))
+        clusters, elements = order_by_seed(seed, clusters, elements)
 
-    diagram_options = {k: getattr(args, k) for k in plot.get_diagram_options()}
+    anchors = Anchors()
+    # Shared by the diagram and the interaction table.
+    groups = plot.group_interactions(interactions, args.combine)
     include_information = {
         'data': partial(
             plot.build_data_table,
             data,
+            anchors=anchors,
         ),
         'diagram': partial(
-            plot.build_diagram,
+            plot.prepare_diagram,
             clusters,
             elements,
-            tml_parser.notes,
-            tml_parser.interactions,
+            notes,
+            interactions,
             options=diagram_options,
+            anchors=anchors,
+            groups=groups,
         ),
         'interactions': partial(
             plot.build_interaction_table,
-            tml_parser.interactions,
+            interactions,
             args.combine,
+            anchors=anchors,
+            groups=groups,
         ),
         'threats': partial(
             plot.build_threat_table,
             threats,
+            anchors=anchors,
         ),
         'measures': partial(
             plot.build_measure_table,
             measures,
+            anchors=anchors,
+        ),
+        'paths': partial(
+            plot.build_path_table,
+            elements,
+            interactions,
+            anchors=anchors,
         ),
     }
 
+    if sections is not None:
+        keys = section_keys(args, {
+            'elements': elements,
+            'data': data,
+            'threats': threats,
+            'measures': measures,
+            'interactions': interactions,
+        })
+        for name, key in keys.items():
+            include_information[name] = partial(
+                reuse_section, sections, name, key, include_information[name], anchors
+            )
+
+    if (
+        args.diagram is not None
+        and (len(args.diagram) > 1 or args.partition)
+        and args.output_dir is None
+    ):
+        args.output_dir = Path()
+    if args.output_dir is not None:
+        write_formats(
+            args,
+            include_information,
+            partial(
+                plot.build_graphs,
+                clusters,
+                elements,
+                notes,
+                interactions,
+                options=diagram_options,
+                groups=groups,
+            ),
+            plot.get_render_cache(plot.get_diagram_options(diagram_options)),
+            anchors,
+        )
+        return
+
     if args.diagram is not None:
-        diagram = include_information['diagram'](fmt=args.diagram)
+        diagram = plot.build_diagram(
+            clusters,
+            elements,
+            notes,
+            interactions,
+            options=diagram_options,
+            groups=groups,
+            fmt=args.diagram[0],
+        )
         stdout.buffer.write(diagram)
         return
 
-    html_parts = list()
-    for info in filter(
-        lambda i: (i in include_information.keys()
-                   and i not in args.exclude),
-        args.include
-    ):
-        fn = include_information[info]
-        part = fn()
-        if part:
-            html_parts.append(part)
+    if return_html:
+        return build_html(args, include_information, anchors)
+    write_html(args, include_information, anchors, stdout)
+
+
+def load_snapshot(model_file, check_sources=False):
+    # Snapshots are written by "dfdone compile", and read as bytes.
+    model_file.close()
+    path = Path(model_file.name)
+    tml_parser = snapshot.load_model(path.read_bytes())
+    if not check_sources:
+        return tml_parser
+    for source in snapshot.stale_sources(tml_parser, path.parent):
+        logging.getLogger(__name__).warning(
+            F"{source} has changed since {path} was compiled; compile it again."
+        )
+    return tml_parser
+
+
+def make_escape(path):
+    return str(path).replace('$', '$$').replace('#', '\\#').replace(' ', '\\ ')
+
+
+def write_deps(deps_path, model_file):
+    """
+    Writes a Makefile fragment, as "gcc -MD -MP" would, making the target
+    named after deps_path depend on the model and every file it includes.
+    Each included file also gets an empty rule of its own, so that make
+    does not fail once a file is no longer included and has been removed.
+    """
+    model_path = Path(model_file.name)
+    if not model_path.is_file():
+        logging.getLogger(__name__).warning(
+            F"Skipping {deps_path}, since {model_file.name} is not a file."
+        )
+        return
+
+    def relative(path):
+        # Relative to the working directory, as make would refer to them.
+        try:
+            return path.relative_to(Path.cwd())
+        except ValueError:
+            return path
+
+    target = deps_path.with_suffix('') if deps_path.suffix == '.d' else deps_path
+    includes = [make_escape(relative(p)) for p in Parser.scan_includes(model_path)]
+    lines = [' \\\n  '.join([F"{make_escape(target)}: {make_escape(model_path)}", *includes])]
+    lines.extend(F"{include}:" for include in includes)
+    deps_path.parent.mkdir(parents=True, exist_ok=True)
+    deps_path.write_text('\n\n'.join(lines) + '\n')
+
+
+def detach(components):
+    # Returns copies of the given components, outside of any cluster.
+    copies = dict()
+    for c_name, component in components.items():
+        copies[c_name] = copy(component)
+        copies[c_name].parent = None
+    return copies
+
+
+def copy_clusters(clusters):
+    copies = dict()
+    for c_name, cluster in clusters.items():
+        copies[c_name] = copy(cluster)
+        copies[c_name].children = copy_clusters(cluster.children)
+    return copies
+
+
+def order_by_seed(seed, clusters, elements):
+    # Clusters are copied first, since sorting them reorders their children in place.
+    r = Random(seed)
+    clusters = copy_clusters(clusters)
+    Parser.sort_clusters(clusters, key=lambda _: r.random())
+    elements = dict(sorted(elements.items(), key=lambda _: r.random()))
+    return clusters, elements
+
+
+def search_seed(count, clusters, elements, notes, interactions, diagram_options):
+    """
+    Lays out the diagram with as many different seeds as given,
+    and returns the seed whose layout scores best, along with that layout,
+    by DOT source, so that the diagram need not be laid out again.
+    """
+    options = plot.get_diagram_options(diagram_options)
+    seeds = [str(seed) for seed in sample(range(1, MAX_SEED + 1), count)]
+    with timing.phase('dot'):
+        graphs = [
+            (seed, None, plot.build_graph(
+                *order_by_seed(seed, clusters, elements), notes, interactions, options
+            ))
+            for seed in seeds
+        ]
+    timing.count('dot edges', sum(graph.edge_count for _, _, graph in graphs))
+    # Graphviz runs in its own processes, no more than options['jobs'] at once.
+    rendered = plot.render_graphs(
+        graphs, ['plain', 'dot'],
+        plot.get_render_cache(options), options['jobs'], options['layout_budget'],
+    )
+    logger = logging.getLogger(__name__)
+    scores = dict()
+    for seed, _, outputs in rendered:
+        scores[seed] = plot.score_layout(outputs['plain'])
+        logger.debug(
+            F"Seed {seed}: {scores[seed][0]} crossings, "
+            F"{scores[seed][1]:.0f} total edge length, {scores[seed][2]:.0f} area"
+        )
+    best = min(seeds, key=scores.get)
+    logger.info(F"Best of {count} seeds is {best}; reuse it with \"--seed {best}\".")
+    index = seeds.index(best)
+    return best, {graphs[index][2].source: rendered[index][2]['dot']}
+
+
+def section_keys(args, model):
+    """
+    Returns a key for each requested section, apart from the diagram,
+    that only changes once anything the section is built from does.
+    """
+    forms = dict()
+
+    def canonical(kind, referred):
+        if (kind, referred) not in forms:
+            if kind == 'interactions':
+                form = tuple(canonical_interaction(i) for i in model[kind])
+            else:
+                form = tuple(canonical_component(c) for c in model[kind].values())
+                if referred:
+                    # Leaves the description out, which comes after the label.
+                    form = tuple(f[:3] + f[4:] for f in form)
+            forms[kind, referred] = form
+        return forms[kind, referred]
+
+    keys = dict()
+    for name in args.include:
+        if name not in SECTION_INPUTS or name in args.exclude:
+            continue
+        own, referred = SECTION_INPUTS[name]
+        keys[name] = fingerprint((name, args.combine) + tuple(
+            [canonical(kind, False) for kind in own]
+            + [canonical(kind, True) for kind in referred]
+        ))
+    return keys
+
+
+def reuse_section(sections, name, key, build, anchors):
+    """
+    Returns the section kept in sections under its name, if it was built with
+    the same key, registering its anchors; otherwise, the section is built,
+    and kept as it is written out.
+    """
+    entry = sections.get(name)
+    if entry is not None and entry[0] == key:
+        _, anchor_ids, chunks = entry
+        plot.register_anchors(anchors, anchor_ids)
+        return chunks
+    registered = set(anchors.ids)
+    section = build()
+    return keep_section(sections, name, key, anchors.ids - registered, section)
+
+
+def keep_section(sections, name, key, anchor_ids, section):
+    chunks = list()
+    for chunk in section:
+        chunks.append(chunk)
+        yield chunk
+    # Only kept once complete.
+    sections[name] = (key, anchor_ids, chunks)
+
+
+def build_html(args, include_information, anchors):
+    output = StringIO()
+    write_html(args, include_information, anchors, output)
+    return output.getvalue()
+
+
+def write_sections(sections, write):
+    # Empty sections are skipped, along with their section break.
+    section_break = ''
+    for section in sections:
+        for chunk_index, chunk in enumerate(section):
+            if chunk_index == 0:
+                write(section_break)
+                section_break = SECTION_BREAK
+            write(chunk)
+
+
+def build_while_waiting(sections):
+    """
+    Yields each section, where the diagram is a Future of its markup.
+    Before waiting on the diagram, every section that follows it is built,
+    so that building them overlaps with rendering the diagram.
+    """
+    sections = list(sections)
+    built = False
+    for index, section in enumerate(sections):
+        if not isinstance(section, Future):
+            yield section
+            continue
+        if not built:
+            built = True
+            for later in range(index + 1, len(sections)):
+                if not isinstance(sections[later], Future):
+                    sections[later] = list(sections[later])
+        yield [section.result()]
+
+
+def measure_section(section, sizes, name):
+    # Adds up the size of each chunk as it goes by, in bytes.
+    for chunk in section:
+        sizes[name] = sizes.get(name, 0) + len(chunk.encode('utf-8'))
+        yield chunk
+
+
+def time_section(section, name):
+    # Times the generation of each chunk, apart from writing it.
+    chunks = iter(section)
+    while True:
+        with timing.phase(F"{name} section"):
+            chunk = next(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def timed_feed(feed):
+    def timed(chunk):
+        with timing.phase('markup'):
+            feed(chunk)
+    return timed
+
+
+def log_section_sizes(sizes):
+    total = sum(sizes.values())
+    logging.getLogger(__name__).info('Section sizes: ' + ', '.join(
+        F"{name} {size / 1024:.1f} KiB ({size / (total or 1):.0%})"
+        for name, size in sizes.items()
+    ) + F"; {total / 1024:.1f} KiB in total.")
+
+
+def write_html(args, include_information, anchors, output):
+    """
+    Writes the HTML output as it is generated, section by section,
+    so that the complete output is never held in memory;
+    only the sections that follow the diagram are, while it renders.
+    """
+    requested = [
+        i for i in args.include
+        if i in include_information.keys()
+        and i not in args.exclude
+    ]
+    sections, names = list(), list()
     if not args.no_css:
         with args.css.open() as f:
-            html_parts.insert(0, F"<style>{f.read()}</style>")
-    html = SECTION_BREAK.join(html_parts)
+            sections.append([F"<style>{f.read()}</style>"])
+            names.append('css')
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        # Every section is set up before anything is written,
+        # so that all anchors are registered by the time links to them are.
+        # Graphviz is by far the slowest part, so the diagram is rendered
+        # in the background while the sections that precede it are written,
+        # and those that follow it are built.
+        diagram = None
+        for info in requested:
+            names.append(info)
+            if info != 'diagram':
+                sections.append(include_information[info]())
+                continue
+            if diagram is None:
+                diagram = executor.submit(include_information[info]())
+            sections.append(diagram)
+
+        writer = MarkupWriter(output.write, None if args.no_anchors else anchors)
+        if timing.active is not None:
+            sections = [
+                s if isinstance(s, Future) else time_section(s, name)
+                for s, name in zip(sections, names)
+            ]
+        sections = build_while_waiting(sections)
+        sizes = None
+        if logging.getLogger(__name__).isEnabledFor(logging.INFO):
+            sizes = dict()
+            sections = (
+                measure_section(s, sizes, name) for s, name in zip(sections, names)
+            )
+        feed = writer.feed
+        if timing.active is not None:
+            feed = timed_feed(feed)
+        write_sections(sections, feed)
+        with timing.phase('markup'):
+            writer.close()
+        if sizes is not None:
+            log_section_sizes(sizes)
 
     if not args.model_file.closed:
         args.model_file.close()
 
-    html = remove_dead_anchors(html, remove_all=args.no_anchors)
-    if return_html:
-        return html
-    else:
-        print(html, end='')
+
+def write_formats(args, include_information, build_graphs, cache, anchors):
+    formats = args.diagram or ['html']
+    graph_formats = [f for f in formats if f != 'html']
+    html_diagram = (
+        'html' in formats
+        and 'diagram' in args.include
+        and 'diagram' not in args.exclude
+    )
+    if html_diagram:
+        graph_formats.append('svg')
+
+    rendered = list()
+    if graph_formats:
+        # Only the ids of a diagram that ends up in the HTML output count as anchors.
+        graphs = build_graphs(anchors=anchors if html_diagram else None)
+        rendered = plot.render_graphs(
+            graphs, graph_formats, cache, args.jobs, args.layout_budget
+        )
+
+    stem = Path(getattr(args.model_file, 'name', 'diagram')).stem.strip('<>')
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    for fmt in dict.fromkeys(formats):
+        if fmt == 'html':
+            path = args.output_dir.joinpath(F"{stem}.{fmt}")
+            if html_diagram:
+                # Already rendered, so there is nothing left to prepare.
+                include_information['diagram'] = lambda: partial(plot.wrap_diagrams, rendered)
+            with path.open('w') as f:
+                write_html(args, include_information, anchors, f)
+            logging.getLogger(__name__).info(F"Wrote {path}")
+            continue
+        for name, _, outputs in rendered:
+            # Partitions are named after their top-level cluster.
+            path = args.output_dir.joinpath(
+                F"{stem}.{fmt}" if name is None else F"{stem}.{name}.{fmt}"
+            )
+            path.write_bytes(outputs[fmt])
+            logging.getLogger(__name__).info(F"Wrote {path}")
@@ -0,0 +1,259 @@
+import argparse
+import logging
+
+from collections import OrderedDict
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from threading import Lock
+from urllib.parse import parse_qsl, quote, unquote, urlsplit
+
+from dfdone.cli.main import build_arg_parser as build_main_arg_parser
+from dfdone.cli.main import generate, prepare_logger
+from dfdone.tml.parser import Parser
+from dfdone.watch import file_signatures
+
+
+# Options of dfdone that may be given as query parameters.
+# Others, such as --css or --output-dir, would let requests reach beyond ROOT.
+QUERY_OPTIONS = {
+    'active',
+    'bundle',
+    'cluster-attrs',
+    'combine',
+    'depth',
+    'edge-attrs',
+    'exclude',
+    'focus',
+    'graph-attrs',
+    'include',
+    'layout-budget',
+    'min-risk',
+    'no-anchors',
+    'no-css',
+    'no-numbers',
+    'node-attrs',
+    'partition',
+    'seed',
+    'tooltip-limit',
+    'wrap-labels',
+}
+
+
+def build_arg_parser():
+    EXAMPLE = '\N{ESC}[7mEXAMPLE\N{ESC}[0m'
+    DEFAULT = '\N{ESC}[7mDEFAULT\N{ESC}[0m'
+
+    root_kwargs = {
+        'type': Path,
+        'nargs': '?',
+        'default': Path(),
+        'metavar': 'ROOT',
+        'help': (
+            'Serves the models in this directory, or any of its subdirectories.\n'
+            F"{DEFAULT} the current directory."
+        ),
+    }
+
+    host_kwargs = {
+        'default': '127.0.0.1',
+        'help': F"The address to listen on.\n{DEFAULT} 127.0.0.1",
+    }
+
+    port_kwargs = {
+        'type': int,
+        'default': 8000,
+        'help': F"The port to listen on.\n{DEFAULT} 8000",
+    }
+
+    max_entries_kwargs = {
+        'type': int,
+        'default': 32,
+        'metavar': 'N',
+        'help': (
+            'Keeps up to N parsed models, and up to N rendered pages, in memory;\n'
+            'least recently used ones are dropped first.\n'
+            F"{DEFAULT} 32"
+        ),
+    }
+
+    v_kwargs = {
+        'action': 'count',
+        'default': 0,
+        'help': "Increases the verbosity of DFDone's log messages.",
+    }
+
+    parser = argparse.ArgumentParser(
+        prog='dfdone serve',
+        description=(
+            'Serves a preview of every model under ROOT, rendered on request.\n'
+            'Query parameters stand for dfdone options; options that take no values\n'
+            'are given without any, and values are separated by commas.\n'
+            'Models are parsed again only once any of their files changed,\n'
+            'so changing options re-renders from what was already parsed.\n'
+            F"{EXAMPLE} \"http://127.0.0.1:8000/model.tml?combine&include=diagram,threats\"\n"
+            F"Supported options: {', '.join(sorted(QUERY_OPTIONS))}."
+        ),
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    parser.add_argument('root', **root_kwargs)
+    parser.add_argument('--host', **host_kwargs)
+    parser.add_argument('--port', **port_kwargs)
+    parser.add_argument('--max-entries', **max_entries_kwargs)
+    parser.add_argument('-v', **v_kwargs)
+    return parser
+
+
+def query_argv(query):
+    """
+    Translates a query string into dfdone's command-line arguments.
+    >>> query_argv('combine&include=diagram,threats')
+    ['--combine', '--include', 'diagram', 'threats']
+    """
+    argv = list()
+    for name, value in parse_qsl(query, keep_blank_values=True):
+        if name not in QUERY_OPTIONS:
+            raise ValueError(F"Unsupported option: {name}")
+        argv.append(F"--{name}")
+        argv.extend(v for v in value.split(',') if v)
+    return argv
+
+
+def reject(message):
+    # Replaces ArgumentParser.error, which would exit.
+    raise ValueError(message)
+
+
+class LRUCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+class PreviewServer(ThreadingHTTPServer):
+    """
+    Keeps parsed models by path, for as long as none of their files change,
+    and rendered pages by the signatures of those files and the options used.
+    Requests are handled in threads of their own, but parse one model at a time,
+    since the Parser modifies the parsed results of the files that models share.
+    """
+    def __init__(self, address, root, max_entries):
+        super().__init__(address, PreviewHandler)
+        self.root = root.resolve()
+        self.parsed_files = dict()
+        self.parse_lock = Lock()
+        self.parsers = LRUCache(max_entries)
+        self.pages = LRUCache(max_entries)
+
+    def cached_parser(self, path):
+        entry = self.parsers.get(path)
+        if entry is not None:
+            signatures, tml_parser = entry
+            if file_signatures(signatures.keys()) == signatures:
+                return tml_parser, signatures
+        return None
+
+    def parse(self, path):
+        cached = self.cached_parser(path)
+        if cached is not None:
+            return cached
+        with self.parse_lock:
+            # Another request may have parsed the same model meanwhile.
+            cached = self.cached_parser(path)
+            if cached is not None:
+                return cached
+            Parser.forget_modified(self.parsed_files)
+            # Taken beforehand, so that changes made meanwhile are not missed.
+            signatures = file_signatures([path])
+            with path.open() as f:
+                tml_parser = Parser(f, parsed_files=self.parsed_files)
+            signatures = {**file_signatures(tml_parser.included_files), **signatures}
+            self.parsers.put(path, (signatures, tml_parser))
+        return tml_parser, signatures
+
+    def render(self, path, argv):
+        tml_parser, signatures = self.parse(path)
+        key = (path, tuple(sorted(signatures.items())), tuple(argv))
+        page = self.pages.get(key)
+        if page is None:
+            arg_parser = build_main_arg_parser()
+            arg_parser.error = reject
+            # The model comes first, since options such as --include take any number of values.
+            args = arg_parser.parse_args([str(path), *argv])
+            args.model_file.close()
+            page = generate(args, tml_parser, return_html=True).encode('utf-8')
+            self.pages.put(key, page)
+        return page
+
+    def index(self):
+        links = ''.join(
+            F'<li><a href="/{quote(p.relative_to(self.root).as_posix())}">'
+            F"{escape(p.relative_to(self.root).as_posix())}</a></li>"
+            for p in sorted(self.root.rglob('*.tml'))
+        )
+        return F"<ul>{links}</ul>".encode('utf-8')
+
+
+class PreviewHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/':
+            return self.respond(200, self.server.index())
+
+        path = self.server.root.joinpath(unquote(url.path).lstrip('/')).resolve()
+        try:
+            path.relative_to(self.server.root)
+        except ValueError:
+            return self.respond(404, b'Not found.')
+        if not path.is_file():
+            return self.respond(404, b'Not found.')
+        try:
+            page = self.server.render(path, query_argv(url.query))
+        except ValueError as e:
+            return self.respond(400, escape(str(e)).encode('utf-8'))
+        except Exception as e:
+            logging.getLogger(__name__).error(F"Unable to render {path}: {e}")
+            return self.respond(500, escape(str(e)).encode('utf-8'))
+        self.respond(200, page)
+
+    def respond(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.getLogger(__name__).info(format % args)
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    prepare_logger(args.v)
+    logger = logging.getLogger(__name__)
+    # Where to point the browser, and each request, are shown as http.server would.
+    logger.setLevel(min(logger.getEffectiveLevel(), logging.INFO))
+
+    server = PreviewServer((args.host, args.port), args.root, args.max_entries)
+    logger.info(F"Serving {server.root} at http://{args.host}:{server.server_port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
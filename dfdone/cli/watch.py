@@ -0,0 +1,97 @@
+import logging
+
+from copy import copy
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from dfdone.cli.main import build_arg_parser as build_main_arg_parser
+from dfdone.cli.main import generate, prepare_logger
+from dfdone.tml.parser import Parser
+from dfdone.watch import file_signatures, get_watcher
+
+
+def build_arg_parser():
+    EXAMPLE = '\N{ESC}[7mEXAMPLE\N{ESC}[0m'
+
+    # Takes the same options as dfdone itself.
+    parser = build_main_arg_parser()
+    parser.prog = 'dfdone watch'
+    parser.description = (
+        'Writes the output to OUTPUT_DIR, then writes it again whenever the model,\n'
+        'or any file it includes, changes. Only files that changed are parsed again,\n'
+        'only tables whose contents changed are built again,\n'
+        'and Graphviz only runs again once the diagram itself changed.\n'
+        'Each time the output is written is logged as an informational message (-v).\n'
+        F"{EXAMPLE} \"dfdone watch model.tml --output-dir out -d html,svg\""
+    )
+    parser.epilog = None
+    return parser
+
+
+def regenerate(args, model_path, parsed_files, sections):
+    """
+    Writes the output for the model at model_path, as args call for,
+    and returns the paths of every file the model is made of.
+    Parsed files and built sections are kept for the next time.
+    """
+    args = copy(args)
+    with model_path.open() as model_file:
+        args.model_file = model_file
+        tml_parser = Parser(model_file, parsed_files=parsed_files)
+        generate(args, tml_parser, sections=sections)
+    # Results of files that changed since they were parsed are no longer needed.
+    Parser.forget_modified(parsed_files)
+    return tml_parser.included_files
+
+
+def watch(args, model_path, watcher):
+    """
+    Writes the output for the model at model_path, then writes it again
+    whenever any of its files change, until interrupted.
+    """
+    logger = logging.getLogger(__name__)
+    parsed_files, sections = dict(), dict()
+    paths, signatures = {model_path.resolve()}, None
+    watcher.watch(paths)
+    while True:
+        if file_signatures(paths) == signatures:
+            watcher.wait()
+            continue
+        # Taken beforehand, so that changes made meanwhile are not missed.
+        previous, start = file_signatures(paths), perf_counter()
+        try:
+            paths = regenerate(args, model_path, parsed_files, sections)
+        except Exception as e:
+            logger.error(F"Unable to write the output for {model_path}: {e}")
+        else:
+            logger.info(
+                F"Wrote the output for {model_path} to {args.output_dir} "
+                F"in {perf_counter() - start:.2f}s; watching {len(paths)} files."
+            )
+        watcher.watch(paths)
+        signatures = {**file_signatures(paths), **previous}
+
+
+def main(argv=None):
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    if args.output_dir is None:
+        parser.error('the following arguments are required: -o/--output-dir')
+    args.model_file.close()
+    model_path = Path(args.model_file.name)
+    prepare_logger(args.v)
+
+    with TemporaryDirectory() as cache_dir:
+        # Without a cache, Graphviz would run every time anything changed.
+        if args.cache_dir is None:
+            args.cache_dir = Path(cache_dir)
+
+        # Watching starts right away, so that no change made meanwhile is missed.
+        watcher = get_watcher([model_path.resolve()])
+        try:
+            watch(args, model_path, watcher)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.close()
@@ -0,0 +1,188 @@
+from itertools import chain
+from json import dumps
+
+from dfdone.canonical import (
+    component_fingerprints,
+    interaction_fingerprints,
+)
+from dfdone.enums import Risk as RiskEnum
+from dfdone.plot import table_from_list
+
+
+ADDED = 'added'
+REMOVED = 'removed'
+CHANGED = 'changed'
+
+
+class RiskChange:
+    def __init__(self, change, interaction, datum, threat, old_rating, new_rating):
+        self.change = change
+        self.interaction = interaction
+        self.datum = datum
+        self.threat = threat
+        self.old_rating = old_rating
+        self.new_rating = new_rating
+
+    def __repr__(self):
+        return repr(str(self))
+
+    def __str__(self):
+        return (
+            F"{self.change.title()} risk of {self.threat.label} "
+            F"on {self.datum.label} ({self.interaction}): "
+            F"{self.old_rating.name} -> {self.new_rating.name}"
+        )
+
+    @property
+    def delta(self):
+        # Added and removed risks are compared against a minimal rating,
+        # so that the delta says how much worse (or better) things got.
+        old = max(self.old_rating, RiskEnum.MINIMAL)
+        new = max(self.new_rating, RiskEnum.MINIMAL)
+        return int(new - old)
+
+    def as_dict(self):
+        return {
+            'change': self.change,
+            'interaction': str(self.interaction),
+            'sources': list(self.interaction.sources),
+            'targets': list(self.interaction.targets),
+            'datum': self.datum.name,
+            'threat': self.threat.name,
+            'old_rating': self.old_rating.name,
+            'new_rating': self.new_rating.name,
+            'delta': self.delta,
+        }
+
+
+class ModelDiff:
+    def __init__(self):
+        self.components = {ADDED: list(), REMOVED: list(), CHANGED: list()}
+        self.risks = list()
+
+    def __bool__(self):
+        return bool(self.risks or any(self.components.values()))
+
+    def as_dict(self):
+        return {
+            'components': self.components,
+            'risks': [r.as_dict() for r in self.risks],
+        }
+
+
+def risk_changes(change, interaction, old_interaction=None):
+    if old_interaction is None:
+        old_risks = dict()
+    else:
+        old_risks = old_interaction.risks
+    new_risks = interaction.risks if change is not REMOVED else dict()
+    reference = interaction if change is not REMOVED else old_interaction
+    for d_name in sorted(set(old_risks) | set(new_risks)):
+        old_dict = old_risks.get(d_name, dict())
+        new_dict = new_risks.get(d_name, dict())
+        for t_name in sorted(set(old_dict) | set(new_dict)):
+            old_risk, new_risk = old_dict.get(t_name), new_dict.get(t_name)
+            old_rating = old_risk.rating if old_risk else RiskEnum.UNKNOWN
+            new_rating = new_risk.rating if new_risk else RiskEnum.UNKNOWN
+            if old_risk and new_risk:
+                if old_rating == new_rating:
+                    continue
+                risk_change = CHANGED
+            else:
+                risk_change = ADDED if new_risk else REMOVED
+            risk = new_risk or old_risk
+            yield RiskChange(
+                risk_change, reference, risk.affected_datum, risk.threat,
+                old_rating, new_rating,
+            )
+
+
+def diff_models(old, new):
+    """
+    Compares two compiled models (dfdone.tml.parser.Parser instances).
+    Components are matched by name, and interactions by their sources,
+    targets, and data. Both models are reduced to fingerprints of their
+    canonical forms first, so only the items that actually changed are
+    inspected, and the comparison takes time linear in the size of the models.
+    """
+    result = ModelDiff()
+
+    old_fingerprints = component_fingerprints(old)
+    new_fingerprints = component_fingerprints(new)
+    for name, fingerprint in new_fingerprints.items():
+        if name not in old_fingerprints:
+            result.components[ADDED].append(name)
+        elif old_fingerprints[name] != fingerprint:
+            result.components[CHANGED].append(name)
+    for name in old_fingerprints:
+        if name not in new_fingerprints:
+            result.components[REMOVED].append(name)
+
+    old_interactions = interaction_fingerprints(old.interactions)
+    new_interactions = interaction_fingerprints(new.interactions)
+    for key, (index, fingerprint) in new_interactions.items():
+        interaction = new.interactions[index]
+        if key not in old_interactions:
+            result.risks.extend(risk_changes(ADDED, interaction))
+            continue
+        old_index, old_fingerprint = old_interactions[key]
+        if old_fingerprint != fingerprint:
+            result.risks.extend(risk_changes(
+                CHANGED, interaction, old.interactions[old_index]
+            ))
+    for key, (old_index, _) in old_interactions.items():
+        if key not in new_interactions:
+            result.risks.extend(risk_changes(
+                REMOVED, None, old.interactions[old_index]
+            ))
+
+    # Largest increases first, then largest decreases.
+    result.risks.sort(key=lambda r: (-r.delta, r.change, r.threat.name))
+    return result
+
+
+def diff_json(model_diff):
+    return dumps(model_diff.as_dict(), indent=2)
+
+
+def diff_html(model_diff):
+    risk_rows = list()
+    for i, risk_change in enumerate(model_diff.risks):
+        delta = F"{risk_change.delta:+d}" if risk_change.delta else '0'
+        risk_rows.append((
+            F'<tr class="change-{risk_change.change}">'
+            F'<td><span class="row-number diff-number">{i + 1}</span></td>'
+            F'<td><span class="change">{risk_change.change}</span></td>'
+            F'<td><span class="label interaction-label">{risk_change.interaction}</span></td>'
+            F'<td><span class="label data-label">{risk_change.datum.label}</span></td>'
+            F'<td><span class="label risk-label">{risk_change.threat.label}</span></td>'
+        ))
+        risk_rows.append('<td>')
+        for rating in (risk_change.old_rating, risk_change.new_rating):
+            risk_rows.append((
+                F'<div><span class="status risk-status risk-{rating.name.lower()}">'
+                F'&nbsp;</span><span class="label">{rating.name.title()}</span></div>'
+            ))
+        risk_rows.append('</td>')
+        risk_rows.append(F'<td><span class="delta">{delta}</span></td>')
+        risk_rows.append('</tr>')
+
+    component_rows = [
+        F'<tr class="change-{change}"><td><span class="change">{change}</span></td>'
+        F'<td><span class="label">{name}</span></td></tr>'
+        for change, names in model_diff.components.items()
+        for name in names
+    ]
+
+    return ''.join(chain(
+        table_from_list(
+            'diff-table',
+            ['#', 'Change', 'Interaction', 'Data', 'Threat', 'Old / New Rating', 'Delta'],
+            risk_rows,
+        ),
+        table_from_list(
+            'component-diff-table',
+            ['Change', 'Component'],
+            component_rows,
+        ),
+    ))
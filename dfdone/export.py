@@ -0,0 +1,137 @@
+from json import JSONEncoder
+
+from dfdone.canonical import flatten_clusters, name_of
+
+
+ENCODER = JSONEncoder(ensure_ascii=False)
+
+
+def cluster_record(cluster):
+    return {
+        'name': cluster.name,
+        'label': cluster.label,
+        'description': cluster.description,
+        'level': cluster.level,
+        'parent': name_of(cluster.parent),
+    }
+
+
+def element_record(element):
+    return {
+        'name': element.name,
+        'label': element.label,
+        'description': element.description,
+        'profile': element.profile.name,
+        'role': element.role.name,
+        'parent': name_of(element.parent),
+    }
+
+
+def note_record(note):
+    return {
+        'name': note.name,
+        'label': note.label,
+        'description': note.description,
+        'color': note.color,
+        'parent': name_of(note.parent),
+        'targets': list(note.targets),
+    }
+
+
+def datum_record(datum):
+    return {
+        'name': datum.name,
+        'label': datum.label,
+        'description': datum.description,
+        'classification': datum.classification.name,
+    }
+
+
+def threat_record(threat):
+    return {
+        'name': threat.name,
+        'label': threat.label,
+        'description': threat.description,
+        'impact': threat.impact.name,
+        'probability': threat.probability.name,
+        'potential_risk': threat.potential_risk.name,
+        'applicable_measures': list(threat.applicable_measures),
+    }
+
+
+def measure_record(measure):
+    return {
+        'name': measure.name,
+        'label': measure.label,
+        'description': measure.description,
+        'capability': measure.capability.name,
+        'mitigable_threats': list(measure.mitigable_threats),
+    }
+
+
+def interaction_record(index, interaction):
+    # Numbered as in the interaction table.
+    return {
+        'number': index + 1,
+        'action': interaction.action.name,
+        'sources': list(interaction.sources),
+        'targets': list(interaction.targets),
+        'data': list(interaction.data),
+        'notes': interaction.notes,
+        'highest_risk': interaction.highest_risk.name,
+        'risks': [
+            {
+                'datum': d_name,
+                'threat': t_name,
+                'rating': risk.rating.name,
+                # Measures in place against this threat, as the interaction table lists them.
+                'mitigations': [
+                    m_name for m_name, mitigation in risk.mitigations.items()
+                    if t_name in mitigation.measure.mitigable_threats
+                ],
+            }
+            for d_name, risk_dict in interaction.risks.items()
+            for t_name, risk in risk_dict.items()
+        ],
+        'mitigations': [
+            {
+                'datum': d_name,
+                'measure': m_name,
+                'imperative': mitigation.imperative.name,
+                'status': mitigation.status.name,
+            }
+            for d_name, mitigation_dict in interaction.mitigations.items()
+            for m_name, mitigation in mitigation_dict.items()
+        ],
+    }
+
+
+def json_chunks(clusters, elements, notes, data, threats, measures, interactions):
+    """
+    Yields the model as a JSON object, one record per line, so that only
+    a single record is ever encoded at a time, however large the model.
+    """
+    sections = {
+        'clusters': map(cluster_record, flatten_clusters(clusters).values()),
+        'elements': map(element_record, elements.values()),
+        'notes': map(note_record, notes.values()),
+        'data': map(datum_record, data.values()),
+        'threats': map(threat_record, threats.values()),
+        'measures': map(measure_record, measures.values()),
+        'interactions': (
+            interaction_record(index, interaction)
+            for index, interaction in enumerate(interactions)
+        ),
+    }
+    yield '{'
+    for s_index, (name, records) in enumerate(sections.items()):
+        yield ',\n' if s_index > 0 else '\n'
+        yield F'  "{name}": ['
+        separator = '\n    '
+        for record in records:
+            yield separator
+            yield ENCODER.encode(record)
+            separator = ',\n    '
+        yield '\n  ]' if separator != '\n    ' else ']'
+    yield '\n}\n'
+
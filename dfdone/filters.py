@@ -0,0 +1,155 @@
+# Filters narrow a model down before it is plotted, so that neither Graphviz
+# nor the tables pay for what is left out. A model is a dictionary with the keys
+# clusters, elements, data, threats, measures, notes, and interactions,
+# as in the Parser. Filters never modify the given model; they return a new one.
+
+from copy import copy
+from itertools import chain
+from logging import getLogger
+
+from dfdone.canonical import flatten_clusters
+from dfdone.tml.parser import Parser
+
+
+logger = getLogger(__name__)
+
+
+def cluster_elements(cluster, elements):
+    # Yields the names of elements within the cluster, or any of its descendants.
+    for e_name, e in elements.items():
+        parent = e.parent
+        while parent is not None:
+            if parent is cluster:
+                yield e_name
+                break
+            parent = parent.parent
+
+
+def prune_clusters(clusters, kept_names):
+    """
+    Returns copies of the given clusters, without those that have
+    no members left, neither directly nor within their descendants.
+    """
+    pruned = dict()
+    for c_name, cluster in clusters.items():
+        children = prune_clusters(cluster.children, kept_names)
+        if children or c_name in kept_names:
+            pruned[c_name] = copy(cluster)
+            pruned[c_name].children = children
+    return pruned
+
+
+def restrict(model, interactions, element_names=()):
+    """
+    Returns a copy of the model with only the given interactions,
+    along with the elements, data, and threats they involve,
+    the measures against those threats, and any other given elements.
+    Notes with no remaining targets, and clusters with no remaining members,
+    are left out; notes without any targets are kept along with their cluster.
+    """
+    element_names = set(element_names)
+    data_names, threat_names, measure_names = set(), set(), set()
+    for interaction in interactions:
+        element_names.update(interaction.sources, interaction.targets)
+        data_names.update(interaction.data)
+        for risk_dict in interaction.risks.values():
+            threat_names.update(risk_dict)
+        for mitigation_dict in interaction.mitigations.values():
+            measure_names.update(mitigation_dict)
+
+    elements = {n: e for n, e in model['elements'].items() if n in element_names}
+    kept_clusters = flatten_clusters(prune_clusters(
+        model['clusters'], {e.parent.name for e in elements.values() if e.parent is not None}
+    ))
+    notes = {
+        n_name: n for n_name, n in model['notes'].items()
+        if element_names.intersection(n.targets)
+        or (not n.targets and n.parent is not None and n.parent.name in kept_clusters)
+    }
+
+    # Measures applicable to the remaining threats are kept, even if not applied.
+    for t_name, threat in model['threats'].items():
+        if t_name in threat_names:
+            measure_names.update(threat.applicable_measures)
+
+    # As the Parser does for active threats and measures, copies are made
+    # so that applicable measures and mitigable threats can be filtered too.
+    threats, measures = dict(), dict()
+    for t_name, threat in model['threats'].items():
+        if t_name in threat_names:
+            threats[t_name] = copy(threat)
+            threats[t_name].applicable_measures = {
+                m_name: m for m_name, m in threat.applicable_measures.items()
+                if m_name in measure_names
+            }
+    for m_name, measure in model['measures'].items():
+        if m_name in measure_names:
+            measures[m_name] = copy(measure)
+            measures[m_name].mitigable_threats = {
+                t_name: t for t_name, t in measure.mitigable_threats.items()
+                if t_name in threat_names
+            }
+
+    members = {
+        c.parent.name for c in chain(elements.values(), notes.values()) if c.parent is not None
+    }
+    return {
+        'clusters': prune_clusters(model['clusters'], members),
+        'elements': elements,
+        'data': {n: d for n, d in model['data'].items() if n in data_names},
+        'threats': threats,
+        'measures': measures,
+        'notes': notes,
+        'interactions': list(interactions),
+    }
+
+
+def focus(model, names, depth=1):
+    """
+    Returns a copy of the model with only the interactions among elements
+    that are no more than depth interactions away from the named elements.
+    Naming a cluster focuses on every element within it.
+    """
+    reached = set()
+    for name in names:
+        if name in model['elements']:
+            reached.add(name)
+        elif (cluster := Parser.find_cluster(name, model['clusters'])) is not None:
+            reached.update(cluster_elements(cluster, model['elements']))
+        else:
+            logger.warning(F'Cannot focus on "{name}", which is not an element or cluster.')
+
+    # Every element that takes part in an interaction is one hop away from the others.
+    neighbors = dict()
+    for interaction in model['interactions']:
+        parties = interaction.sources.keys() | interaction.targets.keys()
+        for e_name in parties:
+            neighbors.setdefault(e_name, set()).update(parties)
+
+    frontier = set(reached)
+    for _ in range(depth):
+        frontier = {n for e_name in frontier for n in neighbors.get(e_name, ())} - reached
+        reached |= frontier
+
+    logger.info(F"Focusing on {len(reached)} of {len(model['elements'])} elements.")
+    return restrict(
+        model,
+        [
+            i for i in model['interactions']
+            if reached.issuperset(i.sources) and reached.issuperset(i.targets)
+        ],
+        reached.intersection(model['elements']),
+    )
+
+
+def min_risk(model, level):
+    """
+    Returns a copy of the model with only the interactions
+    whose highest risk is at least the given level.
+    """
+    interactions = [i for i in model['interactions'] if i.highest_risk >= level]
+    logger.info(
+        F"Keeping {len(interactions)} of {len(model['interactions'])} interactions "
+        F"rated {level.name.lower()} or higher."
+    )
+    return restrict(model, interactions)
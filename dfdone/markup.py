@@ -0,0 +1,255 @@
+from html.entities import html5
+from html.parser import HTMLParser
+from re import MULTILINE, compile as re_compile
+
+
+# Whitespace-only text collapses into a single character, except within these.
+PRESERVE_WHITESPACE_TAGS = {'pre', 'textarea'}
+# Text within these is output as-is.
+RAW_TEXT_TAGS = {'script', 'style'}
+VOID_TAGS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen',
+    'link', 'menuitem', 'meta', 'param', 'source', 'track', 'wbr',
+    # Obsolete, but still treated as void elements.
+    'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex', 'nextid', 'spacer',
+}
+# Attributes that hold whitespace-separated lists of values.
+LIST_ATTRIBUTES = {
+    '*': {'class', 'accesskey', 'dropzone'},
+    'a': {'rel', 'rev'},
+    'link': {'rel', 'rev'},
+    'td': {'headers'},
+    'th': {'headers'},
+    'form': {'accept-charset'},
+    'object': {'archive'},
+    'area': {'rel'},
+    'icon': {'sizes'},
+    'iframe': {'sandbox'},
+    'output': {'for'},
+}
+LINK_ATTRIBUTES = ('href', 'xlink:href')
+ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+
+NON_WHITESPACE = re_compile(r"\S+")
+META_CHARSET = re_compile(r"((^|;)\s*charset=)([^;]*)", MULTILINE)
+OUTPUT_ENCODING = 'utf-8'
+
+
+class Anchors:
+    """
+    Registry of the ids that end up in the output.
+    The renderers in dfdone.plot add the ids they emit as they go,
+    so that a MarkupWriter can tell dead links apart without a separate pass.
+    """
+    def __init__(self):
+        self.ids = set()
+
+    def __contains__(self, anchor_id):
+        return anchor_id in self.ids
+
+    def __repr__(self):
+        return F"Anchors({sorted(self.ids)!r})"
+
+    def add(self, anchor_id):
+        self.ids.add(anchor_id)
+        return anchor_id
+
+
+def escape(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def quote(value):
+    value = escape(value)
+    if '"' not in value:
+        return F'"{value}"'
+    if "'" not in value:
+        return F"'{value}'"
+    return '"{}"'.format(value.replace('"', '&quot;'))
+
+
+class MarkupWriter(HTMLParser):
+    """
+    Parses HTML as it is fed, and writes it back out with links
+    to unknown anchors removed from <a> tags.
+    The rewritten markup is normalized exactly as BeautifulSoup's html.parser
+    would normalize it: tag and attribute names lowercased, attributes sorted,
+    character references decoded, void elements closed, and so on.
+    Unlike BeautifulSoup, no document tree is ever built,
+    so memory use does not grow with the size of the output.
+
+    Links are only kept if they point to an id that is either registered
+    in the given anchors, or was written out earlier.
+    If anchors is None, all links are removed.
+    """
+    def __init__(self, write, anchors=None):
+        super().__init__(convert_charrefs=False)
+        self.write = write
+        self.anchors = anchors
+        self.text = list()
+        # Each open tag is a [name, start tag], where the start tag is only
+        # kept until the first child is written, as childless void elements
+        # are written as <name/>.
+        self.open_tags = list()
+        self.closed_void_tags = list()
+        self.preserving_whitespace = 0
+
+    def close(self):
+        super().close()
+        self.flush_text()
+        while self.open_tags:
+            self.pop_tag()
+
+    def is_live(self, link):
+        return self.anchors is not None and link[1:] in self.anchors
+
+    def start_tag(self, name, attrs):
+        attributes = dict()
+        for a_name, value in attrs:
+            attributes[a_name] = '' if value is None else value
+
+        list_attributes = LIST_ATTRIBUTES['*'] | LIST_ATTRIBUTES.get(name, set())
+        for a_name in list_attributes & attributes.keys():
+            attributes[a_name] = ' '.join(NON_WHITESPACE.findall(attributes[a_name]))
+
+        if name == 'meta':
+            # The output is always encoded as UTF-8.
+            if 'charset' in attributes:
+                attributes['charset'] = OUTPUT_ENCODING
+            elif (
+                'content' in attributes
+                and attributes.get('http-equiv', '').lower() == 'content-type'
+            ):
+                attributes['content'] = META_CHARSET.sub(
+                    lambda match: match.group(1) + OUTPUT_ENCODING,
+                    attributes['content']
+                )
+
+        if 'id' in attributes and self.anchors is not None:
+            self.anchors.add(attributes['id'])
+        if name == 'a':
+            for a_name in LINK_ATTRIBUTES:
+                # The xlink:title attribute in SVG anchors holds the tooltip,
+                # so only the link itself is removed, not the entire tag.
+                if a_name in attributes and not self.is_live(attributes[a_name]):
+                    del attributes[a_name]
+
+        return '<{}>'.format(' '.join([name] + [
+            F"{a_name}={quote(value)}"
+            for a_name, value in sorted(attributes.items())
+        ]))
+
+    def open_parent(self):
+        if self.open_tags and self.open_tags[-1][1] is not None:
+            self.write(self.open_tags[-1][1])
+            self.open_tags[-1][1] = None
+
+    def write_child(self, markup):
+        self.open_parent()
+        self.write(markup)
+
+    def push_tag(self, name, attrs):
+        self.flush_text()
+        self.open_parent()
+        self.open_tags.append([name, self.start_tag(name, attrs)])
+        if name in PRESERVE_WHITESPACE_TAGS:
+            self.preserving_whitespace += 1
+
+    def pop_tag(self):
+        name, start = self.open_tags.pop()
+        if name in PRESERVE_WHITESPACE_TAGS:
+            self.preserving_whitespace -= 1
+        if start is None:
+            self.write(F"</{name}>")
+        elif name in VOID_TAGS:
+            self.write(start[:-1] + '/>')
+        else:
+            self.write(F"{start}</{name}>")
+
+    def pop_to_tag(self, name):
+        if not any(open_name == name for open_name, _ in self.open_tags):
+            return
+        while self.open_tags[-1][0] != name:
+            self.pop_tag()
+        self.pop_tag()
+
+    def flush_text(self, prefix=None, suffix=''):
+        if not self.text:
+            return
+        text = ''.join(self.text)
+        self.text.clear()
+        if not self.preserving_whitespace and not text.strip(ASCII_SPACES):
+            text = '\n' if '\n' in text else ' '
+        if prefix is not None:
+            # Comments, declarations and the like are never escaped.
+            self.write_child(prefix + text + suffix)
+        elif self.open_tags and self.open_tags[-1][0] in RAW_TEXT_TAGS:
+            self.write_child(text)
+        else:
+            self.write_child(escape(text))
+
+    def handle_starttag(self, tag, attrs):
+        self.push_tag(tag, attrs)
+        if tag in VOID_TAGS:
+            self.pop_to_tag(tag)
+            # Any matching end tag that follows is redundant.
+            self.closed_void_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.push_tag(tag, attrs)
+        self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self.closed_void_tags:
+            self.closed_void_tags.remove(tag)
+            return
+        self.flush_text()
+        self.pop_to_tag(tag)
+
+    def handle_data(self, data):
+        self.text.append(data)
+
+    def handle_charref(self, name):
+        if name[0] in 'xX':
+            codepoint = int(name.lstrip(name[0]), 16)
+        else:
+            codepoint = int(name)
+        data = None
+        if codepoint < 256:
+            try:
+                data = bytes([codepoint]).decode('windows-1252')
+            except UnicodeDecodeError:
+                pass
+        if not data:
+            try:
+                data = chr(codepoint)
+            except (ValueError, OverflowError):
+                pass
+        self.text.append(data or '\N{REPLACEMENT CHARACTER}')
+
+    def handle_entityref(self, name):
+        self.text.append(html5.get(F"{name};", html5.get(name, F"&{name}")))
+
+    def handle_comment(self, data):
+        self.flush_text()
+        self.text.append(data)
+        self.flush_text('<!--', '-->')
+
+    def handle_decl(self, decl):
+        self.flush_text()
+        self.text.append(decl[len('DOCTYPE '):])
+        self.flush_text('<!DOCTYPE ', '>\n')
+
+    def unknown_decl(self, data):
+        self.flush_text()
+        if data.upper().startswith('CDATA['):
+            self.text.append(data[len('CDATA['):])
+            self.flush_text('<![CDATA[', ']]>')
+        else:
+            self.text.append(data)
+            self.flush_text('<?', '?>')
+
+    def handle_pi(self, data):
+        self.flush_text()
+        self.text.append(data)
+        self.flush_text('<?', '>')
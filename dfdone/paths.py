@@ -0,0 +1,235 @@
+from collections import deque
+from itertools import chain, product
+
+from dfdone.enums import (
+    Action,
+    Classification,
+    Profile,
+    Risk,
+    Role,
+)
+
+
+def bits(bitset):
+    while bitset:
+        low = bitset & -bitset
+        yield low.bit_length() - 1
+        bitset ^= low
+
+
+def flow(interaction):
+    """
+    Returns the elements that data comes from and those it goes to,
+    which, for interactions where the sources receive data, are the other
+    way around; edges of the overview diagram follow the same direction.
+    """
+    if interaction.action is Action.RECEIVE:
+        return interaction.targets, interaction.sources
+    return interaction.sources, interaction.targets
+
+
+class Reachability:
+    """
+    Directed graph of interactions between elements, in the direction
+    in which data flows, from the elements that send it to those that receive it.
+    Every element gets an index, and sets of elements are stored as integer
+    bitsets so that the transitive closure is a handful of bitwise ORs
+    per strongly connected component, even with thousands of elements.
+    """
+    def __init__(self, elements, interactions):
+        self.interactions = interactions
+        self.names = list(elements)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        for interaction in interactions:
+            for name in chain(interaction.sources, interaction.targets):
+                if name not in self.index:
+                    self.index[name] = len(self.names)
+                    self.names.append(name)
+
+        # Each element's successors, along with the interaction
+        # that allows each hop, which is needed to rebuild paths.
+        self.successors = [dict() for _ in self.names]
+        self.adjacency  = [0] * len(self.names)
+        # The senders of each interaction, as a bitset.
+        self.sender_bits = list()
+        for i_index, interaction in enumerate(interactions):
+            senders, receivers = flow(interaction)
+            sender_bits = 0
+            for s_name in senders:
+                sender_bits |= 1 << self.index[s_name]
+            self.sender_bits.append(sender_bits)
+            for s_name, t_name in product(senders, receivers):
+                s, t = self.index[s_name], self.index[t_name]
+                if s == t:
+                    continue
+                self.adjacency[s] |= 1 << t
+                self.successors[s].setdefault(t, i_index)
+
+        self.closure = self.transitive_closure()
+
+    def transitive_closure(self):
+        # Tarjan's algorithm emits strongly connected components
+        # in reverse topological order, so the closure of every successor
+        # component is already known when a component is emitted.
+        count = len(self.names)
+        order, lowlink = [None] * count, [0] * count
+        on_stack, stack = [False] * count, list()
+        component_closure = [0] * count
+        closure = [0] * count
+        counter = 0
+        for root in range(count):
+            if order[root] is not None:
+                continue
+            work = [(root, iter(bits(self.adjacency[root])))]
+            order[root] = lowlink[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = True
+            while work:
+                node, successors = work[-1]
+                for succ in successors:
+                    if order[succ] is None:
+                        order[succ] = lowlink[succ] = counter
+                        counter += 1
+                        stack.append(succ)
+                        on_stack[succ] = True
+                        work.append((succ, iter(bits(self.adjacency[succ]))))
+                        break
+                    elif on_stack[succ]:
+                        lowlink[node] = min(lowlink[node], order[succ])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        lowlink[parent] = min(lowlink[parent], lowlink[node])
+                    if lowlink[node] == order[node]:
+                        members, reach = 0, 0
+                        while True:
+                            member = stack.pop()
+                            on_stack[member] = False
+                            members |= 1 << member
+                            reach |= self.adjacency[member]
+                            if member == node:
+                                break
+                        # Successors outside this component are already closed.
+                        outside = reach & ~members
+                        for succ in bits(outside):
+                            reach |= component_closure[succ]
+                        for member in bits(members):
+                            component_closure[member] = reach
+                            closure[member] = reach
+        return closure
+
+    def reachable(self, name):
+        """
+        Returns the bitset of elements reachable from the named element,
+        which includes the element itself only if it is part of a cycle.
+        """
+        return self.closure[self.index[name]]
+
+    def reachable_elements(self, name):
+        return [self.names[i] for i in bits(self.reachable(name))]
+
+    def reachable_interactions(self, name):
+        # An interaction is reachable when any of its senders is reachable,
+        # or when the element itself is one of its senders.
+        reach = self.reachable(name) | 1 << self.index[name]
+        return [
+            i_index for i_index, sender_bits in enumerate(self.sender_bits)
+            if sender_bits & reach
+        ]
+
+    def shortest_hops(self, name):
+        # Breadth-first search that records, for each element,
+        # the index of the interaction used to first reach it.
+        start = self.index[name]
+        previous = {start: None}
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            for succ, i_index in self.successors[node].items():
+                if succ not in previous:
+                    previous[succ] = (node, i_index)
+                    queue.append(succ)
+        return previous
+
+    @staticmethod
+    def path_to(previous, node):
+        path = list()
+        while previous[node] is not None:
+            node, i_index = previous[node]
+            path.append(i_index)
+        return path[::-1]
+
+
+class AttackPath:
+    def __init__(self, agent, datum, risk, interaction_indices):
+        self.agent = agent
+        self.datum = datum
+        self.risk = risk
+        self.interaction_indices = interaction_indices
+
+    def __repr__(self):
+        return repr(str(self))
+
+    def __str__(self):
+        hops = ', '.join(str(i + 1) for i in self.interaction_indices)
+        return F"{self.risk.name.title()} risk to {self.datum.label} via {hops}"
+
+
+def highest_datum_risk(interaction, datum_name):
+    return Risk(max((
+        risk.rating for risk in interaction.risks.get(datum_name, dict()).values()
+    ), default=Risk.UNKNOWN))
+
+
+def find_attack_paths(elements, interactions):
+    """
+    For every black-box agent, returns the elements and data it can reach,
+    following the flow of data, and the highest-risk path
+    to every confidential datum it can reach.
+    When several paths carry the same risk, the shortest one is chosen.
+    """
+    graph = Reachability(elements, interactions)
+    results = dict()
+    for a_name, agent in elements.items():
+        if agent.profile is not Profile.BLACK or agent.role is not Role.AGENT:
+            continue
+
+        reachable_elements = {
+            name: elements[name] for name in graph.reachable_elements(a_name)
+            if name in elements and name != a_name
+        }
+        reachable_interactions = graph.reachable_interactions(a_name)
+        previous = graph.shortest_hops(a_name)
+
+        reachable_data, best = dict(), dict()
+        for i_index in reachable_interactions:
+            interaction = interactions[i_index]
+            reachable_data.update(interaction.data)
+            # The shortest path to any of this interaction's senders.
+            hops = min((
+                Reachability.path_to(previous, graph.index[s_name])
+                for s_name in flow(interaction)[0]
+                if graph.index[s_name] in previous
+            ), key=len)
+            for d_name, datum in interaction.data.items():
+                if datum.classification is not Classification.CONFIDENTIAL:
+                    continue
+                path = AttackPath(
+                    agent, datum,
+                    highest_datum_risk(interaction, d_name),
+                    hops + [i_index],
+                )
+                current = best.get(d_name)
+                if (current is None
+                or (path.risk, -len(path.interaction_indices))
+                    > (current.risk, -len(current.interaction_indices))):
+                    best[d_name] = path
+
+        results[a_name] = (
+            reachable_elements,
+            dict(sorted(reachable_data.items(), key=lambda d: d[1])),
+            sorted(best.values(), key=lambda p: (-p.risk, p.datum)),
+        )
+    return results
@@ -5,19 +5,31 @@
 # different layouts, pack for osage
 # seed if all fails
 
-from itertools import product
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from hashlib import blake2b
+from itertools import chain, combinations, product
+from json import dumps, loads
 from logging import getLogger
+from math import ceil, dist, floor, sqrt
+from re import DOTALL, compile as re_compile
+from shlex import split as shell_split
 from string import punctuation
+from subprocess import CalledProcessError, PIPE, TimeoutExpired, run
 from textwrap import wrap
 
-from graphviz import Digraph
+from graphviz import ExecutableNotFound
 
+from dfdone import timing
+from dfdone.cache import DEFAULT_CACHE_SIZE, RenderCache
 from dfdone.enums import (
     Action,
     Profile,
     Risk,
     Role,
 )
+from dfdone.paths import find_attack_paths, flow
 
 
 DATA = 'data'
@@ -26,24 +38,199 @@ MEASURE = 'measure'
 
 logger = getLogger(__name__)
 
+# Cheaper layout settings to fall back on when a layout exceeds its budget,
+# from most to least expensive, each as graph attributes to override
+# and whether to unflatten the graph before laying it out.
+LAYOUT_FALLBACKS = (
+    ({'splines': 'polyline'}, False),
+    ({'splines': 'line'}, False),
+    ({'splines': 'line'}, True),
+)
+SPLINES_BY_COST = ['ortho', 'polyline', 'line']
+# Rough number of edges, weighted by nesting depth, that Graphviz routes per second
+# with each kind of splines; settings that would not fit the budget are skipped.
+LAYOUT_RATES = {'ortho': 50, 'polyline': 2000}
+UNFLATTEN_FLAGS = ('-f', '-l', '3')
+
+# Edge attributes that can be changed in a rendered SVG without laying it out again.
+# Arrows cannot: risk ratings are told apart by where the arrowhead sits on the edge.
+RESTYLE_ATTRIBUTES = ('class', 'color')
+ARROW_ATTRIBUTES = ('arrowhead', 'arrowtail')
+SVG_STYLED_GROUP = re_compile(r'<g id="([^"]+)" class="([^"]*)">')
+SVG_GROUP_TAG = re_compile(r'<g[\s>]|</g>')
+SVG_SHAPE = re_compile(r'<(path|polygon)\b([^>]*)>')
+SVG_STROKE = re_compile(r'\bstroke="[^"]*"')
+SVG_FILL = re_compile(r'\bfill="[^"]*"')
+
+
+DOT_ID = re_compile(r"([a-zA-Z_][a-zA-Z0-9_]*|-?(\.[0-9]+|[0-9]+(\.[0-9]*)?))$")
+DOT_HTML_STRING = re_compile(r"<.*>$", DOTALL)
+DOT_KEYWORDS = {'node', 'edge', 'graph', 'digraph', 'subgraph', 'strict'}
+DOT_UNESCAPED_QUOTE = re_compile(r'(?P<bs>(?:\\\\)*)\\?(?P<quote>")')
+
+
+def dot_quote(identifier):
+    # Quotes identifiers exactly as graphviz.Digraph does,
+    # skipping the regular expressions wherever they cannot match.
+    if identifier.startswith('<') and DOT_HTML_STRING.match(identifier):
+        return identifier
+    if not DOT_ID.match(identifier) or identifier.lower() in DOT_KEYWORDS:
+        if '"' in identifier:
+            identifier = DOT_UNESCAPED_QUOTE.sub(r'\g<bs>\\\g<quote>', identifier)
+        return F'"{identifier}"'
+    return identifier
+
+
+def dot_quote_edge(identifier):
+    # Edge endpoints may specify a port and compass point: node:port:compass
+    node, _, rest = identifier.partition(':')
+    parts = [dot_quote(node)]
+    if rest:
+        port, _, compass = rest.partition(':')
+        parts.append(dot_quote(port))
+        if compass:
+            parts.append(compass)
+    return ':'.join(parts)
+
+
+def dot_a_list(*attribute_dicts):
+    return ' '.join(
+        F"{dot_quote(name)}={dot_quote(value)}"
+        for attributes in attribute_dicts
+        for name, value in sorted(attributes.items())
+        if value is not None
+    )
+
+
+def dot_attr_list(a_list):
+    return F" [{a_list}]" if a_list else ''
+
+
+class DotWriter:
+    """
+    Writes DOT source into a single buffer as the graph is built,
+    producing the same text as an equivalent graphviz.Digraph.
+    Subgraphs are written in place, rather than built separately and then
+    copied into their parents, so building takes time linear in the size
+    of the graph regardless of how deeply clusters are nested.
+    Also counts nodes, edges, and the deepest subgraph nesting,
+    which help estimate how long the graph will take to lay out.
+    Edge attributes that only style the edge, without affecting the layout,
+    are recorded by edge id, and left out of the layout key, so that a graph
+    whose edges were merely restyled can reuse a previous layout.
+    A graph that was already laid out holds its positioned output,
+    which is rendered without laying the graph out again.
+    """
+    engine = 'dot'
+
+    def __init__(self, graph_attr=dict(), node_attr=dict(), edge_attr=dict()):
+        self.graph_attr = dict(graph_attr)
+        self.node_attr = dict(node_attr)
+        self.edge_attr = dict(edge_attr)
+        self.lines = list()
+        self.layout_hash = blake2b(digest_size=20)
+        self.styles = dict()
+        self.depth = 0
+        self.max_depth = 0
+        self.node_count = 0
+        self.edge_count = 0
+        self.positioned = None
+
+    @property
+    def source(self):
+        return self.source_with()
+
+    def source_with(self, graph_attr=dict()):
+        # Graph attributes may be overridden without building the graph again.
+        return '\n'.join(chain(self.head(graph_attr), self.lines, ['}']))
+
+    def head(self, graph_attr=dict()):
+        head = ['digraph {']
+        for kind, attributes in (
+            ('graph', {**self.graph_attr, **graph_attr}),
+            ('node', self.node_attr),
+            ('edge', self.edge_attr),
+        ):
+            if attributes:
+                head.append(F"\t{kind} [{dot_a_list(attributes)}]")
+        return head
+
+    def layout_key(self):
+        # Identifies the source, less the styles of its edges.
+        layout_hash = self.layout_hash.copy()
+        layout_hash.update('\n'.join(self.head()).encode('utf-8'))
+        return layout_hash.hexdigest()
+
+    def statement(self, statement, layout_statement=None):
+        indentation = '\t' * (self.depth + 1)
+        self.lines.append(indentation + statement)
+        self.layout_hash.update(
+            (indentation + (layout_statement or statement) + '\n').encode('utf-8')
+        )
+
+    @contextmanager
+    def subgraph(self, name):
+        self.statement(F"subgraph {dot_quote(name)} {{")
+        self.depth += 1
+        self.max_depth = max(self.max_depth, self.depth)
+        yield self
+        self.depth -= 1
+        self.statement('}')
+
+    def attr(self, *attribute_dicts):
+        if any(attribute_dicts):
+            self.statement(dot_a_list(*attribute_dicts))
+
+    def node(self, name, attributes):
+        self.statement(dot_quote(name) + dot_attr_list(dot_a_list(attributes)))
+        self.node_count += 1
+
+    def edge(self, tail_name, head_name, attributes):
+        edge = F"{dot_quote_edge(tail_name)} -> {dot_quote_edge(head_name)}"
+        items = [
+            (name, F"{dot_quote(name)}={dot_quote(value)}")
+            for name, value in sorted(attributes.items())
+            if value is not None
+        ]
+        self.statement(
+            edge + dot_attr_list(' '.join(item for _, item in items)),
+            edge + dot_attr_list(' '.join(
+                item for name, item in items if name not in RESTYLE_ATTRIBUTES
+            )),
+        )
+        if 'id' in attributes:
+            # Arrows are kept along with the styles, to tell which arrowheads are open.
+            self.styles[attributes['id']] = {
+                name: attributes[name] for name in RESTYLE_ATTRIBUTES + ARROW_ATTRIBUTES
+                if attributes.get(name) is not None
+            }
+        self.edge_count += 1
+
 
 def table_from_list(class_name, table_headers, table_rows):
-    if not table_rows:
-        return ''
-    final_list = ['<thead>']
+    """
+    Generates the markup of a table, piece by piece,
+    consuming table_rows only as the table is written out.
+    Nothing is generated if there are no rows.
+    """
+    table_rows = iter(table_rows)
+    first_row = next(table_rows, None)
+    if first_row is None:
+        return
+    yield F'<table class="{class_name}">'
+    yield '<thead>'
     for header in table_headers:
-        final_list.append(F"<th>{header}</th>")
-    final_list.append('</thead>')
-    final_list.append('<tbody>')
-    final_list.extend(table_rows)
-    final_list.append('</tbody>')
+        yield F"<th>{header}</th>"
+    yield '</thead>'
     # The interaction table already uses <tbody> tags
     # to target entire interaction rows when 2 or more data are sent at once.
-    if class_name == 'interaction-table':
-        final_list.remove('<tbody>')
-        final_list.pop()
-    table_body = ''.join(final_list)
-    return F'<table class="{class_name}">{table_body}</table>'
+    if class_name != 'interaction-table':
+        yield '<tbody>'
+    yield first_row
+    yield from table_rows
+    if class_name != 'interaction-table':
+        yield '</tbody>'
+    yield '</table>'
 
 
 slugify = str.maketrans(' ', '-', punctuation.replace('_', ''))
@@ -51,15 +238,27 @@ def id_format(name):
     return name.lower().replace('-', ' ').translate(slugify)
 
 
+def anchor(anchors, anchor_id):
+    # Records each id as it is emitted, so that links to it are kept.
+    if anchors is not None:
+        anchors.add(anchor_id)
+    return anchor_id
+
+
+def register_anchors(anchors, anchor_ids):
+    # Tables are generated lazily, so their ids are recorded up front;
+    # otherwise, links written before their targets would be dropped.
+    if anchors is not None:
+        for anchor_id in anchor_ids:
+            anchors.add(anchor_id)
+
+
 def build_table_rows(class_prefix, component_dict):
-    table_rows = list()
     for i, component in enumerate(component_dict.values()):
-        table_rows.append(F'<tr id="{id_format(component.name)}">')
-        table_rows.append('<td>')
-        table_rows.append(
-            F'<span class="row-number {class_prefix}-number">{i + 1}</span>'
-        )
-        table_rows.append('</td>')
+        yield F'<tr id="{id_format(component.name)}">'
+        yield '<td>'
+        yield F'<span class="row-number {class_prefix}-number">{i + 1}</span>'
+        yield '</td>'
 
         if class_prefix == DATA:
             status_class = F"classification-{component.classification.name.lower()}"
@@ -72,56 +271,56 @@ def build_table_rows(class_prefix, component_dict):
                 F"class_prefix must be one of [{DATA}, {THREAT}, {MEASURE}]"
             )
 
-        table_rows.append('<td>')
-        table_rows.append((
+        yield '<td>'
+        yield (
             F'<div><span class="status {class_prefix}-status {status_class}">'
             F'&nbsp;</span><span class="label {class_prefix}-label">'
             F'{component.label}</span></div>'
-        ))
-        table_rows.append('</td>')
+        )
+        yield '</td>'
 
         if class_prefix == THREAT:
-            table_rows.append('<td>')
+            yield '<td>'
             if not component.applicable_measures:
-                table_rows.append('<span class="dash">-</span>')
+                yield '<span class="dash">-</span>'
             else:
                 for measure_name, measure in component.applicable_measures.items():
-                    table_rows.append((
+                    yield (
                         F'<a href="#{id_format(measure_name)}" target="_self"><div>'
                         F'<span class="status measure-status '
                         F'capability-{measure.capability.name.lower()}">'
                         F'&nbsp;</span><span class="label measure-label">'
                         F'{measure.label}</span></div></a>'
-                    ))
-            table_rows.append('</td>')
+                    )
+            yield '</td>'
 
         if class_prefix == MEASURE:
-            table_rows.append('<td>')
+            yield '<td>'
             if not component.mitigable_threats:
-                table_rows.append('<span class="dash">-</span>')
+                yield '<span class="dash">-</span>'
             else:
                 for threat_name, threat in component.mitigable_threats.items():
-                    table_rows.append((
+                    yield (
                         F'<a href="#{id_format(threat_name)}" target="_self"><div>'
                         F'<span class="status threat-status '
                         F'risk-{threat.potential_risk.name.lower()}">'
                         F'&nbsp;</span><span class="label threat-label">'
                         F'{threat.label}</span></div></a>'
-                    ))
-            table_rows.append('</td>')
+                    )
+            yield '</td>'
 
-        table_rows.append('<td>')
-        table_rows.append('<span class="{}">{}</span>'.format(
+        yield '<td>'
+        yield '<span class="{}">{}</span>'.format(
             F"description {class_prefix}-description" if component.description
             else 'dash',
             component.description.replace('\n', '<br>') or '-'
-        ))
-        table_rows.append('</td>')
-        table_rows.append('</tr>')
-    return table_rows
+        )
+        yield '</td>'
+        yield '</tr>'
 
 
-def build_data_table(data):
+def build_data_table(data, anchors=None):
+    register_anchors(anchors, (id_format(c.name) for c in data.values()))
     headers = ['#', 'Data', 'Description']
     return table_from_list(
         'data-table',
@@ -130,7 +329,8 @@ def build_data_table(data):
     )
 
 
-def build_threat_table(threats):
+def build_threat_table(threats, anchors=None):
+    register_anchors(anchors, (id_format(c.name) for c in threats.values()))
     headers = ['#', 'Security Threat', 'Applicable Measures', 'Description']
     return table_from_list(
         'threat-table',
@@ -139,7 +339,8 @@ def build_threat_table(threats):
     )
 
 
-def build_measure_table(measures):
+def build_measure_table(measures, anchors=None):
+    register_anchors(anchors, (id_format(c.name) for c in measures.values()))
     headers = ['#', 'Security Measure', 'Mitigable Threats', 'Description']
     return table_from_list(
         'measure-table',
@@ -147,45 +348,77 @@ def build_measure_table(measures):
         build_table_rows(MEASURE, measures)
     )
 
-def place_clusters(graph, clusters, elements, notes, interactions, options):
+def map_cluster_members(components):
+    # Maps each cluster name to the components placed directly within it.
+    members = dict()
+    for component in components.values():
+        if component.parent is not None:
+            members.setdefault(component.parent.name, list()).append(component)
+    return members
+
+
+def map_element_interactions(interactions):
+    # Maps each element name to the (index, interaction) pairs it takes part in.
+    element_interactions = dict()
+    for index, interaction in enumerate(interactions):
+        for e_name in interaction.sources.keys() | interaction.targets.keys():
+            element_interactions.setdefault(e_name, list()).append((index, interaction))
+    return element_interactions
+
+
+def place_clusters(
+    graph, clusters, cluster_elements, cluster_notes, element_interactions, options,
+    anchors=None
+):
     for c_name, cluster in clusters.items():
-        cid = id_format(c_name)
+        cid = anchor(anchors, id_format(c_name))
         attributes = {
             'id': cid,
             'class': F"element-cluster cluster-level-{cluster.level}",
         }
         # Graphviz requirement: name must start with 'cluster'.
-        cluster_graph = Digraph(name=F"cluster_{c_name}")
-        cluster_graph.attr(
-            label=cluster.label,
-            _attributes=attributes,
-            **options['cluster_attrs']
-        )
-        c_labels = list()
-        for child_name, child in cluster.children.items():
-            c_labels.append(child.label)
-            place_clusters(
-                cluster_graph, {child_name: child},
-                elements, notes, interactions, options
+        with graph.subgraph(F"cluster_{c_name}"):
+            graph.attr(
+                {'label': cluster.label, **options['cluster_attrs']},
+                attributes
             )
-        for e in elements.values():
-            if e.parent is cluster:
-                add_element(cluster_graph, e, interactions, options)
+            c_labels = list()
+            for child_name, child in cluster.children.items():
+                c_labels.append(child.label)
+                place_clusters(
+                    graph, {child_name: child},
+                    cluster_elements, cluster_notes, element_interactions, options, anchors
+                )
+            for e in cluster_elements.get(c_name, list()):
+                add_element(
+                    graph, e, element_interactions.get(e.name, list()),
+                    options, anchors
+                )
                 c_labels.append(e.label)
-        for n in notes.values():
-            if n.parent is cluster:
-                add_note(cluster_graph, n)
+            for n in cluster_notes.get(c_name, list()):
+                add_note(graph, n, anchors)
 
-        tooltip = F"{cluster}\\n- " + '\\n- '.join(c_labels)
-        cluster_graph.attr(tooltip=tooltip)
-        graph.subgraph(cluster_graph)
+            c_labels = cap_entries(c_labels, options['tooltip_limit'])
+            tooltip = F"{cluster}\\n- " + '\\n- '.join(c_labels)
+            graph.attr({'tooltip': tooltip})
 
 
 def get_diagram_options(merge_options=dict()):
+    # Copy to avoid popping from the caller's dictionary.
+    merge_options = dict(merge_options)
     options = {
         'combine': False,
+        'bundle': False,
         'no_numbers': False,
+        'tooltip_limit': None,
         'wrap_labels': None,
+        'cache_dir': None,
+        'cache_size': DEFAULT_CACHE_SIZE,
+        'partition': False,
+        'jobs': None,
+        'layout_budget': None,
+        # Positioned outputs of graphs laid out beforehand, by DOT source.
+        'layouts': None,
         'graph_attrs': {
             'bgcolor': 'transparent',
             'fontname': 'Monospace',
@@ -224,11 +457,34 @@ def get_diagram_options(merge_options=dict()):
     return options
 
 
-def find_parallel(interaction, interactions):
-    return [
-        (index, other) for index, other in enumerate(interactions)
-        if interaction.sources | interaction.targets == other.sources | other.targets
-    ]
+def group_interactions(interactions, combine=False):
+    """
+    Returns a list of groups, each a list of (index, interaction) pairs.
+    If combine is True, interactions between the same set of elements
+    share a group; otherwise, each interaction is in a group of its own.
+    Groups are ordered by their first interaction, which leads the group.
+    """
+    groups = dict()
+    for index, interaction in enumerate(interactions):
+        key = index
+        if combine:
+            key = frozenset(interaction.sources).union(interaction.targets)
+        groups.setdefault(key, list()).append((index, interaction))
+    return list(groups.values())
+
+
+def bundle_interactions(interactions):
+    """
+    Returns a list of ([(source name, target name)], group) tuples,
+    one for each ordered pair of elements that interact, where the group
+    holds every (index, interaction) pair between those two elements.
+    Bundles are ordered by their first interaction, which leads the bundle.
+    """
+    bundles = dict()
+    for index, interaction in enumerate(interactions):
+        for pair in product(interaction.sources, interaction.targets):
+            bundles.setdefault(pair, list()).append((index, interaction))
+    return [([pair], group) for pair, group in bundles.items()]
 
 
 def get_tooltip(interaction_index, interaction):
@@ -239,76 +495,110 @@ def get_tooltip(interaction_index, interaction):
     return tooltip
 
 
-def build_diagram(clusters, elements, notes, interactions, options=dict(), fmt=None):
+def cap_entries(entries, limit=None):
+    # Keeps no more than limit entries, noting how many more there are.
+    if limit is None or len(entries) <= limit:
+        return entries
+    return entries[:limit] + [F"+{len(entries) - limit} more"]
+
+
+def get_tooltips(selected_interactions, limit=None):
+    """
+    Returns the tooltip of each (index, interaction) pair, but no more than limit,
+    so that tooltips of elements and edges with many interactions stay small.
+    """
+    tooltips = [get_tooltip(i, si) for i, si in selected_interactions[:limit]]
+    if len(selected_interactions) > len(tooltips):
+        tooltips.append(F"+{len(selected_interactions) - len(tooltips)} more")
+    return tooltips
+
+
+def build_graph(
+    clusters, elements, notes, interactions, options=dict(), anchors=None, groups=None
+):
     options = get_diagram_options(merge_options=options)
+    if groups is None:
+        groups = group_interactions(interactions, options['combine'])
 
-    dot = Digraph()
-    dot.graph_attr = options['graph_attrs']
-    dot.node_attr  = options['node_attrs' ]
-    dot.edge_attr  = options['edge_attrs' ]
+    dot = DotWriter(
+        graph_attr=options['graph_attrs'],
+        node_attr =options['node_attrs' ],
+        edge_attr =options['edge_attrs' ],
+    )
 
-    place_clusters(dot, clusters, elements, notes, interactions, options)
+    # Computed once, so that placing each component
+    # does not require going through the entire model again.
+    element_interactions = map_element_interactions(interactions)
+    place_clusters(
+        dot, clusters,
+        map_cluster_members(elements), map_cluster_members(notes), element_interactions,
+        options, anchors
+    )
     for e in elements.values():
         if e.parent is None:
-            add_element(dot, e, interactions, options)
+            add_element(dot, e, element_interactions.get(e.name, list()), options, anchors)
     for n_name, n in notes.items():
         if n.parent is None:
-            add_note(dot, n)
+            add_note(dot, n, anchors)
         for e_name, e in n.targets.items():
-            dot.edge(e_name, n_name, style='dashed', dir='none')
+            if e_name in elements:
+                dot.edge(e_name, n_name, {'style': 'dashed', 'dir': 'none'})
+
+    leaders = None
+    if options['bundle']:
+        edge_groups = bundle_interactions(interactions)
+        # Bundles link to the row of the group their first interaction is in,
+        # which is the only one written out for the group.
+        leaders = {i: group[0][0] for group in groups for i, _ in group}
+    else:
+        edge_groups = (
+            (product(group[0][1].sources, group[0][1].targets), group)
+            for group in groups
+        )
 
-    skip = list()
     attributes = dict()
-    for index, interaction in enumerate(interactions):
-        if (index, interaction) in skip:
+    edge_ids = dict()
+    for pairs, selected_interactions in edge_groups:
+        index, interaction = selected_interactions[0]
+        # Only elements in this graph are connected,
+        # which matters when it is one partition of the diagram.
+        pairs = [
+            (s_name, t_name) for s_name, t_name in pairs
+            if s_name in elements and t_name in elements
+        ]
+        if not pairs:
             continue
-
-        max_risk = interaction.highest_risk
+        max_risk = max(si.highest_risk for _, si in selected_interactions)
+        edge_id, leader = F"edge-{index + 1}", index
+        if leaders is not None:
+            leader = leaders[index]
+            # Several bundles may share their first interaction,
+            # so all but the first of them are numbered.
+            edge_ids[edge_id] = edge_ids.get(edge_id, 0) + 1
+            if edge_ids[edge_id] > 1:
+                edge_id = F"{edge_id}-{edge_ids[edge_id]}"
         attributes = {
-            'id': F"edge-{index + 1}",
+            'id': anchor(anchors, edge_id),
             'class': F"risk-{max_risk.name.lower()}",
             'dir': 'forward',
-            'URL': F"#interaction-{index + 1}",
+            'URL': F"#interaction-{leader + 1}",
         }
 
-        selected_interactions = [(index, interaction)]
-        if (options['combine']):
-            selected_interactions = find_parallel(interaction, interactions)
-            max_risk = max(si.highest_risk for i, si in selected_interactions)
-            attributes['class'] = F"risk-{max_risk.name.lower()}"
-            skip.extend(selected_interactions)
-
-        tooltip = '\\n'.join(get_tooltip(i, si) for i, si in selected_interactions)
+        limit = options['tooltip_limit']
+        tooltip = '\\n'.join(get_tooltips(selected_interactions, limit))
         attributes['edgetooltip'] = tooltip
         if not options['no_numbers']:
             attributes.update({
                 'taillabel': str(index + 1),
                 'tailtooltip': tooltip,
             })
+            if limit is not None:
+                # Rather than repeating the edge tooltip, refer to the interaction table.
+                attributes['tailtooltip'] = 'Interactions ' + ', '.join(cap_entries(
+                    [str(i + 1) for i, _ in selected_interactions], limit
+                ))
 
-        if 'color' not in options['edge_attrs']:
-            attributes.update({
-                'color': {
-                    Risk.UNKNOWN : 'Silver'   ,
-                    Risk.MINIMAL : 'LimeGreen',
-                    Risk.LOW     : 'Black'    ,
-                    Risk.MEDIUM  : 'Orange'   ,
-                    Risk.HIGH    : 'Crimson'  ,
-                    Risk.CRITICAL: 'Crimson'  ,
-                }.get(max_risk)
-            })
-
-        attributes['arrowhead'] = options['edge_attrs'].get('arrowhead', 'normal')
-        attributes['arrowtail'] = 'none'  # not allowing arrowtail customization
-        if 'arrowhead' not in options['edge_attrs']:
-            attributes['arrowhead'] = {
-                Risk.UNKNOWN : 'o' + attributes['arrowhead'],
-                Risk.MINIMAL : 'none'*3 + 'o' + attributes['arrowhead'],
-                Risk.LOW     : 'none'*3 + attributes['arrowhead'],
-                Risk.MEDIUM  : 'none'*2 + attributes['arrowhead'],
-                Risk.HIGH    : 'none'*1 + attributes['arrowhead'],
-                Risk.CRITICAL: 'none'*0 + attributes['arrowhead'],
-            }.get(max_risk)
+        style_edge(attributes, max_risk, options)
         if set(i.action for _, i in selected_interactions) == set(Action):
             attributes['dir'] = 'both'
             attributes['arrowtail'] = attributes['arrowhead']
@@ -321,30 +611,547 @@ def build_diagram(clusters, elements, notes, interactions, options=dict(), fmt=N
             if 'tailtooltip' in attributes:
                 attributes['headtooltip'] = attributes.pop('tailtooltip')
 
-        for source, target in product(
-            interaction.sources.values(),
-            interaction.targets.values()
-        ):
-            target_name = target.name
-            dot.edge(
-                source.name,
-                target_name,
-                _attributes=attributes,
-            )
+        for s_name, t_name in pairs:
+            dot.edge(s_name, t_name, attributes)
+
+    if options['layouts']:
+        dot.positioned = options['layouts'].get(dot.source)
+    return dot
+
+
+def style_edge(attributes, max_risk, options):
+    if 'color' not in options['edge_attrs']:
+        attributes.update({
+            'color': {
+                Risk.UNKNOWN : 'Silver'   ,
+                Risk.MINIMAL : 'LimeGreen',
+                Risk.LOW     : 'Black'    ,
+                Risk.MEDIUM  : 'Orange'   ,
+                Risk.HIGH    : 'Crimson'  ,
+                Risk.CRITICAL: 'Crimson'  ,
+            }.get(max_risk)
+        })
+
+    attributes['arrowhead'] = options['edge_attrs'].get('arrowhead', 'normal')
+    attributes['arrowtail'] = 'none'  # not allowing arrowtail customization
+    if 'arrowhead' not in options['edge_attrs']:
+        attributes['arrowhead'] = {
+            Risk.UNKNOWN : 'o' + attributes['arrowhead'],
+            Risk.MINIMAL : 'none'*3 + 'o' + attributes['arrowhead'],
+            Risk.LOW     : 'none'*3 + attributes['arrowhead'],
+            Risk.MEDIUM  : 'none'*2 + attributes['arrowhead'],
+            Risk.HIGH    : 'none'*1 + attributes['arrowhead'],
+            Risk.CRITICAL: 'none'*0 + attributes['arrowhead'],
+        }.get(max_risk)
+
+
+def map_top_level_clusters(clusters, top_level=None, mapping=None):
+    # Maps each cluster name to the name of the top-level cluster containing it.
+    if mapping is None:
+        mapping = dict()
+    for c_name, cluster in clusters.items():
+        mapping[c_name] = top_level or c_name
+        map_top_level_clusters(cluster.children, top_level or c_name, mapping)
+    return mapping
+
+
+def build_overview(
+    clusters, elements, notes, interactions, top_levels, options, anchors=None
+):
+    """
+    Builds a graph with one node per top-level cluster, alongside the elements
+    and notes that are not in any cluster. Interactions between these are
+    aggregated into a single edge per direction, carrying the highest risk.
+    """
+    dot = DotWriter(
+        graph_attr=options['graph_attrs'],
+        node_attr =options['node_attrs' ],
+        edge_attr =options['edge_attrs' ],
+    )
+
+    def unit(e_name):
+        parent = elements[e_name].parent
+        return e_name if parent is None else top_levels[parent.name]
+
+    cluster_labels = dict()
+    for e in elements.values():
+        if e.parent is not None:
+            cluster_labels.setdefault(unit(e.name), list()).append(e.label)
+    cluster_attrs = {
+        k: v for k, v in options['cluster_attrs'].items()
+        if k in ('color', 'fillcolor', 'style')
+    }
+    wrap_width = options['wrap_labels']
+    for c_name, cluster in clusters.items():
+        cid = id_format(c_name)
+        label = cluster.label
+        if wrap_width is not None:
+            label = '\\n'.join(wrap(label, width=wrap_width))
+        dot.node(c_name, {
+            **cluster_attrs,
+            'id': anchor(anchors, F"{cid}-overview"),
+            'class': 'element-cluster cluster-level-1 overview-cluster',
+            'label': label,
+            'shape': 'box',
+            'URL': F"#{anchor(anchors, F'diagram-{cid}')}",
+            'tooltip': F"{cluster}\\n- " + '\\n- '.join(cap_entries(
+                cluster_labels.get(c_name, list()), options['tooltip_limit']
+            )),
+        })
+
+    element_interactions = map_element_interactions(interactions)
+    for e in elements.values():
+        if e.parent is None:
+            add_element(dot, e, element_interactions.get(e.name, list()), options, anchors)
+    for n_name, n in notes.items():
+        if n.parent is not None:
+            continue
+        add_note(dot, n, anchors)
+        for u_name in dict.fromkeys(unit(e_name) for e_name in n.targets if e_name in elements):
+            dot.edge(u_name, n_name, {'style': 'dashed', 'dir': 'none'})
+
+    # Edges follow the direction in which data flows, as attack paths do.
+    flows = dict()
+    for index, interaction in enumerate(interactions):
+        for s_name, t_name in product(*flow(interaction)):
+            if s_name not in elements or t_name not in elements:
+                continue
+            units = (unit(s_name), unit(t_name))
+            if units[0] != units[1]:
+                flows.setdefault(units, dict())[index] = interaction
+
+    for f_index, ((tail, head), flow_interactions) in enumerate(flows.items()):
+        max_risk = max(i.highest_risk for i in flow_interactions.values())
+        attributes = {
+            'id': anchor(anchors, F"overview-edge-{f_index + 1}"),
+            'class': F"risk-{max_risk.name.lower()}",
+            'dir': 'forward',
+            'URL': F"#interaction-{next(iter(flow_interactions)) + 1}",
+            'edgetooltip': '\\n'.join(get_tooltips(
+                list(flow_interactions.items()), options['tooltip_limit']
+            )),
+        }
+        style_edge(attributes, max_risk, options)
+        dot.edge(tail, head, attributes)
+
+    return dot
+
+
+def build_graphs(
+    clusters, elements, notes, interactions, options=dict(), anchors=None, groups=None
+):
+    """
+    Returns a list of (name, label, graph) tuples. Unless the diagram is partitioned,
+    that is a single graph, with neither name nor label. Otherwise, the overview
+    comes first, followed by a detailed graph for each top-level cluster.
+    """
+    with timing.phase('dot'):
+        graphs = build_partitions(
+            clusters, elements, notes, interactions, options, anchors, groups
+        )
+    timing.count('dot edges', sum(graph.edge_count for _, _, graph in graphs))
+    return graphs
+
+
+def build_partitions(
+    clusters, elements, notes, interactions, options=dict(), anchors=None, groups=None
+):
+    options = get_diagram_options(merge_options=options)
+    if groups is None:
+        groups = group_interactions(interactions, options['combine'])
+    if not options['partition']:
+        return [(None, None, build_graph(
+            clusters, elements, notes, interactions, options, anchors, groups
+        ))]
+
+    top_levels = map_top_level_clusters(clusters)
+    graphs = [('overview', None, build_overview(
+        clusters, elements, notes, interactions, top_levels, options, anchors
+    ))]
+    for c_name, cluster in clusters.items():
+        graphs.append((id_format(c_name), cluster.label, build_graph(
+            {c_name: cluster},
+            {
+                e_name: e for e_name, e in elements.items()
+                if e.parent is not None and top_levels[e.parent.name] == c_name
+            },
+            {
+                n_name: n for n_name, n in notes.items()
+                if n.parent is not None and top_levels[n.parent.name] == c_name
+            },
+            interactions, options, anchors, groups
+        )))
+    return graphs
+
+
+def render_graphs(graphs, formats, cache=None, jobs=None, budget=None):
+    """
+    Renders each (name, label, graph) tuple in every given format,
+    returning (name, label, {format: output}) tuples in the same order.
+    Graphviz runs in its own processes, so graphs are laid out in parallel,
+    with no more than the given number of jobs at once.
+    """
+    if len(graphs) == 1:
+        name, label, graph = graphs[0]
+        return [(name, label, render_formats(graph, formats, cache, budget))]
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        rendered = executor.map(
+            lambda g: render_formats(g[2], formats, cache, budget), graphs
+        )
+        return [(name, label, r) for (name, label, _), r in zip(graphs, rendered)]
+
+
+def build_diagram(
+    clusters, elements, notes, interactions, options=dict(), fmt=None, anchors=None,
+    groups=None,
+):
+    options = get_diagram_options(merge_options=options)
+    with timing.phase('dot'):
+        dot = build_graph(clusters, elements, notes, interactions, options, anchors, groups)
+    timing.count('dot edges', dot.edge_count)
+    cache = get_render_cache(options)
 
     if fmt is not None:
-        dot.format = fmt
-        return dot.pipe()
+        return render(dot, fmt, cache, options['layout_budget'])
 
     # Return the wrapped SVG source:
-    dot.format = 'svg'
+    return wrap_svg(render(dot, 'svg', cache, options['layout_budget']))
+
+
+def prepare_diagram(
+    clusters, elements, notes, interactions, options=dict(), anchors=None, groups=None
+):
+    """
+    Builds the graph right away, registering its anchors,
+    but returns a function that renders the wrapped SVG source,
+    so that Graphviz can run while the rest of the output is written.
+    """
+    options = get_diagram_options(merge_options=options)
+    graphs = build_graphs(clusters, elements, notes, interactions, options, anchors, groups)
+    cache = get_render_cache(options)
+    return lambda: wrap_diagrams(render_graphs(
+        graphs, ['svg'], cache, options['jobs'], options['layout_budget']
+    ))
+
+
+def wrap_svg(svg):
     return (
         '<div id="diagram">'
-        F"{dot.pipe().decode('utf-8')}"
+        F"{svg.decode('utf-8')}"
         '</div>'
     )
 
 
+def wrap_diagrams(rendered):
+    # The overview, or the only diagram, is followed by each partition,
+    # which links back to the overview.
+    html = list()
+    for name, label, outputs in rendered:
+        if label is None:
+            html.append(wrap_svg(outputs['svg']))
+            continue
+        html.append(
+            F'<div id="diagram-{name}" class="diagram-partition">'
+            F'<a href="#diagram" target="_self">{label}</a>'
+            F"{outputs['svg'].decode('utf-8')}"
+            '</div>'
+        )
+    return ''.join(html)
+
+
+def get_render_cache(options):
+    if options['cache_dir'] is None:
+        return None
+    return RenderCache(options['cache_dir'], options['cache_size'] * 2**20)
+
+
+def run_graphviz(source, engine, fmt, flags=(), timeout=None):
+    # Without a format, the command is not a layout engine, e.g., unflatten.
+    cmd = [engine, *flags, *([F"-T{fmt}"] if fmt is not None else [])]
+    logger.debug(F"Running {' '.join(cmd)}")
+    try:
+        # If the timeout expires, the process is killed before raising TimeoutExpired.
+        with timing.phase('graphviz'):
+            process = run(
+                cmd, input=source.encode('utf-8'), stdout=PIPE, stderr=PIPE, timeout=timeout
+            )
+    except FileNotFoundError as e:
+        raise ExecutableNotFound(cmd) from e
+    if process.stderr:
+        logger.warning(process.stderr.decode('utf-8', errors='replace').strip())
+    if process.returncode:
+        raise CalledProcessError(
+            process.returncode, cmd, output=process.stdout, stderr=process.stderr
+        )
+    return process.stdout
+
+
+def pipe(source, engine, fmt, cache=None, flags=(), timeout=None):
+    renderer = partial(run_graphviz, source, engine, fmt, flags, timeout)
+    if cache is None:
+        return renderer()
+    return cache.render(source, ' '.join([engine, *flags]), fmt, renderer)
+
+
+def render(graph, fmt, cache=None, budget=None):
+    if fmt == 'svg' and cache is not None and graph.styles:
+        return render_restyled(graph, cache, budget)
+    return lay_out(graph, fmt, cache, budget)
+
+
+def lay_out(graph, fmt, cache=None, budget=None):
+    if graph.positioned is not None:
+        return position(graph.positioned, fmt, cache)
+    if budget is None:
+        return pipe(graph.source, graph.engine, fmt, cache)
+    return render_within_budget(graph, fmt, cache, budget)
+
+
+def render_restyled(graph, cache, budget=None):
+    """
+    Renders the graph as SVG, cached along with the styles of its edges,
+    under a key that leaves those styles out. Whenever only edge styles
+    changed since the graph was cached, such as the color of an edge whose
+    arrowhead was set with --edge-attrs, when its risk rating changed,
+    the cached SVG is restyled instead of laying the graph out again.
+    """
+    key = cache.key(graph.layout_key(), graph.engine, 'svg+styles')
+    entry = cache.get(key)
+    if entry is None:
+        svg = lay_out(graph, 'svg', None, budget)
+    else:
+        styles, _, svg = entry.partition(b'\n')
+        styles = loads(styles)
+        if styles == graph.styles:
+            return svg
+        svg = restyle_svg(svg, styles, graph.styles)
+        logger.info('Restyled the diagram without laying it out again.')
+    cache.put(key, dumps(graph.styles).encode('utf-8') + b'\n' + svg)
+    return svg
+
+
+def restyle_svg(svg, old_styles, new_styles):
+    """
+    Applies new edge styles to an SVG rendered by Graphviz, by edge id.
+    Classes and colors are replaced, and arrowheads filled with the new color,
+    unless they are open; the arrows themselves must be the same in both styles.
+    """
+    text = svg.decode('utf-8')
+    restyled, position = list(), 0
+    for match in SVG_STYLED_GROUP.finditer(text):
+        element_id = match.group(1)
+        style = new_styles.get(element_id)
+        if style is None or old_styles.get(element_id) == style:
+            continue
+        start, end = match.end(), svg_group_end(text, match.end())
+        # Graphviz prefixes the class with the kind of element, e.g., "edge".
+        kind = match.group(2).split()[:1]
+        restyled.append(text[position:match.start()])
+        restyled.append(
+            F'<g id="{element_id}" class="{" ".join(kind + [style.get("class", "")]).strip()}">'
+        )
+        restyled.append(SVG_SHAPE.sub(partial(repaint_shape, style), text[start:end]))
+        position = end
+    restyled.append(text[position:])
+    return ''.join(restyled).encode('utf-8')
+
+
+def svg_group_end(text, position):
+    # Returns where the group opened just before position closes.
+    depth = 1
+    for match in SVG_GROUP_TAG.finditer(text, position):
+        depth += -1 if match.group() == '</g>' else 1
+        if depth == 0:
+            return match.start()
+    return len(text)
+
+
+def repaint_shape(style, match):
+    color = style.get('color')
+    if color is None:
+        return match.group()
+    tag, attributes = match.groups()
+    attributes = SVG_STROKE.sub(F'stroke="{color}"', attributes)
+    if tag == 'polygon':
+        # Arrowheads whose shape starts with "o" are open, e.g., onormal.
+        arrows = [
+            style.get(name, 'none').replace('none', '')
+            for name in ARROW_ATTRIBUTES
+        ]
+        fill = 'none' if any(a.startswith('o') for a in arrows) else color
+        attributes = SVG_FILL.sub(F'fill="{fill}"', attributes)
+    return F"<{tag}{attributes}>"
+
+
+def get_layout_settings(graph, budget):
+    """
+    Returns the (graph attributes, unflatten) settings to try, in order.
+    The configured settings come first, unless the size of the graph suggests
+    that they would not fit the budget, followed by cheaper fallbacks.
+    """
+    configured = graph.graph_attr.get('splines')
+    settings = [({}, False)] + [
+        (graph_attr, unflatten) for graph_attr, unflatten in LAYOUT_FALLBACKS
+        # Never fall back on splines that cost more than the configured ones.
+        if configured not in SPLINES_BY_COST
+        or SPLINES_BY_COST.index(graph_attr['splines']) > SPLINES_BY_COST.index(configured)
+        or unflatten
+    ]
+    cost = graph.edge_count * (graph.max_depth + 1)
+    while len(settings) > 1:
+        rate = LAYOUT_RATES.get(settings[0][0].get('splines', configured))
+        if rate is None or cost <= rate * budget:
+            break
+        settings.pop(0)
+    return settings
+
+
+def describe_layout_settings(graph, graph_attr, unflatten):
+    splines = graph_attr.get('splines', graph.graph_attr.get('splines'))
+    return F"splines={splines}" + (' after unflatten' if unflatten else '')
+
+
+def render_within_budget(graph, fmt, cache, budget):
+    """
+    Lays out the graph, killing Graphviz whenever it takes longer than
+    the budget, in seconds, and retrying with cheaper settings.
+    The cheapest settings are given as long as they need.
+    """
+    settings = get_layout_settings(graph, budget)
+    logger.debug(
+        F"Graph has {graph.node_count} nodes, {graph.edge_count} edges, "
+        F"and a nesting depth of {graph.max_depth}."
+    )
+    for attempt, (graph_attr, unflatten) in enumerate(settings, 1):
+        description = describe_layout_settings(graph, graph_attr, unflatten)
+        timeout = budget if attempt < len(settings) else None
+        source = graph.source_with(graph_attr)
+        try:
+            if unflatten:
+                source = run_graphviz(
+                    source, 'unflatten', None, UNFLATTEN_FLAGS, timeout
+                ).decode('utf-8')
+            output = pipe(source, graph.engine, fmt, cache, timeout=timeout)
+        except TimeoutExpired:
+            logger.warning(
+                F"Layout with {description} exceeded the budget of {budget}s; "
+                'retrying with cheaper settings.'
+            )
+            continue
+        logger.info(F"Laid out the diagram with {description}.")
+        return output
+
+
+def render_formats(graph, formats, cache=None, budget=None):
+    """
+    Renders the graph in every given format, but only lays it out once:
+    the first run outputs the positioned graph, which is then rendered
+    into each format by neato with layout disabled (neato -n2).
+    """
+    formats = list(dict.fromkeys(formats))
+    if len(formats) == 1:
+        return {formats[0]: render(graph, formats[0], cache, budget)}
+
+    positioned = render(graph, 'dot', cache, budget)
+    return {fmt: position(positioned, fmt, cache) for fmt in formats}
+
+
+def position(positioned, fmt, cache=None):
+    # Renders a graph from its positioned output, with layout disabled.
+    if fmt in ('dot', 'gv'):
+        return positioned
+    return pipe(positioned.decode('utf-8'), 'neato', fmt, cache, flags=('-n2',))
+
+
+def segments_cross(segment1, segment2):
+    # Segments that merely touch, such as edges from the same node, do not cross.
+    def orientation(a, b, c):
+        cross = (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+        return (cross > 0) - (cross < 0)
+    (a, b), (c, d) = segment1, segment2
+    return (
+        orientation(a, b, c) * orientation(a, b, d) < 0
+        and orientation(c, d, a) * orientation(c, d, b) < 0
+    )
+
+
+def segment_cells(segment, origin, side):
+    """
+    Yields every cell of a grid, of the given origin and cell side, that the
+    segment passes through, column by column. Cells are slightly widened,
+    so that a point on the border between two cells is in both of them.
+    """
+    (x0, y0), (x1, y1) = sorted(segment)
+    margin = side * 1e-6
+    first = floor((x0 - origin[0] - margin) / side)
+    last = floor((x1 - origin[0] + margin) / side)
+    for column in range(first, last + 1):
+        # The part of the segment within this column.
+        left = max(x0, origin[0] + column * side)
+        right = min(x1, origin[0] + (column + 1) * side)
+        if x1 == x0:
+            low, high = min(y0, y1), max(y0, y1)
+        else:
+            slope = (y1 - y0) / (x1 - x0)
+            low, high = sorted((y0 + (left - x0) * slope, y0 + (right - x0) * slope))
+        for row in range(
+            floor((low - origin[1] - margin) / side),
+            floor((high - origin[1] + margin) / side) + 1,
+        ):
+            yield column, row
+
+
+def count_crossings(segments):
+    """
+    Counts the pairs of segments that cross. Segments are placed in a grid
+    of about as many cells as there are segments, and only segments that
+    pass through the same cell are compared, each pair only once.
+    """
+    if len(segments) < 2:
+        return 0
+    xs = [x for segment in segments for x, _ in segment]
+    ys = [y for segment in segments for _, y in segment]
+    origin = min(xs), min(ys)
+    side = max(max(xs) - origin[0], max(ys) - origin[1]) / ceil(sqrt(len(segments))) or 1
+    grid = dict()
+    for index, segment in enumerate(segments):
+        for cell in segment_cells(segment, origin, side):
+            grid.setdefault(cell, list()).append(index)
+    compared = set()
+    crossings = 0
+    for indices in grid.values():
+        for pair in combinations(indices, 2):
+            if pair in compared:
+                continue
+            compared.add(pair)
+            crossings += segments_cross(segments[pair[0]], segments[pair[1]])
+    return crossings
+
+
+def score_layout(plain):
+    """
+    Scores a layout given in Graphviz's plain output format; lower is better.
+    Scores are compared by edge crossings first, approximating each edge
+    by a straight line between its ends, then by the total length of edges,
+    then by the area of the graph.
+    """
+    area = 0
+    edges = list()
+    for line in plain.decode('utf-8').splitlines():
+        if line.startswith('graph '):
+            _, _, width, height = line.split()
+            area = float(width) * float(height)
+        elif line.startswith('edge '):
+            # Node names may be quoted.
+            fields = shell_split(line)
+            count = int(fields[3])
+            coordinates = [float(f) for f in fields[4:4 + 2 * count]]
+            edges.append(list(zip(coordinates[::2], coordinates[1::2])))
+    length = sum(dist(a, b) for points in edges for a, b in zip(points, points[1:]))
+    crossings = count_crossings([(points[0], points[-1]) for points in edges])
+    return (crossings, length, area)
+
+
 def get_storage_shape(color, label):
     row = '<tr><td bgcolor="{}" color="{}" cellpadding="{}">{}</td></tr>'
     stripe_row  = row.format("Black", "Black", 2, ''                          )
@@ -361,8 +1168,8 @@ def get_storage_shape(color, label):
     )
 
 
-def add_element(graph, element, interactions, options):
-    eid = id_format(element.name)
+def add_element(graph, element, element_interactions, options, anchors=None):
+    eid = anchor(anchors, id_format(element.name))
     attributes = {
         'id': eid,
         'class': F"profile-{element.profile.value} role-{element.role.value}",
@@ -401,31 +1208,25 @@ def add_element(graph, element, interactions, options):
         attributes['peripheries'] = '0'
 
     attributes['tooltip'] = str(element)
-    element_interactions = list()
-    for index, interaction in enumerate(interactions):
-        if element.name in interaction.sources | interaction.targets:
-            element_interactions.append((index, interaction))
     if element_interactions:
         attributes['tooltip'] += '\\n'
         attributes['tooltip'] += '\\n'.join(
-            get_tooltip(index, interaction)
-            for index, interaction in element_interactions
+            get_tooltips(element_interactions, options['tooltip_limit'])
         )
 
     # These invisible clusters help organize the graph, hosting each element.
     container_name = F"cluster_{eid}"
     container_attrs = {
-        'id': F"{eid}_container",
+        'id': anchor(anchors, F"{eid}_container"),
         'class': 'element-container',
         'label': '',
         'margin': options['cluster_attrs']['margin'],
         'rank': 'same',  # only has an effect with newrank=true
         'style': 'invis',
     }
-    container = Digraph(name=container_name)
-    container.attr(_attributes=container_attrs)
-    container.node(element.name, _attributes=attributes)
-    graph.subgraph(container)
+    with graph.subgraph(container_name):
+        graph.attr(container_attrs)
+        graph.node(element.name, attributes)
 
 
 def get_note_shape(note):
@@ -452,8 +1253,8 @@ def get_note_shape(note):
     )
 
 
-def add_note(graph, note):
-    name = id_format(note.name)
+def add_note(graph, note, anchors=None):
+    name = anchor(anchors, id_format(note.name))
     attributes = {
         'id': name,
         'class': F"note note-{note.color}",
@@ -464,21 +1265,21 @@ def add_note(graph, note):
         'shape': 'plain',
         'tooltip': ' ',
     }
-    graph.node(note.name, _attributes=attributes)
+    graph.node(note.name, attributes)
 
 
 def build_risks_cell(risks, mitigations, rowspan=1):
-    cell = [F"<td rowspan={rowspan}>"]
+    yield F"<td rowspan={rowspan}>"
     for r_name, risk in risks.items():
-        cell.append((
+        yield (
             F'<a href="#{id_format(r_name)}" target="_self"><div>'
             F'<span class="status risk-status risk-{risk.rating.name.lower()}">&nbsp;</span>'
             F'<span class="label risk-label">{risk.threat.label}</span></div></a>'
-        ))
+        )
         for m_name, mitigation in mitigations.items():
             if r_name not in mitigation.measure.mitigable_threats:
                 continue
-            cell.append((
+            yield (
                 F'<a href="#{id_format(m_name)}" target="_self">'
                 F'<div><span class="status mitigation-status '
                 F'status-{mitigation.status.name.lower()} '
@@ -486,14 +1287,11 @@ def build_risks_cell(risks, mitigations, rowspan=1):
                 F'<span class="label mitigation-label '
                 F'imperative-{mitigation.imperative.name.lower()}">'
                 F"{mitigation.measure.label}</span></div></a>"
-            ))
-    cell.append('</td>')
-    return cell
+            )
+    yield '</td>'
 
 
 def build_interaction_rows(i_index, interaction):
-    rows = list()
-
     data_risks, interaction_risks = dict(), dict()
     for datum_name, risk_dict in interaction.risks.items():
         for r_name, risk in risk_dict.items():
@@ -513,77 +1311,137 @@ def build_interaction_rows(i_index, interaction):
                 data_risks[datum_name] = risk_dict
 
     interaction_rowspan = len(interaction.data)
-    rows.append((
+    yield (
         F'<tr><td rowspan="{interaction_rowspan}">'
         F'<a href=#edge-{i_index + 1} target="_self">'
         F'<span class="row-number interaction-number">'
         F"{i_index + 1}</span></a></td>"
-    ))
+    )
 
     for di, datum in enumerate(interaction.data.values()):
         if di > 0:
-            rows.append('<tr>')
-        rows.append((
+            yield '<tr>'
+        yield (
             F'<td><a href="#{id_format(datum.name)}" target="_self"><div>'
             F'<span class="status data-status '
             F'classification-{datum.classification.name.lower()}">'
             F'&nbsp;</span><span class="label data-label">'
             F'{datum.label}</span></div></a></td>'
-        ))
+        )
 
         if datum.name not in data_risks:
-            rows.append('<td><span class="dash">-</span></td>')
+            yield '<td><span class="dash">-</span></td>'
         else:
-            rows.extend(build_risks_cell(
+            yield from build_risks_cell(
                 {n: r for n, r in data_risks[datum.name].items()
                     if n not in interaction_risks},
                 interaction.mitigations.get(datum.name, dict()),
-            ))
+            )
 
         if di == 0:
             if not interaction_risks:
-                rows.append((
+                yield (
                     F'<td rowspan="{interaction_rowspan}">'
                     '<span class="dash">-</span></td>'
-                ))
+                )
             else:
-                rows.extend(build_risks_cell(
+                yield from build_risks_cell(
                     interaction_risks,
                     {n: m for m_dict in interaction.mitigations.values()
                         for n, m in m_dict.items()},
                     rowspan=interaction_rowspan,
-                ))
+                )
 
-            rows.append(
-                F'<td rowspan="{interaction_rowspan}">'
-            )
-            rows.append('<span class="{}">{}</span>'.format(
+            yield F'<td rowspan="{interaction_rowspan}">'
+            yield '<span class="{}">{}</span>'.format(
                 'interaction-notes' if interaction.notes
                 else 'dash',
                 interaction.notes.replace('\n', '<br>') or '-'
-            ))
-            rows.append('</td>')
+            )
+            yield '</td>'
 
-        rows.append('</tr>')
-    return rows
+        yield '</tr>'
 
-def build_interaction_table(interactions, combine=False):
-    interaction_table, skip = list(), list()
-    for index, interaction in enumerate(interactions):
-        if (index, interaction) in skip:
-            continue
-        interaction_table.append(F'<tbody id="interaction-{index + 1}">')
-
-        selected_interactions = [(index, interaction)]
-        if combine:
-            selected_interactions = find_parallel(interaction, interactions)
-            skip.extend(selected_interactions)
 
+def build_interaction_groups(groups):
+    for selected_interactions in groups:
+        index, _ = selected_interactions[0]
+        yield F'<tbody id="interaction-{index + 1}">'
         for i, si in selected_interactions:
-            interaction_table.extend(
-                build_interaction_rows(i, si)
-            )
-        interaction_table.append('</tbody>')
+            yield from build_interaction_rows(i, si)
+        yield '</tbody>'
+
+
+def build_interaction_table(interactions, combine=False, anchors=None, groups=None):
+    if groups is None:
+        groups = group_interactions(interactions, combine)
+    register_anchors(anchors, (F"interaction-{group[0][0] + 1}" for group in groups))
+
     headers = ['#', 'Data', 'Data Risks', 'Interaction Risks', 'Notes']
-    return table_from_list('interaction-table', headers, interaction_table)
+    return table_from_list('interaction-table', headers, build_interaction_groups(groups))
+
+
+def build_path_rows(agent_index, agent, reachable_elements, reachable_data, attack_paths):
+    yield F'<tr id="paths-{id_format(agent.name)}">'
+    yield '<td>'
+    yield F'<span class="row-number path-number">{agent_index + 1}</span>'
+    yield '</td>'
+    yield (
+        F'<td><a href="#{id_format(agent.name)}" target="_self">'
+        F'<span class="label agent-label">{agent.label}</span></a></td>'
+    )
+
+    yield '<td>'
+    if not reachable_elements:
+        yield '<span class="dash">-</span>'
+    for e_name, element in reachable_elements.items():
+        yield (
+            F'<a href="#{id_format(e_name)}" target="_self"><div>'
+            F'<span class="label element-label">{element.label}</span></div></a>'
+        )
+    yield '</td>'
+
+    yield '<td>'
+    if not reachable_data:
+        yield '<span class="dash">-</span>'
+    for d_name, datum in reachable_data.items():
+        yield (
+            F'<a href="#{id_format(d_name)}" target="_self"><div>'
+            F'<span class="status data-status '
+            F'classification-{datum.classification.name.lower()}">'
+            F'&nbsp;</span><span class="label data-label">'
+            F'{datum.label}</span></div></a>'
+        )
+    yield '</td>'
+
+    yield '<td>'
+    if not attack_paths:
+        yield '<span class="dash">-</span>'
+    for path in attack_paths:
+        hops = ' &rarr; '.join(
+            F'<a href="#interaction-{i + 1}" target="_self">{i + 1}</a>'
+            for i in path.interaction_indices
+        )
+        yield (
+            F'<div><span class="status risk-status risk-{path.risk.name.lower()}">'
+            F'&nbsp;</span><span class="label data-label">{path.datum.label}</span>'
+            F'<span class="label path-hops">{hops}</span></div>'
+        )
+    yield '</td>'
+    yield '</tr>'
+
+
+def build_path_table_rows(elements, attack_paths):
+    for a_index, (a_name, results) in enumerate(attack_paths.items()):
+        yield from build_path_rows(a_index, elements[a_name], *results)
+
+
+def build_path_table(elements, interactions, anchors=None):
+    attack_paths = find_attack_paths(elements, interactions)
+    register_anchors(anchors, (F"paths-{id_format(a_name)}" for a_name in attack_paths))
+    headers = [
+        '#', 'Black-Box Agent', 'Reachable Elements',
+        'Reachable Data', 'Highest-Risk Paths to Confidential Data'
+    ]
+    return table_from_list('path-table', headers, build_path_table_rows(elements, attack_paths))
 
@@ -0,0 +1,444 @@
+# Snapshots hold a parsed model, so that it can be loaded again without parsing.
+# They are zlib-compressed JSON, following a magic number and a format version,
+# which, unlike pickle, never runs any code while loading. Every record is checked
+# as it is loaded, and the loaded model must match a digest of the original one.
+
+from hashlib import blake2b
+from json import dumps, loads
+from os import O_NONBLOCK, O_RDONLY, close, fstat, open as open_fd, read
+from pathlib import Path
+from stat import S_ISREG
+from struct import Struct
+from zlib import compress, decompressobj, error as ZlibError
+
+from dfdone.canonical import (
+    canonical_component,
+    canonical_interaction,
+    flatten_clusters,
+    name_of,
+)
+from dfdone.components import (
+    Cluster,
+    Datum,
+    Element,
+    Interaction,
+    Measure,
+    Mitigation,
+    Note,
+    Risk,
+    Threat,
+)
+from dfdone.enums import (
+    Action,
+    Capability,
+    Classification,
+    Impact,
+    Imperative,
+    Probability,
+    Profile,
+    Role,
+    Status,
+)
+
+
+MAGIC = b'TMLC'
+VERSION = 1
+HEADER = Struct('>4sH')
+MAX_SIZE = 256 * 2**20  # in bytes, once decompressed
+MAX_SOURCE_SIZE = 16 * 2**20  # in bytes, for each source checked
+
+
+class Snapshot:
+    """
+    A model loaded from a snapshot, with the same attributes as a Parser.
+    Sources maps the path of each file the model was parsed from,
+    relative to the snapshot's directory if it was within it,
+    to a digest of its contents at the time.
+    """
+    def __init__(self):
+        self.clusters = dict()
+        self.elements = dict()
+        self.data     = dict()
+        self.threats  = dict()
+        self.measures = dict()
+        self.notes    = dict()
+        self.interactions = list()
+
+        self.active_elements = dict()
+        self.active_data     = dict()
+        self.active_threats  = dict()
+        self.active_measures = dict()
+
+        self.sources = dict()
+
+    @property
+    def included_files(self):
+        return set(self.sources)
+
+
+def source_digest(path, max_size=MAX_SOURCE_SIZE):
+    """
+    Returns a digest of the file at path, or None if it is not a regular file,
+    or is larger than max_size bytes.
+    """
+    if not path.is_file():
+        return None
+    # Opened without blocking, in case it was replaced by a FIFO meanwhile.
+    fd = open_fd(path, O_RDONLY | O_NONBLOCK)
+    try:
+        if not S_ISREG(fstat(fd).st_mode):
+            return None
+        h, size = blake2b(digest_size=16), 0
+        while True:
+            chunk = read(fd, 2**16)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_size:
+                return None
+            h.update(chunk)
+    finally:
+        close(fd)
+    return h.hexdigest()
+
+
+def model_digest(model):
+    """
+    Returns a digest of everything in the model that DFDone renders,
+    including the order of every dictionary.
+    """
+    def components(component_dict):
+        return tuple(
+            (name, canonical_component(c)) for name, c in component_dict.items()
+        )
+
+    def measure_order(threats):
+        return tuple((name, tuple(t.applicable_measures)) for name, t in threats.items())
+
+    def threat_order(measures):
+        return tuple((name, tuple(m.mitigable_threats)) for name, m in measures.items())
+
+    form = (
+        tuple(
+            (c.name, canonical_component(c), tuple(c.children))
+            for c in flatten_clusters(model.clusters).values()
+        ),
+        tuple(model.clusters),
+        components(model.elements),
+        components(model.data),
+        components(model.threats),
+        components(model.measures),
+        components(model.notes),
+        components(model.active_elements),
+        components(model.active_data),
+        components(model.active_threats),
+        components(model.active_measures),
+        measure_order(model.threats),
+        threat_order(model.measures),
+        measure_order(model.active_threats),
+        threat_order(model.active_measures),
+        tuple(
+            (
+                canonical_interaction(i),
+                tuple(i.sources), tuple(i.targets), tuple(i.data),
+                tuple((d_name, tuple(r)) for d_name, r in i.risks.items()),
+                tuple((d_name, tuple(m)) for d_name, m in i.mitigations.items()),
+            )
+            for i in model.interactions
+        ),
+    )
+    return blake2b(repr(form).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def threat_record(t):
+    return [
+        t.name, t.label, t.description, t.impact.name, t.probability.name,
+        list(t.applicable_measures),
+    ]
+
+
+def measure_record(m):
+    return [m.name, m.label, m.description, m.capability.name, list(m.mitigable_threats)]
+
+
+def dump_model(model, directory=None):
+    """
+    Returns a snapshot of the model, which is a Parser or an equivalent object.
+    The paths of the files it was parsed from are recorded relative to directory,
+    which is where the snapshot is to be written, if they are within it.
+    """
+    def relative(path):
+        try:
+            return path.relative_to(Path(directory).resolve())
+        except (TypeError, ValueError):
+            return path
+
+    sources = list()
+    for path in sorted(model.included_files):
+        digest = source_digest(path)
+        if digest is not None:
+            sources.append([str(relative(path)), digest])
+    document = {
+        'clusters': [
+            [c.name, c.label, c.description, c.level, name_of(c.parent)]
+            for c in flatten_clusters(model.clusters).values()
+        ],
+        'elements': [
+            [e.name, e.label, e.description, e.profile.name, e.role.name, name_of(e.parent)]
+            for e in model.elements.values()
+        ],
+        'notes': [
+            [n.name, n.label, n.description, n.color, name_of(n.parent), list(n.targets)]
+            for n in model.notes.values()
+        ],
+        'data': [
+            [d.name, d.label, d.description, d.classification.name]
+            for d in model.data.values()
+        ],
+        'threats': [threat_record(t) for t in model.threats.values()],
+        'measures': [measure_record(m) for m in model.measures.values()],
+        'active_elements': list(model.active_elements),
+        'active_data': list(model.active_data),
+        'active_threats': [threat_record(t) for t in model.active_threats.values()],
+        'active_measures': [measure_record(m) for m in model.active_measures.values()],
+        'interactions': [
+            [
+                i.action.name, list(i.sources), list(i.targets), list(i.data), i.notes,
+                [[d_name, list(risk_dict)] for d_name, risk_dict in i.risks.items()],
+                [
+                    [d_name, [
+                        [m_name, m.imperative.name, m.status.name]
+                        for m_name, m in mitigation_dict.items()
+                    ]]
+                    for d_name, mitigation_dict in i.mitigations.items()
+                ],
+            ]
+            for i in model.interactions
+        ],
+        'sources': sources,
+        'digest': model_digest(model),
+    }
+    return HEADER.pack(MAGIC, VERSION) + compress(
+        dumps(document, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    )
+
+
+def expect(condition, message):
+    if not condition:
+        raise ValueError(F"Invalid snapshot: {message}.")
+
+
+def records(document, key, length):
+    value = document.get(key, list())
+    expect(isinstance(value, list), F"{key} must be a list")
+    for record in value:
+        expect(
+            isinstance(record, list) and len(record) == length,
+            F"every item of {key} must be a list of {length} values"
+        )
+        yield record
+
+
+def texts(*values):
+    for value in values:
+        expect(isinstance(value, str), F"{value!r} must be a string")
+    return values
+
+
+def names(value):
+    expect(isinstance(value, list), F"{value!r} must be a list of names")
+    return texts(*value)
+
+
+def enum(enum_type, name):
+    expect(
+        isinstance(name, str) and name in enum_type.__members__,
+        F"{name!r} is not a valid {enum_type.__name__}"
+    )
+    return enum_type[name]
+
+
+def lookup(name, *component_dicts):
+    for component_dict in component_dicts:
+        if isinstance(name, str) and name in component_dict:
+            return component_dict[name]
+    expect(False, F"{name!r} was never declared")
+
+
+def load_components(document, key, length, build):
+    components = dict()
+    for record in records(document, key, length):
+        component = build(*record)
+        expect(component.name not in components, F"{component.name!r} is declared twice")
+        components[component.name] = component
+    return components
+
+
+def load_model(data, max_size=MAX_SIZE):
+    """
+    Returns a Snapshot of the model held in the given data,
+    or raises ValueError if the data is not a valid snapshot.
+    """
+    expect(len(data) >= HEADER.size, 'not a snapshot')
+    magic, version = HEADER.unpack_from(data)
+    expect(magic == MAGIC, 'not a snapshot')
+    expect(version == VERSION, F"version {version} is not supported")
+    try:
+        decompressor = decompressobj()
+        text = decompressor.decompress(data[HEADER.size:], max_size)
+        expect(not decompressor.unconsumed_tail, F"larger than {max_size} bytes")
+        document = loads(text.decode('utf-8'))
+    except (ZlibError, UnicodeDecodeError, RecursionError) as e:
+        raise ValueError(F"Invalid snapshot: {e}.") from e
+    expect(isinstance(document, dict), 'not a snapshot')
+
+    model = Snapshot()
+    clusters = dict()
+    for name, label, description, level, parent in records(document, 'clusters', 5):
+        texts(name, label, description)
+        expect(isinstance(level, int) and not isinstance(level, bool), F"{level!r} is not a level")
+        expect(name not in clusters, F"{name!r} is declared twice")
+        # Parents always come before their children.
+        parent = None if parent is None else lookup(parent, clusters)
+        clusters[name] = Cluster(name, label, level, parent, dict(), description)
+        (model.clusters if parent is None else parent.children)[name] = clusters[name]
+
+    def build_element(name, label, description, profile, role, parent):
+        texts(name, label, description)
+        return Element(
+            name, label, enum(Profile, profile), enum(Role, role),
+            None if parent is None else lookup(parent, clusters), description,
+        )
+    model.elements = load_components(document, 'elements', 6, build_element)
+
+    def build_note(name, label, description, color, parent, targets):
+        texts(name, label, description, color)
+        return Note(
+            name, label, color,
+            None if parent is None else lookup(parent, clusters),
+            {t: lookup(t, model.elements, clusters) for t in names(targets)},
+            description,
+        )
+    model.notes = load_components(document, 'notes', 6, build_note)
+
+    def build_datum(name, label, description, classification):
+        texts(name, label, description)
+        return Datum(name, label, enum(Classification, classification), description)
+    model.data = load_components(document, 'data', 4, build_datum)
+
+    # Threats and measures refer to one another, so references are resolved
+    # once both are loaded.
+    def build_threat(name, label, description, impact, probability, measure_names):
+        texts(name, label, description)
+        threat = Threat(name, label, enum(Impact, impact), enum(Probability, probability), description)
+        threat.applicable_measures = names(measure_names)
+        return threat
+
+    def build_measure(name, label, description, capability, threat_names):
+        texts(name, label, description)
+        measure = Measure(name, label, enum(Capability, capability), description)
+        measure.mitigable_threats = names(threat_names)
+        return measure
+
+    for prefix in ('', 'active_'):
+        threats = load_components(document, prefix + 'threats', 6, build_threat)
+        measures = load_components(document, prefix + 'measures', 5, build_measure)
+        for threat in threats.values():
+            threat.applicable_measures = {
+                m: lookup(m, measures) for m in threat.applicable_measures
+            }
+        for measure in measures.values():
+            measure.mitigable_threats = {
+                t: lookup(t, threats) for t in measure.mitigable_threats
+            }
+        setattr(model, prefix + 'threats', threats)
+        setattr(model, prefix + 'measures', measures)
+
+    model.active_elements = {
+        e: lookup(e, model.elements) for e in names(document.get('active_elements', list()))
+    }
+    model.active_data = {
+        d: lookup(d, model.data) for d in names(document.get('active_data', list()))
+    }
+
+    for record in records(document, 'interactions', 7):
+        action, sources, targets, data, notes, risks, mitigations = record
+        texts(notes)
+        data = {d: lookup(d, model.data) for d in names(data)}
+        # Risks and mitigations keep the order in which data were declared,
+        # which may differ from the (sorted) order of the data themselves.
+        mitigations = {
+            d_name: {
+                m_name: Mitigation(
+                    lookup(m_name, model.measures),
+                    enum(Imperative, imperative),
+                    enum(Status, status),
+                )
+                for m_name, imperative, status in triples(mitigation_records)
+            }
+            for d_name, mitigation_records in pairs(mitigations, data)
+        }
+        expect(mitigations.keys() == data.keys(), 'every datum must have its mitigations')
+        risks = {
+            d_name: {
+                t: Risk(lookup(t, model.threats), data[d_name], mitigations[d_name])
+                for t in names(threat_names)
+            }
+            for d_name, threat_names in pairs(risks, data)
+        }
+        expect(risks.keys() == data.keys(), 'every datum must have its risks')
+        model.interactions.append(Interaction(
+            enum(Action, action),
+            {s: lookup(s, model.elements, clusters) for s in names(sources)},
+            {t: lookup(t, model.elements, clusters) for t in names(targets)},
+            data,
+            risks,
+            mitigations,
+            notes,
+        ))
+
+    for path, digest in records(document, 'sources', 2):
+        model.sources[Path(*texts(path))] = texts(digest)[0]
+
+    expect(model_digest(model) == document.get('digest'), 'its contents do not match its digest')
+    return model
+
+
+def pairs(value, data):
+    # Yields (datum name, value) pairs, for data that the interaction carries.
+    expect(isinstance(value, list), F"{value!r} must be a list")
+    for pair in value:
+        expect(isinstance(pair, list) and len(pair) == 2, F"{pair!r} must be a pair")
+        expect(texts(pair[0])[0] in data, F"{pair[0]!r} is not carried by the interaction")
+        yield pair
+
+
+def triples(value):
+    expect(isinstance(value, list), F"{value!r} must be a list")
+    for triple in value:
+        expect(isinstance(triple, list) and len(triple) == 3, F"{triple!r} must have 3 values")
+        yield triple
+
+
+def stale_sources(snapshot, directory):
+    """
+    Returns the paths of the files the snapshot was compiled from
+    that have since been modified. Since the snapshot may come from anywhere,
+    only regular files within directory, the snapshot's own, are checked.
+    """
+    directory = Path(directory).resolve()
+    stale = list()
+    for path, digest in snapshot.sources.items():
+        path = directory.joinpath(path).resolve()
+        try:
+            path.relative_to(directory)
+        except ValueError:
+            continue
+        if not path.is_file():
+            continue
+        try:
+            if source_digest(path) != digest:
+                stale.append(path)
+        except OSError:
+            continue
+    return stale
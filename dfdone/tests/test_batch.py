@@ -0,0 +1,59 @@
+import unittest
+
+from logging import ERROR, getLogger
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from dfdone.cli.batch import plan_jobs
+from dfdone.tml.parser import Parser
+
+
+class TestBatch(unittest.TestCase):
+    def test_plan_jobs(self):
+        manifest = {
+            'output_dir': 'out',
+            'formats': ['html', 'svg'],
+            'options': ['--combine'],
+            'models': ['a.tml', {'path': 'b.tml', 'options': ['--active']}],
+            'variants': {'default': [], 'neato': ['--graph-attrs', 'layout=neato']},
+        }
+        jobs = plan_jobs(manifest, Path('models'))
+        self.assertEqual([str(path) for path, _ in jobs], [
+            'models/a.tml', 'models/a.tml', 'models/b.tml', 'models/b.tml'
+        ])
+        self.assertEqual(jobs[3][1], [
+            '--combine', '--active', '--graph-attrs', 'layout=neato',
+            '--diagram', 'html,svg', '--output-dir', 'models/out/neato', 'models/b.tml',
+        ])
+        # Without variants, every model is rendered once, to OUTPUT_DIR.
+        jobs = plan_jobs({'models': ['a.tml']}, Path())
+        self.assertEqual(jobs, [(Path('a.tml'), [
+            '--diagram', 'html', '--output-dir', '.', 'a.tml'
+        ])])
+
+    def test_shared_includes(self):
+        getLogger('dfdone.tml.parser').setLevel(ERROR)
+        with TemporaryDirectory() as directory:
+            directory = Path(directory)
+            directory.joinpath('shared.tml').write_text(
+                '"Web" is a white-box service\n"DB" is a white-box storage\n'
+            )
+            directory.joinpath('a.tml').write_text(
+                'Include "shared.tml"\n"pw" is confidential data\n"Web" sends "pw" to "DB"\n'
+            )
+            directory.joinpath('b.tml').write_text('Include "shared.tml"\n')
+            parsed_files, parsers = dict(), list()
+            for name in ('a.tml', 'b.tml'):
+                with directory.joinpath(name).open() as f:
+                    parsers.append(Parser(f, parsed_files=parsed_files))
+
+        # Both models, and the file they both include, were each parsed once.
+        self.assertEqual(
+            sorted(path.name for path, _, _ in parsed_files), ['a.tml', 'b.tml', 'shared.tml']
+        )
+        a, b = parsers
+        self.assertEqual(list(a.elements), list(b.elements))
+        # Each model still builds its own components from the shared results.
+        self.assertIsNot(a.elements['Web'], b.elements['Web'])
+        self.assertEqual(len(a.interactions), 1)
+        self.assertEqual(b.interactions, [])
@@ -1,10 +1,11 @@
 import itertools
 import unittest
 
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
 from functools import partial
+from threading import Timer
 
-from dfdone.cli.main import build_arg_parser, main, SECTION_BREAK
+from dfdone.cli.main import build_arg_parser, build_while_waiting, main, SECTION_BREAK
 from dfdone.tests import constants
 
 
@@ -93,3 +94,20 @@ class TestCLI(unittest.TestCase):
             exclude_combinations,
             '-x'
         )
+
+    def test_build_while_waiting(self):
+        diagram = Future()
+        # Only a fallback, should the table not be built before waiting on the diagram.
+        fallback = Timer(5, diagram.set_result, ['late'])
+        fallback.start()
+        built_before_diagram = list()
+
+        def table():
+            built_before_diagram.append(not diagram.done())
+            diagram.set_result('diagram')
+            yield 'table'
+
+        sections = build_while_waiting([['data'], diagram, table()])
+        self.assertEqual([list(s) for s in sections], [['data'], ['diagram'], ['table']])
+        self.assertEqual(built_before_diagram, [True])
+        fallback.cancel()
@@ -0,0 +1,51 @@
+import unittest
+
+from logging import ERROR, getLogger
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from dfdone.cli.main import write_deps
+from dfdone.tml.parser import Parser
+
+
+class TestDeps(unittest.TestCase):
+    def setUp(self):
+        getLogger('dfdone.tml.parser').setLevel(ERROR)
+
+    def test_scan_includes(self):
+        with TemporaryDirectory() as directory:
+            directory = Path(directory)
+            directory.joinpath('sub').mkdir()
+            directory.joinpath('shared.tml').write_text('"Web" is a white-box service\n')
+            # Nested includes are relative to the top-level model, too.
+            directory.joinpath('sub', 'nested.tml').write_text('Include "shared.tml"\n')
+            model = directory.joinpath('model.tml')
+            model.write_text(
+                'Include "sub/nested.tml"\n'
+                '# Include "commented.tml"\n'
+                'Include "missing.tml"\n'
+                'Include "shared.tml"\n'
+            )
+            scanned = Parser.scan_includes(model)
+            with model.open() as f:
+                parsed = Parser(f).included_files
+
+        self.assertEqual([p.name for p in scanned], ['nested.tml', 'shared.tml'])
+        self.assertEqual(set(scanned) | {model.resolve()}, parsed)
+
+    def test_write_deps(self):
+        with TemporaryDirectory() as directory:
+            directory = Path(directory)
+            directory.joinpath('shared.tml').write_text('"Web" is a white-box service\n')
+            model = directory.joinpath('model.tml')
+            model.write_text('Include "shared.tml"\n')
+            deps_path = directory.joinpath('html', 'model.html.d')
+            with model.open() as f:
+                write_deps(deps_path, f)
+            deps = deps_path.read_text()
+
+        shared = directory.joinpath('shared.tml').resolve()
+        self.assertEqual(deps, (
+            F"{directory.joinpath('html', 'model.html')}: {model} \\\n  {shared}\n"
+            F"\n{shared}:\n"
+        ))
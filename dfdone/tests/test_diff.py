@@ -0,0 +1,72 @@
+import unittest
+
+from io import StringIO
+from logging import ERROR
+
+from dfdone.diff import ADDED, CHANGED, REMOVED, diff_models
+from dfdone.enums import Risk
+from dfdone.tml.parser import Parser
+
+
+OLD_MODEL = '''
+"User" is a black-box agent
+"Web"  is a white-box service
+"DB"   is a white-box storage
+"pw" is confidential data
+"un" is public data
+
+"User" sends "pw" to "Web"
+"Web" sends "un" to "DB"
+
+"sqli" is a high impact, high probability threat
+"xss"  is a medium impact, medium probability threat
+"sqli" applies to all data between "Web" and "DB"
+"xss"  applies to all data between "User" and "Web"
+'''
+
+NEW_MODEL = '''
+"User" is a black-box agent
+"Web"  is a white-box service labeled "Web App"
+"DB"   is a white-box storage
+"pw" is confidential data
+"un" is public data
+"Cache" is a white-box storage
+
+"User" sends "pw" to "Web"
+"Web" sends "pw" to "Cache"
+
+"sqli" is a high impact, high probability threat
+"xss"  is a low impact, medium probability threat
+"sqli" applies to all data between "Web" and "Cache"
+"xss"  applies to all data between "User" and "Web"
+'''
+
+
+def parse(model):
+    parser = Parser(StringIO(model))
+    parser.logger.setLevel(ERROR)
+    return parser
+
+
+class TestDiff(unittest.TestCase):
+    def test_identical_models(self):
+        self.assertFalse(diff_models(parse(OLD_MODEL), parse(OLD_MODEL)))
+
+    def test_changes(self):
+        model_diff = diff_models(parse(OLD_MODEL), parse(NEW_MODEL))
+        self.assertEqual(model_diff.components[ADDED], ['Cache'])
+        self.assertEqual(model_diff.components[REMOVED], [])
+        self.assertEqual(sorted(model_diff.components[CHANGED]), ['Web', 'xss'])
+
+        risks = {(r.change, r.threat.name, r.datum.name): r for r in model_diff.risks}
+        self.assertEqual(set(risks), {
+            (ADDED, 'sqli', 'pw'),
+            (REMOVED, 'sqli', 'un'),
+            (CHANGED, 'xss', 'pw'),
+        })
+        changed = risks[(CHANGED, 'xss', 'pw')]
+        self.assertEqual((changed.old_rating, changed.new_rating), (Risk.HIGH, Risk.MEDIUM))
+        self.assertEqual(changed.delta, -1)
+        self.assertEqual(risks[(ADDED, 'sqli', 'pw')].delta, Risk.CRITICAL - Risk.MINIMAL)
+        # Increases come first.
+        self.assertEqual(model_diff.risks[0].change, ADDED)
@@ -0,0 +1,52 @@
+import unittest
+
+from io import StringIO
+from json import loads
+from logging import ERROR, getLogger
+
+from dfdone.export import json_chunks
+from dfdone.tml.parser import Parser
+
+
+MODEL = '''\
+"Internet" is a cluster.
+"User" is a black-box agent in "Internet".
+"Web App" is a white-box service.
+"pw" is confidential data.
+1. "User" sends "pw" to "Web App".
+"xss" is a high impact, high probability threat.
+"xss" applies to all data between "User" and "Web App".
+"WAF" is a full measure against "xss".
+"WAF" has been verified on all data between "User" and "Web App".
+'''
+
+
+class TestExport(unittest.TestCase):
+    def test_json_chunks(self):
+        getLogger('dfdone.tml.parser').setLevel(ERROR)
+        model = Parser(StringIO(MODEL))
+        document = loads(''.join(json_chunks(
+            model.clusters, model.elements, model.notes, model.data,
+            model.threats, model.measures, model.interactions,
+        )))
+        self.assertEqual(
+            [c['name'] for c in document['clusters']], ['Internet']
+        )
+        self.assertEqual(
+            {e['name']: e['parent'] for e in document['elements']},
+            {'User': 'Internet', 'Web App': None},
+        )
+        self.assertEqual(document['threats'][0]['potential_risk'], 'CRITICAL')
+
+        interaction, = document['interactions']
+        risk = model.interactions[0].risks['pw']['xss']
+        self.assertEqual(interaction['number'], 1)
+        self.assertEqual(interaction['highest_risk'], risk.rating.name)
+        self.assertEqual(interaction['risks'], [{
+            'datum': 'pw', 'threat': 'xss',
+            'rating': risk.rating.name, 'mitigations': ['WAF'],
+        }])
+        self.assertEqual(interaction['mitigations'][0]['status'], 'VERIFIED')
+
+        empty = loads(''.join(json_chunks(*[dict()] * 6, list())))
+        self.assertEqual(empty['interactions'], list())
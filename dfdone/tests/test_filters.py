@@ -0,0 +1,93 @@
+import unittest
+
+from io import StringIO
+from logging import ERROR
+
+from dfdone.enums import Risk
+from dfdone.filters import focus, min_risk
+from dfdone.tml.parser import Parser
+
+
+MODEL = '''
+"Internet" is a cluster
+"DMZ" is a cluster
+"Backend" is a cluster in "DMZ"
+"User" is a black-box agent in "Internet"
+"Web" is a white-box service in "DMZ"
+"API" is a white-box service in "Backend"
+"DB" is a white-box storage in "Backend"
+"Note" is a yellow note attached to "DB"
+"Backups" is a yellow note in "Backend"
+"Perimeter" is a yellow note in "Internet"
+"pw" is confidential data
+"un" is public data
+
+"User" sends "un" to "Web"
+"Web" sends "pw" to "API"
+"API" sends "pw" to "DB"
+
+"sqli" is a high impact, high probability threat
+"xss" is a high impact, high probability threat
+"params" is a full measure against "sqli"
+"sqli" applies to all data between "API" and "DB"
+"xss" applies to all data between "User" and "Web"
+'''
+
+
+def parse(model):
+    parser = Parser(StringIO(model))
+    parser.logger.setLevel(ERROR)
+    return {
+        'clusters': parser.clusters,
+        'elements': parser.elements,
+        'data': parser.data,
+        'threats': parser.threats,
+        'measures': parser.measures,
+        'notes': parser.notes,
+        'interactions': parser.interactions,
+    }
+
+
+class TestFilters(unittest.TestCase):
+    def test_focus(self):
+        model = parse(MODEL)
+        focused = focus(model, ['DB'])
+        self.assertEqual(set(focused['elements']), {'API', 'DB'})
+        self.assertEqual(len(focused['interactions']), 1)
+        self.assertEqual(set(focused['data']), {'pw'})
+        self.assertEqual(set(focused['threats']), {'sqli'})
+        # Notes in a cluster, rather than attached to elements, are kept along with it.
+        self.assertEqual(set(focused['notes']), {'Note', 'Backups'})
+        # Only the clusters that still have members are kept.
+        self.assertEqual(list(focused['clusters']), ['DMZ'])
+        self.assertEqual(list(focused['clusters']['DMZ'].children), ['Backend'])
+        # The model itself is left untouched.
+        self.assertEqual(len(model['interactions']), 3)
+        self.assertEqual(list(model['clusters']['DMZ'].children), ['Backend'])
+
+        focused = focus(model, ['Backend'], depth=2)
+        self.assertEqual(set(focused['elements']), {'Web', 'API', 'DB', 'User'})
+        self.assertEqual(len(focused['interactions']), 3)
+
+        focused = focus(model, ['User'], depth=0)
+        self.assertEqual(set(focused['elements']), {'User'})
+        self.assertEqual(focused['interactions'], [])
+        self.assertEqual(list(focused['clusters']), ['Internet'])
+        self.assertEqual(set(focused['notes']), {'Perimeter'})
+
+    def test_min_risk(self):
+        model = parse(MODEL)
+        filtered = min_risk(model, Risk.HIGH)
+        self.assertTrue(all(i.highest_risk >= Risk.HIGH for i in filtered['interactions']))
+        self.assertEqual(len(filtered['interactions']), 2)
+        # "Web" sends "pw" to "API" carries no risk, so neither element is left out,
+        # since each takes part in another interaction.
+        self.assertEqual(set(filtered['elements']), {'User', 'Web', 'API', 'DB'})
+        self.assertEqual(set(filtered['threats']), {'sqli', 'xss'})
+        self.assertEqual(set(filtered['measures']), {'params'})
+
+        filtered = min_risk(model, Risk.CRITICAL)
+        self.assertEqual(set(filtered['elements']), {'API', 'DB'})
+        self.assertEqual(set(filtered['data']), {'pw'})
+        self.assertEqual(list(filtered['clusters']), ['DMZ'])
+        self.assertEqual(set(filtered['threats']['sqli'].applicable_measures), {'params'})
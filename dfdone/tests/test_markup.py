@@ -0,0 +1,86 @@
+import unittest
+
+from io import StringIO
+from logging import ERROR
+
+from dfdone.markup import Anchors, MarkupWriter
+from dfdone.plot import build_interaction_table, build_threat_table
+from dfdone.tml.parser import Parser
+
+
+MODEL = '''
+"User" is a black-box agent
+"Web"  is a white-box service
+"pw" is confidential data
+"User" sends "pw" to "Web"
+"xss" is a high impact, high probability threat
+"csp" is a medium capability measure against "xss"
+"xss" applies to all data between "User" and "Web"
+'''
+
+
+def rewrite(html, anchors=None):
+    output = list()
+    writer = MarkupWriter(output.append, anchors)
+    writer.feed(html)
+    writer.close()
+    return ''.join(output)
+
+
+class TestMarkup(unittest.TestCase):
+    def test_dead_anchors(self):
+        anchors = Anchors()
+        anchors.add('edge-1')
+        html = (
+            '<a href="#edge-1">1</a>'
+            '<a href="#edge-2">2</a>'
+            '<a xlink:href="#interaction-1" xlink:title="tooltip"></a>'
+            '<span id="later"></span><a href="#later"></a>'
+        )
+        self.assertEqual(rewrite(html, anchors), (
+            '<a href="#edge-1">1</a>'
+            '<a>2</a>'
+            '<a xlink:title="tooltip"></a>'
+            '<span id="later"></span><a href="#later"></a>'
+        ))
+        self.assertEqual(
+            rewrite('<a href="#edge-1">1</a>'),
+            '<a>1</a>'
+        )
+
+    def test_normalization(self):
+        self.assertEqual(
+            rewrite('<TD rowspan=2 Class=" a  b ">&nbsp;&amp;<br></td>'),
+            '<td class="a b" rowspan="2">\N{NO-BREAK SPACE}&amp;<br/></td>'
+        )
+        self.assertEqual(
+            rewrite('<p title=\'say "hi"\'>\n  \n</p><style>a > b {}</style>'),
+            '<p title=\'say "hi"\'>\n</p><style>a > b {}</style>'
+        )
+        self.assertEqual(
+            rewrite('<!DOCTYPE svg><svg viewBox="0 0 1 1"><g><!-- x --></svg>'),
+            '<!DOCTYPE svg>\n<svg viewbox="0 0 1 1"><g><!-- x --></g></svg>'
+        )
+        self.assertEqual(rewrite('<img src="x"></img><hr/>'), '<img src="x"/><hr/>')
+
+    def test_incremental_feed(self):
+        html = '<div id="a"><a href="#a" target="_self">text &amp; more</a></div>'
+        output = list()
+        writer = MarkupWriter(output.append, Anchors())
+        for i in range(0, len(html), 5):
+            writer.feed(html[i:i + 5])
+        writer.close()
+        self.assertEqual(''.join(output), html)
+
+    def test_anchors_registered_up_front(self):
+        parser = Parser(StringIO(MODEL))
+        parser.logger.setLevel(ERROR)
+        anchors = Anchors()
+        threat_table = build_threat_table(parser.threats, anchors)
+        interaction_table = build_interaction_table(parser.interactions, anchors=anchors)
+        # Nothing has been generated yet, but the ids are already known.
+        self.assertIn('xss', anchors)
+        self.assertIn('interaction-1', anchors)
+        self.assertNotIn('csp', anchors)
+        self.assertIn('<tbody id="interaction-1">', list(interaction_table))
+        self.assertIn('<tr id="xss">', list(threat_table))
@@ -0,0 +1,75 @@
+import unittest
+
+from io import StringIO
+from logging import ERROR
+
+from dfdone.enums import Risk
+from dfdone.paths import Reachability, find_attack_paths
+from dfdone.tml.parser import Parser
+
+
+MODEL = '''
+"Attacker" is a black-box agent
+"Insider"  is a grey-box agent
+"Web"      is a white-box service
+"API"      is a white-box service
+"Worker"   is a white-box service
+"DB"       is a white-box storage
+"Island"   is a white-box storage
+
+"un" is public data
+"pw" is confidential data
+"key" is confidential data
+
+"Attacker" sends "un"; "pw" to "Web"
+"Web" sends "pw" to "API"
+"API" sends "pw" to "Worker"
+"Worker" sends "pw" to "API"
+"API" receives "key" from "DB"
+"DB" receives "key" from "API"
+"Insider" sends "key" to "Island"
+
+"sqli" is a high impact, high probability threat
+"leak" is a low impact, low probability threat
+"sqli" applies to all data between "API" and "DB"
+"leak" applies to all data between "Web" and "API"
+'''
+
+
+class TestPaths(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.parser = Parser(StringIO(MODEL))
+        cls.parser.logger.setLevel(ERROR)
+
+    def test_closure(self):
+        graph = Reachability(self.parser.elements, self.parser.interactions)
+        self.assertEqual(
+            set(graph.reachable_elements('Attacker')),
+            {'Web', 'API', 'Worker', 'DB'},
+        )
+        # API and Worker form a cycle, so each can reach itself.
+        self.assertIn('API', graph.reachable_elements('API'))
+        self.assertEqual(graph.reachable_elements('Island'), [])
+        self.assertEqual(graph.reachable_elements('Insider'), ['Island'])
+
+    def test_direction(self):
+        # Data flows to the element that receives it, as in the overview diagram.
+        interactions = self.parser.interactions[:5]
+        graph = Reachability(self.parser.elements, interactions)
+        self.assertNotIn('DB', graph.reachable_elements('API'))
+        self.assertEqual(set(graph.reachable_elements('DB')), {'API', 'Worker'})
+        self.assertEqual(graph.reachable_interactions('DB'), [2, 3, 4])
+
+    def test_attack_paths(self):
+        results = find_attack_paths(self.parser.elements, self.parser.interactions)
+        self.assertEqual(list(results), ['Attacker'])
+        reachable_elements, reachable_data, paths = results['Attacker']
+        self.assertNotIn('Island', reachable_elements)
+        self.assertEqual(set(reachable_data), {'un', 'pw', 'key'})
+        by_datum = {p.datum.name: p for p in paths}
+        self.assertEqual(by_datum['key'].risk, Risk.CRITICAL)
+        self.assertEqual(by_datum['key'].interaction_indices, [0, 1, 5])
+        # "pw" has no risk on the first hop, but the second hop is riskier.
+        self.assertEqual(by_datum['pw'].risk, Risk.LOW)
+        self.assertEqual(by_datum['pw'].interaction_indices, [0, 1])
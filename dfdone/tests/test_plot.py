@@ -0,0 +1,299 @@
+import unittest
+
+from io import StringIO
+from itertools import combinations
+from logging import ERROR
+from random import Random
+from re import findall
+from tempfile import TemporaryDirectory
+
+from graphviz import Digraph
+
+from dfdone.cache import RenderCache
+from dfdone.plot import (
+    DotWriter,
+    build_graph,
+    build_graphs,
+    bundle_interactions,
+    count_crossings,
+    get_tooltips,
+    get_layout_settings,
+    group_interactions,
+    render,
+    render_formats,
+    restyle_svg,
+    score_layout,
+    segments_cross,
+)
+from dfdone.tml.parser import Parser
+
+
+MODEL = '''
+"User" is a black-box agent
+"Web"  is a white-box service
+"DB"   is a white-box storage
+"pw" is confidential data
+"un" is public data
+
+"User" sends "pw" to "Web"
+"Web" sends "un" to "DB"
+"Web" receives "un" from "User"
+"DB" sends "un" to "Web"
+'''
+
+
+CLUSTERED_MODEL = '''
+"Internet" is a cluster
+"DMZ" is a cluster
+"Backend" is a cluster in "DMZ"
+"User" is a black-box agent in "Internet"
+"Admin" is a grey-box agent
+"Web" is a white-box service in "DMZ"
+"DB" is a white-box storage in "Backend"
+"pw" is confidential data
+
+"User" sends "pw" to "Web"
+"Web" sends "pw" to "DB"
+"Admin" sends "pw" to "DB"
+"User" receives "pw" from "Web"
+'''
+
+
+def parse(model):
+    parser = Parser(StringIO(model))
+    parser.logger.setLevel(ERROR)
+    return parser
+
+
+class TestPlot(unittest.TestCase):
+    def test_group_interactions(self):
+        interactions = parse(MODEL).interactions
+        self.assertEqual(
+            [[i for i, _ in group] for group in group_interactions(interactions)],
+            [[0], [1], [2], [3]]
+        )
+        self.assertEqual(
+            [[i for i, _ in group] for group in group_interactions(interactions, combine=True)],
+            [[0, 2], [1, 3]]
+        )
+
+    def test_dot_writer(self):
+        names = ['plain', 'two words', 'say "hi"', 'a:b', 'Graph', '-1.5', '<b>x</b>']
+        attributes = {'label': 'a\\nb', 'id': 'x', 'skipped': None, 'class': 'c d'}
+        expected = Digraph()
+        expected.graph_attr = {'rankdir': 'LR'}
+        expected.edge_attr = {'color': 'gray'}
+        cluster = Digraph(name='cluster_x y')
+        cluster.attr(label='X', _attributes=attributes, style='filled')
+        inner = Digraph(name='cluster_inner')
+        inner.attr(_attributes={'style': 'invis'})
+        for name in names:
+            inner.node(name, _attributes=attributes)
+        cluster.subgraph(inner)
+        cluster.attr(tooltip='X\\n- inner')
+        expected.subgraph(cluster)
+        expected.edge(names[0], names[3], style='dashed', dir='none')
+        expected.edge(names[2], names[4], _attributes=attributes)
+
+        dot = DotWriter(graph_attr={'rankdir': 'LR'}, edge_attr={'color': 'gray'})
+        with dot.subgraph('cluster_x y'):
+            dot.attr({'label': 'X', 'style': 'filled'}, attributes)
+            with dot.subgraph('cluster_inner'):
+                dot.attr({'style': 'invis'})
+                for name in names:
+                    dot.node(name, attributes)
+            dot.attr({'tooltip': 'X\\n- inner'})
+        dot.edge(names[0], names[3], {'style': 'dashed', 'dir': 'none'})
+        dot.edge(names[2], names[4], attributes)
+        self.assertEqual(dot.source, expected.source)
+
+    def test_partition(self):
+        parser = parse(CLUSTERED_MODEL)
+        graphs = build_graphs(
+            parser.clusters, parser.elements, parser.notes, parser.interactions,
+            options={'partition': True}
+        )
+        self.assertEqual(
+            [(name, label) for name, label, _ in graphs],
+            [('overview', None), ('internet', 'Internet'), ('dmz', 'DMZ')]
+        )
+        overview, internet, dmz = (graph.source for _, _, graph in graphs)
+        # Interactions across top-level clusters are aggregated in the overview.
+        self.assertIn('Internet -> DMZ [URL="#interaction-1"', overview)
+        self.assertIn('DMZ -> Internet [URL="#interaction-4"', overview)
+        self.assertIn('Admin -> DMZ [URL="#interaction-3"', overview)
+        self.assertEqual(overview.count(' -> '), 3)
+        self.assertNotIn(' -> ', internet)
+        self.assertIn('Web -> DB', dmz)
+        self.assertEqual(dmz.count(' -> '), 1)
+
+    def test_layouts(self):
+        parser = parse(MODEL)
+        model = (parser.clusters, parser.elements, parser.notes, parser.interactions)
+        source = build_graph(*model).source
+        graph = build_graph(*model, options={'layouts': {source: b'positioned'}})
+        self.assertEqual(graph.positioned, b'positioned')
+        # Already laid out, so Graphviz does not run.
+        self.assertEqual(
+            render_formats(graph, ['dot', 'gv']),
+            {'dot': b'positioned', 'gv': b'positioned'},
+        )
+        other = build_graph(*model, options={'layouts': {source: b'positioned'}, 'combine': True})
+        self.assertIsNone(other.positioned)
+
+    def test_layout_settings(self):
+        dot = DotWriter(graph_attr={'splines': 'ortho'})
+        for i in range(100):
+            dot.edge('a', 'b', dict())
+        splines = lambda settings: [
+            (graph_attr.get('splines', 'ortho'), unflatten) for graph_attr, unflatten in settings
+        ]
+        self.assertEqual(splines(get_layout_settings(dot, budget=10)), [
+            ('ortho', False), ('polyline', False), ('line', False), ('line', True)
+        ])
+        # Orthogonal splines would not fit the budget for this many edges.
+        self.assertEqual(splines(get_layout_settings(dot, budget=1)), [
+            ('polyline', False), ('line', False), ('line', True)
+        ])
+        dot.graph_attr['splines'] = 'line'
+        self.assertEqual(get_layout_settings(dot, budget=1), [
+            ({}, False), ({'splines': 'line'}, True)
+        ])
+
+    def test_score_layout(self):
+        plain = (
+            'graph 1 4 3\n'
+            'node a 0 0 1 1 a solid box black lightgrey\n'
+            'edge a b 2 0 0 2 2 solid black\n'
+            'edge "a b" c 4 0 2 1 2 2 2 2 0 solid black\n'
+            'edge a d 2 0 0 2 0 solid black\n'
+            'stop\n'
+        ).encode('utf-8')
+        crossings, length, area = score_layout(plain)
+        # The first two edges cross, but the last one only touches the second one.
+        self.assertEqual(crossings, 1)
+        self.assertAlmostEqual(length, 8 ** 0.5 + 4 + 2)
+        self.assertEqual(area, 12)
+
+    def test_count_crossings(self):
+        r = Random(0)
+        # Whole coordinates put many ends, and crossings, on the borders of grid cells.
+        segments = [
+            ((r.randint(0, 20), r.randint(0, 20)), (r.randint(0, 20), r.randint(0, 20)))
+            for _ in range(300)
+        ] + [((5, 0), (5, 20)), ((0, 7), (20, 7)), ((3, 3), (3, 3))]
+        self.assertEqual(
+            count_crossings(segments),
+            sum(segments_cross(s1, s2) for s1, s2 in combinations(segments, 2)),
+        )
+        self.assertEqual(count_crossings(segments[:1]), 0)
+
+    def test_bundle_interactions(self):
+        parser = parse(MODEL + '''
+"User" receives "un" from "Web"
+"User", "Web" send "un" to "DB"
+''')
+        self.assertEqual(
+            [(pairs, [i for i, _ in group]) for pairs, group in bundle_interactions(parser.interactions)],
+            [
+                ([('User', 'Web')], [0, 4]),
+                ([('Web', 'DB')], [1, 5]),
+                ([('Web', 'User')], [2]),
+                ([('DB', 'Web')], [3]),
+                ([('User', 'DB')], [5]),
+            ]
+        )
+        source = build_graph(
+            parser.clusters, parser.elements, parser.notes, parser.interactions,
+            options={'bundle': True}
+        ).source
+        self.assertEqual(source.count(' -> '), 5)
+        # Sending and receiving between the same pair of elements points both ways.
+        self.assertIn('User -> Web [URL="#interaction-1" arrowhead=onormal arrowtail=onormal', source)
+
+        # Combined, interactions only have a row for the first of their group to link to.
+        parser = parse(MODEL + '''
+"Cache" is a white-box storage
+"Web" sends "pw" to "User"
+"User", "Web" send "un" to "Cache"
+''')
+        source = build_graph(
+            parser.clusters, parser.elements, parser.notes, parser.interactions,
+            options={'bundle': True, 'combine': True}
+        ).source
+        self.assertIn('Web -> User [URL="#interaction-1"', source)
+        # Both bundles that the last interaction leads get an id of their own.
+        self.assertEqual(
+            findall(r' id="?(edge-[0-9-]+)', source),
+            ['edge-1', 'edge-2', 'edge-3', 'edge-4', 'edge-6', 'edge-6-2'],
+        )
+
+    def test_tooltip_limit(self):
+        interactions = list(enumerate(parse(MODEL).interactions))
+        self.assertEqual(len(get_tooltips(interactions)), 4)
+        tooltips = get_tooltips(interactions, limit=2)
+        self.assertEqual(len(tooltips), 3)
+        self.assertTrue(tooltips[1].startswith('2\t'))
+        self.assertEqual(tooltips[2], '+2 more')
+
+        source = build_graph(
+            dict(), parse(MODEL).elements, dict(), parse(MODEL).interactions,
+            options={'tooltip_limit': 1, 'combine': True}
+        ).source
+        self.assertIn('tooltip="Web\\n1\tUser → Web\\n\t- pw\\n+3 more"', source)
+        self.assertIn('headtooltip="Interactions 1, +1 more"', source)
+
+    def test_restyle(self):
+        model = MODEL + '"leak" is a low impact, low probability threat\n'
+        before = parse(model)
+        after = parse(model + '"leak" applies to "pw" between "User" and "Web"\n')
+        # Risk ratings only change colors once arrowheads are set explicitly.
+        options = {'edge_attrs': {'arrowhead': 'normal'}}
+        graphs = [
+            build_graph(p.clusters, p.elements, p.notes, p.interactions, options=options)
+            for p in (before, after)
+        ]
+        self.assertNotEqual(graphs[0].source, graphs[1].source)
+        self.assertEqual(graphs[0].layout_key(), graphs[1].layout_key())
+        self.assertEqual(graphs[0].styles['edge-1']['class'], 'risk-unknown')
+        self.assertEqual(graphs[1].styles['edge-1']['class'], 'risk-low')
+
+        svg = (
+            '<g id="edge-1" class="edge risk-unknown">\n'
+            '<g id="a_edge-1"><a xlink:href="#interaction-1">\n'
+            '<path fill="none" stroke="gray" d="M54,-71.7C54,-63.98 54,-46.11"/>\n'
+            '<polygon fill="none" stroke="gray" points="57.5,-46.1 54,-36.1 50.5,-46.1"/>\n'
+            '</a>\n</g>\n</g>\n'
+            '<g id="edge-2" class="edge risk-unknown">\n'
+            '<path fill="none" stroke="gray" d="M0,0C1,1 2,2"/>\n</g>\n'
+        )
+        restyled = restyle_svg(
+            svg.encode('utf-8'), graphs[0].styles, graphs[1].styles
+        ).decode('utf-8')
+        color = graphs[1].styles['edge-1']['color']
+        self.assertIn('<g id="edge-1" class="edge risk-low">', restyled)
+        self.assertIn(F'<path fill="none" stroke="{color}" d="M54,', restyled)
+        self.assertIn(F'<polygon fill="{color}" stroke="{color}"', restyled)
+        self.assertTrue(restyled.endswith(svg[svg.index('<g id="edge-2"'):]))
+
+    def test_risk_moves_arrowhead(self):
+        model = MODEL + '"leak" is a high impact, high probability threat\n'
+        before = parse(model)
+        after = parse(model + '"leak" applies to "pw" between "User" and "Web"\n')
+        graphs = [
+            build_graph(p.clusters, p.elements, p.notes, p.interactions)
+            for p in (before, after)
+        ]
+        self.assertNotEqual(
+            graphs[0].styles['edge-1']['arrowhead'], graphs[1].styles['edge-1']['arrowhead']
+        )
+        self.assertNotEqual(graphs[0].layout_key(), graphs[1].layout_key())
+
+        geometry = lambda svg: findall(r' (?:d|points)="([^"]*)"', svg.decode('utf-8'))
+        with TemporaryDirectory() as directory:
+            cache = RenderCache(directory)
+            render(graphs[0], 'svg', cache)
+            # Laid out again, rather than restyled, so the arrowhead is where the risk puts it.
+            self.assertEqual(
+                geometry(render(graphs[1], 'svg', cache)), geometry(render(graphs[1], 'svg'))
+            )
@@ -0,0 +1,85 @@
+import unittest
+
+from logging import ERROR, getLogger
+from pathlib import Path
+from sys import getswitchinterval, setswitchinterval
+from tempfile import TemporaryDirectory
+from threading import Thread
+
+from dfdone.cli.serve import LRUCache, PreviewServer, query_argv
+
+
+class TestServe(unittest.TestCase):
+    def test_query_argv(self):
+        self.assertEqual(
+            query_argv('combine&include=threats,measures&min-risk=high'),
+            ['--combine', '--include', 'threats', 'measures', '--min-risk', 'high']
+        )
+        with self.assertRaises(ValueError):
+            query_argv('output-dir=/tmp')
+
+    def test_lru_cache(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        self.assertEqual(list(cache.entries), ['a', 'c'])
+        self.assertIsNone(cache.get('b'))
+
+    def test_render(self):
+        getLogger('dfdone.tml.parser').setLevel(ERROR)
+        with TemporaryDirectory() as directory:
+            root = Path(directory)
+            root.joinpath('shared.tml').write_text('"xss" is a high impact, high probability threat\n')
+            model = root.joinpath('model.tml')
+            model.write_text('Include "shared.tml"\n')
+            server = PreviewServer(('127.0.0.1', 0), root, max_entries=4)
+            try:
+                page = server.render(model.resolve(), ['--include', 'threats', '--no-css'])
+                self.assertIn(b'xss', page)
+                parser, _ = server.parse(model.resolve())
+                # Other options render again, but from the same parsed model.
+                server.render(model.resolve(), ['--include', 'threats', 'measures'])
+                self.assertIs(server.parse(model.resolve())[0], parser)
+                self.assertEqual(len(server.pages.entries), 2)
+
+                # Changing an included file calls for parsing again.
+                root.joinpath('shared.tml').write_text('"sqli" is a high impact, high probability threat\n')
+                page = server.render(model.resolve(), ['--include', 'threats', '--no-css'])
+                self.assertIn(b'sqli', page)
+                self.assertIsNot(server.parse(model.resolve())[0], parser)
+            finally:
+                server.server_close()
+
+    def test_concurrent_parse(self):
+        getLogger('dfdone.tml.parser').setLevel(ERROR)
+        with TemporaryDirectory() as directory:
+            root = Path(directory)
+            # A single statement, whose parsed result is reused for each name.
+            root.joinpath('shared.tml').write_text(
+                ', '.join(F'"E{i}"' for i in range(300)) + ' are white-box services\n'
+            )
+            models = list()
+            for i in range(4):
+                models.append(root.joinpath(F"model{i}.tml").resolve())
+                models[-1].write_text('Include "shared.tml"\n')
+            server = PreviewServer(('127.0.0.1', 0), root, max_entries=8)
+            # The shared file is parsed first, so that every model builds from the same results.
+            root.joinpath('first.tml').write_text('Include "shared.tml"\n')
+            server.parse(root.joinpath('first.tml').resolve())
+            # Switching threads as often as possible, to expose any shared state.
+            interval = getswitchinterval()
+            setswitchinterval(1e-6)
+            try:
+                threads = [Thread(target=server.parse, args=(m,)) for m in models]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+            finally:
+                setswitchinterval(interval)
+                server.server_close()
+            for model in models:
+                elements = server.parse(model)[0].elements
+                self.assertEqual(set(elements), {F"E{i}" for i in range(300)})
@@ -0,0 +1,91 @@
+import unittest
+
+from logging import ERROR, getLogger
+from os import mkfifo
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from zlib import compress
+
+from dfdone.snapshot import (
+    HEADER, MAGIC, Snapshot, dump_model, load_model, model_digest, source_digest, stale_sources,
+)
+from dfdone.tml.parser import Parser
+
+
+MODEL = '''\
+"Internet" is a cluster.
+"User" is a black-box agent in "Internet".
+"Web App" is a white-box service.
+"pw" is confidential data.
+"un" is public data.
+"creds" are "un", "pw".
+1. "User" sends "creds" to "Web App".
+"xss" is a high impact, high probability threat.
+"xss" applies to all data between "User" and "Web App".
+"WAF" is a partial measure against "xss".
+"WAF" has been verified on "un" between "User" and "Web App".
+'''
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        getLogger('dfdone.tml.parser').setLevel(ERROR)
+
+    def test_round_trip(self):
+        with TemporaryDirectory() as directory:
+            path = Path(directory).joinpath('model.tml')
+            path.write_text(MODEL)
+            with path.open() as f:
+                tml_parser = Parser(f)
+            model = load_model(dump_model(tml_parser, directory))
+            self.assertEqual(model_digest(model), model_digest(tml_parser))
+            self.assertEqual(
+                list(model.interactions[0].risks),
+                list(tml_parser.interactions[0].risks),
+            )
+            self.assertIs(
+                model.interactions[0].risks['un']['xss'].mitigations,
+                model.interactions[0].mitigations['un'],
+            )
+            self.assertEqual(list(model.sources), [Path('model.tml')])
+            self.assertEqual(stale_sources(model, directory), list())
+            path.write_text(MODEL + '#\n')
+            self.assertEqual(stale_sources(model, directory), [path.resolve()])
+
+    def test_untrusted_sources(self):
+        with TemporaryDirectory() as directory:
+            directory = Path(directory)
+            directory.joinpath('snapshots').mkdir()
+            directory.joinpath('outside.tml').write_text(MODEL)
+            mkfifo(directory.joinpath('snapshots', 'fifo'))
+            directory.joinpath('snapshots', 'big.tml').write_bytes(b'#' * (2**16 + 1))
+            model = Snapshot()
+            for path in ('/dev/zero', '../outside.tml', 'fifo', 'missing.tml', 'big.tml'):
+                model.sources[Path(path)] = 'x' * 32
+            # Only the regular file within the snapshot's directory is read.
+            self.assertEqual(
+                stale_sources(model, directory.joinpath('snapshots')),
+                [directory.joinpath('snapshots', 'big.tml').resolve()],
+            )
+            self.assertIsNone(source_digest(directory.joinpath('outside.tml'), max_size=8))
+
+    def test_invalid(self):
+        def snapshot(text, version=1):
+            return HEADER.pack(MAGIC, version) + compress(text.encode('utf-8'))
+
+        for data in (
+            b'"User" is a black-box agent.',
+            snapshot('{}', version=2),
+            HEADER.pack(MAGIC, 1) + b'not zlib',
+            snapshot('[]'),
+            snapshot('{"elements": [["User"]]}'),
+            snapshot('{"elements": [["User", "User", "", "BLACK_BOX", "__class__", null]]}'),
+            snapshot('{"notes": [["n", "n", "", "yellow", null, ["nobody"]]]}'),
+            # Valid, but not matching its digest.
+            snapshot('{"data": [["pw", "pw", "", "CONFIDENTIAL"]], "digest": ""}'),
+        ):
+            with self.assertRaises(ValueError):
+                load_model(data)
+
+        with self.assertRaises(ValueError):
+            load_model(snapshot('{"digest": "' + 'x' * 64 + '"}'), max_size=32)
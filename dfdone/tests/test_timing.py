@@ -0,0 +1,68 @@
+import unittest
+
+from io import StringIO
+from logging import ERROR, getLogger
+from unittest.mock import patch
+
+from dfdone import timing
+from dfdone.tml.parser import Parser
+
+
+class FakeClock:
+    """Stands in for the clocks timing reads, and only moves when told to."""
+    def __init__(self):
+        self.wall = 0.0
+        self.cpu = 0.0
+
+    def tick(self, wall, cpu):
+        self.wall += wall
+        self.cpu += cpu
+
+
+class TestTiming(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        for name, clock in (
+            ('perf_counter', lambda: self.clock.wall),
+            ('process_time', lambda: self.clock.cpu),
+            ('thread_time', lambda: self.clock.cpu),
+        ):
+            patcher = patch(F"dfdone.timing.{name}", clock)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        timing.disable()
+
+    def test_nested_phases(self):
+        timings = timing.enable()
+        self.clock.tick(0.25, 0.125)
+        with timing.phase('outer'):
+            self.clock.tick(1.0, 0.5)
+            for _ in range(2):
+                with timing.phase('inner'):
+                    self.clock.tick(2.0, 1.0)
+            self.clock.tick(0.5, 0.25)
+        timing.count('edges', 3)
+        timing.count('edges')
+
+        report = timings.as_dict()
+        # Time spent in the inner phase does not count towards the outer one.
+        self.assertEqual(report['phases'], {
+            'outer': {'wall': 1.5, 'cpu': 0.75, 'calls': 1},
+            'inner': {'wall': 4.0, 'cpu': 2.0, 'calls': 2},
+        })
+        self.assertEqual(report['counts'], {'edges': 4})
+        self.assertEqual(
+            (report['total']['wall'], report['total']['cpu']), (5.75, 2.875)
+        )
+
+    def test_parser_phases(self):
+        getLogger('dfdone.tml.parser').setLevel(ERROR)
+        # Nothing is recorded unless enabled.
+        Parser(StringIO('"DB" is a white-box storage.\n'))
+        timings = timing.enable()
+        Parser(StringIO('"DB" is a white-box storage.\n"pw" is confidential data.\n'))
+        report = timings.as_dict()
+        self.assertEqual(set(report['phases']), {'parse', 'directives', 'sort'})
+        self.assertEqual(report['counts'], {'statements': 2})
@@ -0,0 +1,123 @@
+import unittest
+
+from logging import ERROR, getLogger
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from threading import Timer
+
+from dfdone.cli.watch import build_arg_parser, regenerate, watch
+from dfdone.watch import PollingWatcher, file_signatures, get_watcher
+
+
+MODEL = '''\
+Include "threats.tml"
+"User" is a black-box agent
+"Web" is a white-box service
+"pw" is confidential data
+"User" sends "pw" to "Web", risking "xss"
+'''
+
+
+def threats(description):
+    return F'"xss" is a high impact, high probability threat described as "{description}"\n'
+
+
+class EditingWatcher:
+    """Edits the given file the first time it waits, and stops watching the next time."""
+    def __init__(self, path, text):
+        self.path = path
+        self.text = text
+        self.waits = 0
+        self.watched = set()
+
+    def watch(self, paths):
+        self.watched.update(paths)
+
+    def wait(self):
+        self.waits += 1
+        if self.waits > 1:
+            raise KeyboardInterrupt
+        self.path.write_text(self.text)
+
+
+class TestWatch(unittest.TestCase):
+    def setUp(self):
+        getLogger('dfdone').setLevel(ERROR)
+
+    def test_watchers(self):
+        with TemporaryDirectory() as directory:
+            path = Path(directory).joinpath('model.tml')
+            path.write_text('"DB" is a white-box storage\n')
+            missing = Path(directory).joinpath('missing.tml')
+            signatures = file_signatures([path, missing])
+            self.assertIsNone(signatures[missing])
+
+            for watcher in (PollingWatcher([path], interval=0.01), get_watcher([path])):
+                modify = Timer(0.1, path.write_text, [path.read_text() + '#\n'])
+                modify.start()
+                # Returns once the file changed, rather than blocking forever.
+                watcher.wait()
+                modify.join()
+                self.assertNotEqual(file_signatures([path]), signatures)
+                signatures = file_signatures([path, missing])
+
+                # Changes made before waiting are not missed either.
+                path.write_text(path.read_text() + '#\n')
+                fallbacks = list()
+                fallback = Timer(5, lambda: fallbacks.append(path.write_text(path.read_text())))
+                fallback.start()
+                watcher.wait()
+                fallback.cancel()
+                watcher.close()
+                self.assertEqual(fallbacks, list())
+                self.assertNotEqual(file_signatures([path]), signatures)
+                signatures = file_signatures([path, missing])
+
+    def args(self, model, output_dir):
+        args = build_arg_parser().parse_args([
+            str(model), '--output-dir', str(output_dir), '-x', 'diagram', '--no-css'
+        ])
+        args.model_file.close()
+        return args
+
+    def test_regenerate(self):
+        with TemporaryDirectory() as directory:
+            directory = Path(directory)
+            directory.joinpath('threats.tml').write_text(threats('Injected scripts'))
+            model = directory.joinpath('model.tml')
+            model.write_text(MODEL)
+            args = self.args(model, directory.joinpath('out'))
+
+            parsed_files, sections = dict(), dict()
+            paths = regenerate(args, model, parsed_files, sections)
+            self.assertEqual(
+                paths, {model.resolve(), directory.joinpath('threats.tml').resolve()}
+            )
+            built = dict(sections)
+
+            directory.joinpath('threats.tml').write_text(threats('Stored scripts'))
+            regenerate(args, model, parsed_files, sections)
+            html = directory.joinpath('out', 'model.html').read_text()
+
+        self.assertIn('Stored scripts', html)
+        # Only the threats table was built again.
+        self.assertEqual(set(sections), {'data', 'threats', 'measures', 'interactions'})
+        self.assertIsNot(sections['threats'], built['threats'])
+        for name in ('data', 'measures', 'interactions'):
+            self.assertIs(sections[name], built[name])
+
+    def test_watch(self):
+        with TemporaryDirectory() as directory:
+            directory = Path(directory)
+            shared = directory.joinpath('threats.tml')
+            shared.write_text(threats('Injected scripts'))
+            model = directory.joinpath('model.tml')
+            model.write_text(MODEL)
+            watcher = EditingWatcher(shared, threats('Stored scripts'))
+            with self.assertRaises(KeyboardInterrupt):
+                watch(self.args(model, directory.joinpath('out')), model, watcher)
+            html = directory.joinpath('out', 'model.html').read_text()
+
+        self.assertEqual(watcher.waits, 2)
+        self.assertEqual(watcher.watched, {model.resolve(), shared.resolve()})
+        self.assertIn('Stored scripts', html)
@@ -0,0 +1,99 @@
+from contextlib import contextmanager, nullcontext
+from os import times
+from threading import Lock, local
+from time import perf_counter, process_time, thread_time
+
+
+# Records phases only while --profile is given.
+active = None
+
+
+class Timings:
+    """
+    Adds up the wall-clock and CPU time spent in each named phase,
+    along with counts of whatever was processed.
+    Phases may be nested, in which case the time spent in the inner phase
+    is only counted towards the inner phase, so that times add up to the total.
+    Each thread nests its own phases. Graphviz runs in its own processes,
+    so the CPU time of the graphviz phase is that of all child processes.
+    """
+    def __init__(self):
+        self.phases = dict()
+        self.counts = dict()
+        self.lock = Lock()
+        self.threads = local()
+        self.start_wall = perf_counter()
+        self.start_cpu = process_time()
+        self.start_times = times()
+
+    def nested(self):
+        if not hasattr(self.threads, 'nested'):
+            self.threads.nested = list()
+        return self.threads.nested
+
+    @contextmanager
+    def phase(self, name):
+        nested = self.nested()
+        nested.append([0.0, 0.0])
+        wall, cpu = perf_counter(), thread_time()
+        try:
+            yield
+        finally:
+            wall, cpu = perf_counter() - wall, thread_time() - cpu
+            inner_wall, inner_cpu = nested.pop()
+            if nested:
+                nested[-1][0] += wall
+                nested[-1][1] += cpu
+            with self.lock:
+                phase = self.phases.setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'calls': 0})
+                phase['wall'] += wall - inner_wall
+                phase['cpu'] += cpu - inner_cpu
+                phase['calls'] += 1
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def as_dict(self):
+        now = times()
+        children_cpu = (
+            (now.children_user - self.start_times.children_user)
+            + (now.children_system - self.start_times.children_system)
+        )
+        with self.lock:
+            phases = {name: dict(phase) for name, phase in self.phases.items()}
+            counts = dict(self.counts)
+        if 'graphviz' in phases:
+            phases['graphviz']['cpu'] = children_cpu
+        for phase in phases.values():
+            phase['wall'] = round(phase['wall'], 6)
+            phase['cpu'] = round(phase['cpu'], 6)
+        return {
+            'phases': phases,
+            'counts': counts,
+            'total': {
+                'wall': round(perf_counter() - self.start_wall, 6),
+                'cpu': round(process_time() - self.start_cpu, 6),
+                'children_cpu': round(children_cpu, 6),
+            },
+        }
+
+
+def enable():
+    global active
+    active = Timings()
+    return active
+
+
+def disable():
+    global active
+    active = None
+
+
+def phase(name):
+    return nullcontext() if active is None else active.phase(name)
+
+
+def count(name, n=1):
+    if active is not None:
+        active.count(name, n)
@@ -6,6 +6,7 @@ from pathlib import Path
 
 from pyparsing import ParseResults
 
+from dfdone import timing
 from dfdone.components import (
     Cluster,
     Datum,
@@ -35,10 +36,13 @@ from dfdone.tml.grammar import directives, validate_path
 HL = '\N{ESC}[7m{}\N{ESC}[0m'
 
 class Parser:
-    def __init__(self, model_file, check_file=False):
+    def __init__(self, model_file, check_file=False, parsed_files=None):
         self.model_file = model_file
         self.check_file = check_file
         self.logger = getLogger(__name__)
+        # Parsed results of each file, by path, modification time, and size,
+        # which may be shared between parsers so that each file is parsed once.
+        self.parsed_files = dict() if parsed_files is None else parsed_files
 
         self.included_files = set()
         if hasattr(model_file, 'name'):
@@ -58,10 +62,17 @@ class Parser:
         self.active_threats  = dict()
         self.active_measures = dict()
 
-        self.exercise_directives(self.parse())
+        with timing.phase('directives'):
+            if check_file or not Path(getattr(model_file, 'name', '')).is_file():
+                self.exercise_directives(self.parse())
+            else:
+                self.exercise_directives(self.parse_file(Path(model_file.name)))
 
-        self.reparent_notes()
+        with timing.phase('sort'):
+            self.reparent_notes()
+            self.sort_components()
 
+    def sort_components(self):
         # TODO does cluster sorting make a difference?
         Parser.sort_clusters(self.clusters)
         self.elements = dict(sorted(self.elements.items(), key=itemgetter(1)))
@@ -150,10 +161,11 @@ class Parser:
         target_file = other_file or self.model_file
         data = target_file.read()
         results, locs = list(), list()
-        for c in directives.values():
-            for tokens, start, end in c.scanString(data):
-                locs.append((start, end))
-                results.append(tokens)
+        with timing.phase('parse'):
+            for c in directives.values():
+                for tokens, start, end in c.scanString(data):
+                    locs.append((start, end))
+                    results.append(tokens)
 
         if self.check_file:
             print()
@@ -170,6 +182,30 @@ class Parser:
             print(F"------ END {target_file.name}")
         return results
 
+    @staticmethod
+    def file_key(path):
+        stat = path.stat()
+        return path.resolve(), stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def forget_modified(parsed_files):
+        # Drops results of files that were modified, or removed, since they were parsed.
+        for key in list(parsed_files):
+            try:
+                if Parser.file_key(key[0]) == key:
+                    continue
+            except OSError:
+                pass
+            parsed_files.pop(key, None)
+
+    def parse_file(self, path):
+        # Files are parsed again only once they have been modified.
+        key = Parser.file_key(path)
+        if key not in self.parsed_files or self.check_file:
+            with path.open() as f:
+                self.parsed_files[key] = self.parse(other_file=f)
+        return self.parsed_files[key]
+
     def compile_components(self, name_list, source_dict):
         if isinstance(name_list, ParseResults):
             name_list = [i.name for i in name_list]
@@ -195,6 +231,7 @@ class Parser:
         # "parsed_results" are sorted according to the order of
         # "dfdone.tml.grammar.directives", which means that the order of
         # "directives" is what dictates the order of operations.
+        timing.count('statements', len(parsed_results))
         for r in parsed_results:
             if r.path:
                 self.include_file(r.path)
@@ -226,12 +263,7 @@ class Parser:
             self.logger.warning(F"Skipping {fpath}: invalid file path!")
             return
 
-        _file = None
-        for directory in [self.directory] + list(self.directory.parents):
-            _fpath = directory.joinpath(fpath)
-            if _fpath.is_file():
-                _file = _fpath
-
+        _file = Parser.find_include(fpath, self.directory)
         if _file is None:
             self.logger.warning(
                 F"Unable to find {fpath} under {self.directory} "
@@ -245,12 +277,45 @@ class Parser:
 
         self.logger.info(F"Including {fpath}...")
         try:
-            with _file.open() as f:
-                self.exercise_directives(self.parse(other_file=f))
-                self.included_files.add(_file.resolve())
+            self.exercise_directives(self.parse_file(_file))
+            self.included_files.add(_file.resolve())
         except PermissionError:
             self.logger.warning(F"Skipping {fpath}: permission error!")
 
+    @staticmethod
+    def find_include(fpath, directory):
+        _file = None
+        for directory in [directory] + list(directory.parents):
+            _fpath = directory.joinpath(fpath)
+            if _fpath.is_file():
+                _file = _fpath
+        return _file
+
+    @staticmethod
+    def scan_includes(model_path, directory=None, found=None):
+        """
+        Returns the paths of every file that the model at model_path includes,
+        directly or not, by scanning for Include directives alone.
+        Nothing else is parsed, so this is much quicker than a Parser.
+        """
+        model_path = model_path.resolve()
+        directory = directory or model_path.parent
+        found = found if found is not None else {model_path: None}
+        try:
+            data = model_path.read_text()
+        except (OSError, UnicodeDecodeError):
+            return list()
+        for tokens, _, _ in directives['inclusion'].scanString(data):
+            if not validate_path([tokens.path]):
+                continue
+            # As with the Parser, paths are relative to the top-level model.
+            _file = Parser.find_include(tokens.path, directory)
+            if _file is None or _file.resolve() in found:
+                continue
+            found[_file.resolve()] = None
+            Parser.scan_includes(_file, directory, found)
+        return list(found)[1:]
+
     # TODO fix all doctests
     def build_component(self, parsed_result):
         """
@@ -0,0 +1,104 @@
+# Watchers block until any of the files they watch may have changed.
+# They may wake up for other reasons too, such as a change to another file
+# in the same directory, so callers compare file signatures to be sure.
+
+from ctypes import CDLL, get_errno
+from ctypes.util import find_library
+from logging import getLogger
+from os import close, fsencode, read, strerror
+from select import select
+from time import sleep
+
+
+# From <sys/inotify.h>.
+IN_CLOEXEC     = 0o2000000
+IN_MODIFY      = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO    = 0x080
+IN_CREATE      = 0x100
+IN_DELETE      = 0x200
+INOTIFY_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+# Editors often save a file in several steps, e.g., by writing a temporary file
+# and renaming it; events this close together are taken as a single change.
+SETTLE_TIME = 0.05  # in seconds
+
+logger = getLogger(__name__)
+
+
+def file_signatures(paths):
+    signatures = dict()
+    for path in paths:
+        try:
+            stat = path.stat()
+        except OSError:
+            signatures[path] = None
+            continue
+        signatures[path] = (stat.st_mtime_ns, stat.st_size)
+    return signatures
+
+
+class PollingWatcher:
+    def __init__(self, paths=(), interval=0.5):
+        self.interval = interval
+        self.watch(paths)
+
+    def watch(self, paths):
+        # Changes made from now on wake up the next wait.
+        self.signatures = file_signatures(paths)
+
+    def wait(self):
+        while file_signatures(self.signatures) == self.signatures:
+            sleep(self.interval)
+        self.signatures = file_signatures(self.signatures)
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """
+    Watches the directories that hold the given files, rather than the files
+    themselves, since files replaced by renaming would no longer be watched.
+    Only available on Linux.
+    """
+    def __init__(self, paths=()):
+        self.libc = CDLL(find_library('c'), use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(get_errno(), strerror(get_errno()))
+        self.directories = set()
+        try:
+            self.watch(paths)
+        except OSError:
+            close(self.fd)
+            raise
+
+    def watch(self, paths):
+        # Changes made from now on wake up the next wait, as events queue up until read.
+        for directory in {p.parent for p in paths} - self.directories:
+            if self.libc.inotify_add_watch(self.fd, fsencode(directory), INOTIFY_MASK) < 0:
+                raise OSError(get_errno(), strerror(get_errno()), str(directory))
+            self.directories.add(directory)
+
+    def wait(self):
+        ready = select([self.fd], [], [], None)[0]
+        while ready:
+            read(self.fd, 65536)
+            ready = select([self.fd], [], [], SETTLE_TIME)[0]
+
+    def close(self):
+        close(self.fd)
+
+
+def get_watcher(paths=()):
+    """
+    Returns a watcher of the given paths, which watches any others
+    it is given later on as well.
+    """
+    try:
+        return InotifyWatcher(paths)
+    except (AttributeError, OSError, TypeError) as e:
+        # Without inotify, e.g., on other platforms than Linux, files are polled.
+        logger.debug(F"Polling for changes, since inotify is unavailable: {e}")
+        return PollingWatcher(paths)